@@ -0,0 +1,127 @@
+# This script measures the memory held by the objects of the ground truth code of the test files,
+# built with the classes of class_structure.py and with the lean variant of class_structure_lean.py,
+# and checks that both variants serialize identically.
+#
+# Usage: python bench_class_memory.py [--copies N] [--pattern "../test files/*.csv"]
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import os
+import re
+import tracemalloc
+
+import class_structure
+import class_structure_lean
+from serialize import serialize_section, serialize_statement
+
+# Namespace of executed code with the original classes, as with `from class_structure import *`
+STANDARD_CLASSES = {name: getattr(class_structure, name) for name in class_structure_lean.CLASSES}
+
+
+def load_codes(pattern):
+    """
+    Load the ground truth code of the CSV files matching a glob pattern.
+    Returns:
+        dict: The list of code snippets of every file.
+    """
+    codes = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, newline='') as f:
+            codes[os.path.basename(path)] = [row['code'] for row in csv.DictReader(f)]
+    return codes
+
+
+def execute(code, classes):
+    """
+    Execute a code snippet with a set of classes.
+    Returns:
+        dict: The namespace of the snippet (empty if it fails).
+    """
+    namespace = dict(classes)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code, namespace)
+    except Exception:
+        return {}
+    return namespace
+
+
+# Objects without a text identifier serialize as their repr, which holds the module name and the address
+OBJECT_REPR = re.compile(r'<class_structure(?:_lean)?\.(\w+) object at 0x[0-9a-f]+>')
+
+
+def snapshot(namespace):
+    """
+    Serialize the Sections and Statements of an executed snippet, in the order they were defined.
+    Object reprs are reduced to the class name, so both variants can be compared.
+    """
+    result = []
+    for name, value in namespace.items():
+        if isinstance(value, (class_structure.Section, class_structure_lean.Section)):
+            result.append((name, serialize_section(value)))
+        elif isinstance(value, (class_structure.Statement, class_structure_lean.Statement)):
+            result.append((name, serialize_statement(value)))
+    return OBJECT_REPR.sub(r'<\1>', repr(result))
+
+
+def measure(codes, classes, copies):
+    """
+    Execute every snippet copies times, keeping all objects alive, and measure the memory they hold.
+    Returns:
+        int: The number of bytes held.
+    """
+    tracemalloc.start()
+    kept = [execute(code, classes) for _ in range(copies) for code in codes]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return held
+
+
+def count_nodes(codes):
+    """
+    Count the Sections, Expressions and Statements created by the snippets.
+    """
+    nodes = 0
+    for code in codes:
+        namespace = execute(code, STANDARD_CLASSES)
+        sections = [v for v in namespace.values() if isinstance(v, class_structure.Section)]
+        for section in {id(s): s for s in sections}.values():
+            nodes += 1 + len(section.expressions) + len(section.statements)
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the memory of the standard and lean class structures.')
+    parser.add_argument('--pattern', default=os.path.join(os.path.dirname(__file__), '..', 'test files', '*.csv'),
+                        help='glob pattern of the CSV files with the ground truth code')
+    parser.add_argument('--copies', type=int, default=20, help='number of times every snippet is executed')
+    args = parser.parse_args()
+
+    codes_by_file = load_codes(args.pattern)
+    mismatches = 0
+    for codes in codes_by_file.values():
+        for code in codes:
+            if snapshot(execute(code, STANDARD_CLASSES)) != snapshot(execute(code, class_structure_lean.CLASSES)):
+                mismatches += 1
+    print(f"Snippets serializing differently: {mismatches}")
+
+    print(f"{'file':>10} {'nodes':>8} {'standard':>12} {'lean':>12} {'saved':>7} {'B/node std':>11} {'B/node lean':>12}")
+    totals = [0, 0, 0]
+    for name, codes in codes_by_file.items():
+        nodes = count_nodes(codes) * args.copies
+        standard = measure(codes, STANDARD_CLASSES, args.copies)
+        lean = measure(codes, class_structure_lean.CLASSES, args.copies)
+        totals = [totals[0] + nodes, totals[1] + standard, totals[2] + lean]
+        print(f"{name:>10} {nodes:>8} {standard:>12,} {lean:>12,} {1 - lean / standard:>7.1%} "
+              f"{standard / nodes:>11.0f} {lean / nodes:>12.0f}")
+    nodes, standard, lean = totals
+    print(f"{'total':>10} {nodes:>8} {standard:>12,} {lean:>12,} {1 - lean / standard:>7.1%} "
+          f"{standard / nodes:>11.0f} {lean / nodes:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# This script benchmarks the IVF demonstration index against the exact (brute force) selection,
+# reporting recall@k and the query time for several numbers of probed lists.
+#
+# The development pool is synthetic: clustered random embeddings, with the tag lists of the development set.
+#
+# Usage: python bench_demo_index.py [--size N] [--queries Q] [--k K] [--dim D]
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from demo_index import DemoIndex
+from demo_selection import DemoSelector
+
+
+def load_tag_lists(path):
+    """
+    Load the tag lists of the development set.
+    Args:
+        path (str): The path of development-set.csv.
+    Returns:
+        list: The tags of every sample.
+    """
+    df = pd.read_csv(path)
+    return [[t.strip()[1:-1] for t in tags[1:-1].split(',')] for tags in df['tags']]
+
+
+def make_pool(size, dim, clusters, tag_lists, rng):
+    """
+    Build a synthetic pool of samples whose embeddings are drawn around random cluster centers.
+    Args:
+        size (int): The number of samples.
+        dim (int): The embedding dimension.
+        clusters (int): The number of cluster centers.
+        tag_lists (list): The tag lists to draw the tags of the samples from.
+        rng (np.random.Generator): The random number generator.
+    Returns:
+        list: The samples, each containing 'tags' and 'embedding'.
+    """
+    centers = rng.standard_normal((clusters, dim))
+    embeddings = centers[rng.integers(0, clusters, size)] + 0.6 * rng.standard_normal((size, dim))
+    tags = [tag_lists[i] for i in rng.integers(0, len(tag_lists), size)]
+    return [{'tags': t, 'embedding': e} for t, e in zip(tags, embeddings.astype(np.float32))]
+
+
+def exact_top_k(selector, queries, k):
+    """
+    Rank the pool for every query by shared tags, then cosine similarity, without approximation.
+    Returns:
+        list: The pool positions of the top k of every query.
+    """
+    counts = selector.overlap_counts(queries)
+    similarities = selector.similarities(queries)
+    results = []
+    for c, s in zip(counts, similarities):
+        matches = np.flatnonzero(c > 0)
+        results.append(matches[np.lexsort((-s[matches], -c[matches]))][:k])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the IVF demonstration index against brute force.')
+    parser.add_argument('--size', type=int, default=20000, help='number of samples in the development pool')
+    parser.add_argument('--queries', type=int, default=200, help='number of test samples')
+    parser.add_argument('--k', type=int, default=3, help='number of demonstrations per test sample')
+    parser.add_argument('--dim', type=int, default=256, help='embedding dimension')
+    parser.add_argument('--clusters', type=int, default=300, help='number of clusters of the synthetic embeddings')
+    parser.add_argument('--dev-set', default=os.path.join(os.path.dirname(__file__), '..', 'development-set.csv'),
+                        help='development set to draw the tag lists from')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    tag_lists = load_tag_lists(args.dev_set)
+    pool = make_pool(args.size, args.dim, args.clusters, tag_lists, rng)
+    queries = make_pool(args.queries, args.dim, args.clusters, tag_lists, np.random.default_rng(args.seed + 1))
+
+    start = time.perf_counter()
+    selector = DemoSelector(pool)
+    truth = exact_top_k(selector, queries, args.k)
+    brute_time = time.perf_counter() - start
+    print(f"Pool of {args.size} samples, {args.queries} queries, k={args.k}")
+    print(f"Brute force: {brute_time * 1000 / args.queries:.2f} ms/query (including indexing the pool)")
+
+    start = time.perf_counter()
+    index = DemoIndex.build(np.stack([s['embedding'] for s in pool]), [s['tags'] for s in pool], seed=args.seed)
+    print(f"Built {index.n_lists} lists in {time.perf_counter() - start:.2f}s")
+    with tempfile.TemporaryDirectory() as directory:
+        index.save(directory)
+        start = time.perf_counter()
+        index = DemoIndex.load(directory)
+        print(f"Loaded (memory-mapped) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        print(f"{'nprobe':>8} {'recall@k':>10} {'ms/query':>10}")
+        for nprobe in (1, 2, 4, 8, 16, 32, 64):
+            start = time.perf_counter()
+            results = [index.search(q['embedding'], q['tags'], args.k, nprobe) for q in queries]
+            elapsed = time.perf_counter() - start
+            found = sum(len(np.intersect1d(r, t)) for r, t in zip(results, truth))
+            expected = sum(len(t) for t in truth)
+            print(f"{nprobe:>8} {found / expected if expected else 1:>10.3f} {elapsed * 1000 / args.queries:>10.2f}")
+        del index
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+# This script benchmarks the bounded edit distance in compare_strings_with_threshold
+# against the original full-table implementation, using the legal texts of the test files.
+#
+# Usage: python bench_edit_distance.py [--pairs N] [--threshold K] [--repeat R]
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import os
+import random
+import time
+
+from class_structure import Section
+from comparison import compare_strings_with_threshold, clear_comparison_cache
+from test_statements import execute_code_string
+
+
+def full_table_compare_strings_with_threshold(s1, s2, threshold=10):
+    """
+    The original implementation, which fills the complete (m+1)x(n+1) table.
+    Args:
+        s1 (str): First string to compare.
+        s2 (str): Second string to compare.
+        threshold (int): Edit distance threshold for string comparisons.
+    Returns:
+        tuple: Whether the edit distance is within the threshold, and the edit distance.
+    """
+    m, n = len(s1), len(s2)
+    dp = [[0]*(n+1) for _ in range(m+1)]
+
+    for i in range(m+1):
+        dp[i][0] = i
+    for j in range(n+1):
+        dp[0][j] = j
+
+    for i in range(1, m+1):
+        for j in range(1, n+1):
+            cost = 0 if s1[i-1] == s2[j-1] else 1
+            dp[i][j] = min(
+                dp[i-1][j] + 1,      # deletion
+                dp[i][j-1] + 1,      # insertion
+                dp[i-1][j-1] + cost  # substitution
+            )
+
+    edit_distance = dp[m][n]
+    return (edit_distance <= threshold, edit_distance)
+
+
+def load_expression_texts(pattern):
+    """
+    Load the lower-cased Expression texts produced by the ground truth code of the CSV files
+    matching a glob pattern. These are the strings compared by the semantic tests.
+    Args:
+        pattern (str): Glob pattern of the CSV files.
+    Returns:
+        list: The expression texts.
+    """
+    texts = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    namespace = execute_code_string(row['code'])
+                for value in namespace.values():
+                    if isinstance(value, Section):
+                        texts.extend(expr.text.lower() for expr in value.expressions if isinstance(expr.text, str))
+    return texts
+
+
+def perturb(text, edits, rng):
+    """
+    Apply a number of random character edits to a text.
+    Args:
+        text (str): The text to perturb.
+        edits (int): Number of insertions, deletions or substitutions to apply.
+        rng (random.Random): The random number generator.
+    Returns:
+        str: The perturbed text.
+    """
+    chars = list(text)
+    for _ in range(edits):
+        pos = rng.randrange(len(chars) + 1)
+        op = rng.random()
+        if op < 1 / 3 or not chars:
+            chars.insert(pos, rng.choice('abcdefghijklmnopqrstuvwxyz '))
+        elif op < 2 / 3:
+            del chars[min(pos, len(chars) - 1)]
+        else:
+            chars[min(pos, len(chars) - 1)] = rng.choice('abcdefghijklmnopqrstuvwxyz ')
+    return ''.join(chars)
+
+
+def make_pairs(texts, count, rng):
+    """
+    Build a mix of near-identical pairs (a few edits apart) and unrelated pairs of similar length,
+    which is what the semantic tests compare in practice.
+    Args:
+        texts (list): The texts to draw from.
+        count (int): Number of pairs to build.
+        rng (random.Random): The random number generator.
+    Returns:
+        list: The pairs of strings.
+    """
+    by_length = sorted(texts, key=len)
+    pairs = []
+    for _ in range(count):
+        text = rng.choice(texts)
+        if rng.random() < 0.5:
+            pairs.append((text, perturb(text, rng.randint(0, 15), rng)))
+        else:
+            index = by_length.index(text)
+            other = by_length[min(len(by_length) - 1, index + rng.randint(1, 3))]
+            pairs.append((text, other))
+    return pairs
+
+
+def time_function(function, pairs, threshold, repeat, cold=True):
+    """
+    Time a comparison function over all pairs, keeping the best of several runs.
+    Unless cold is False, the memoized comparisons are cleared before every run.
+    Returns:
+        tuple: The best elapsed time in seconds and the results of the last run.
+    """
+    best = float('inf')
+    results = None
+    for _ in range(repeat):
+        if cold:
+            clear_comparison_cache()
+        start = time.perf_counter()
+        results = [function(s1, s2, threshold) for s1, s2 in pairs]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bounded edit distance against the full-table implementation.')
+    parser.add_argument('--pairs', type=int, default=200, help='number of string pairs to compare')
+    parser.add_argument('--threshold', type=int, default=10, help='edit distance threshold')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs per implementation')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for building the pairs')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    texts = load_expression_texts(os.path.join(root, 'test files', '*.csv'))
+    pairs = make_pairs(texts, args.pairs, random.Random(args.seed))
+    mean_length = sum(len(s1) + len(s2) for s1, s2 in pairs) / (2 * len(pairs))
+
+    full_time, full_results = time_function(full_table_compare_strings_with_threshold, pairs, args.threshold, args.repeat)
+    bounded_time, bounded_results = time_function(compare_strings_with_threshold, pairs, args.threshold, args.repeat)
+    memoized_time, _ = time_function(compare_strings_with_threshold, pairs, args.threshold, args.repeat, cold=False)
+
+    # The bounded engine must agree on every decision, and on the distance whenever it is within the threshold
+    for (full_similar, full_distance), (similar, distance) in zip(full_results, bounded_results):
+        assert full_similar == similar
+        assert distance == full_distance if similar else args.threshold < distance <= full_distance
+
+    similar_count = sum(1 for similar, _ in full_results if similar)
+    print(f"Pairs compared: {len(pairs)} (mean length {mean_length:.0f} characters, {similar_count} within threshold {args.threshold})")
+    print(f"Full table:     {full_time * 1000:10.2f} ms")
+    print(f"Bounded:        {bounded_time * 1000:10.2f} ms (speedup {full_time / bounded_time:.1f}x)")
+    print(f"Memoized:       {memoized_time * 1000:10.2f} ms (speedup {full_time / memoized_time:.1f}x, repeated comparisons)")
+
+
+if __name__ == '__main__':
+    main()
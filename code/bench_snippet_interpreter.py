@@ -0,0 +1,144 @@
+# This script benchmarks the snippet interpreter of snippet_interpreter.py against exec, on the ground truth and
+# generated code of the intermediate results and on the code of the test files. It reports how many snippets the
+# interpreter supports, the time taken by both, and checks that every supported snippet extracts exactly the
+# same serialized statements and references as executing it. Unless --no-sandbox is given, it also compares the
+# full extraction of every snippet in a sandbox with StaticExtractor, which only sends unsupported snippets there.
+#
+# Usage: python bench_snippet_interpreter.py [--repeat R] [--no-sandbox]
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import re
+import time
+
+import pandas as pd
+
+import test_statements
+from code_cache import DEFAULT_CACHE
+from semantic_runner import preprocess_generated_code
+from sandbox import SandboxExecutor
+from snippet_interpreter import SnippetInterpreter, StaticExtractor, UnsupportedConstruct, UnsupportedOperation
+from test_statements import SnippetExtraction
+
+# Serialized relationships to objects without a text are identified by their repr, which holds their address
+ADDRESS = re.compile(r' at 0x[0-9a-f]+>')
+
+
+def load_snippets(root):
+    """
+    Load the distinct code snippets of the intermediate results and of the test files.
+    Args:
+        root (str): The root directory of the repository.
+    Returns:
+        list: The code snippets, without their code block markers.
+    """
+    snippets = []
+    for path in sorted(glob.glob(os.path.join(root, 'code', 'intermediate-results', '*.csv'))):
+        df = pd.read_csv(path)
+        for column in ('GT Code', 'Generated Code', 'code'):
+            if column in df.columns:
+                snippets.extend(preprocess_generated_code(code) for code in df[column])
+    for path in sorted(glob.glob(os.path.join(root, 'test files', '*.csv'))):
+        snippets.extend(pd.read_csv(path)['code'])
+    return list(dict.fromkeys(code for code in snippets if isinstance(code, str)))
+
+
+def run_exec(code):
+    namespace = {}
+    try:
+        exec(code, vars(test_statements), namespace)
+    except (SyntaxError, Exception) as e:
+        return {}, e
+    return namespace, None
+
+
+def run_interpreter(interpreter, code):
+    try:
+        return interpreter.run(code), None
+    except (UnsupportedConstruct, UnsupportedOperation):
+        raise
+    except (SyntaxError, Exception) as e:
+        return {}, e
+
+
+def time_runs(function, snippets, repeat, cold=True):
+    """
+    Run a function on every snippet, keeping the best total time of several runs.
+    Unless cold is False, the shared cache of parsed and compiled snippets is cleared before every run.
+    Returns:
+        tuple: The best elapsed time in seconds and the results of the last run.
+    """
+    best = float('inf')
+    results = None
+    for _ in range(repeat):
+        if cold:
+            DEFAULT_CACHE.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            results = [function(code) for code in snippets]
+            best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the snippet interpreter against exec.')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs per implementation')
+    parser.add_argument('--no-sandbox', action='store_true', help='do not time the sandboxed extraction')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    snippets = load_snippets(root)
+    interpreter = SnippetInterpreter(vars(test_statements))
+
+    supported = []
+    reasons = {}
+    for code in snippets:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_interpreter(interpreter, code)
+            supported.append(code)
+        except (UnsupportedConstruct, UnsupportedOperation) as reason:
+            reasons[str(reason)] = reasons.get(str(reason), 0) + 1
+
+    exec_time, exec_results = time_runs(run_exec, supported, args.repeat)
+    interpreter_time, interpreter_results = time_runs(lambda code: run_interpreter(interpreter, code), supported,
+                                                      args.repeat)
+    cached_time, _ = time_runs(lambda code: run_interpreter(interpreter, code), supported, args.repeat, cold=False)
+
+    # The interpreter must extract the same objects and raise the same errors as exec
+    mismatches = 0
+    for code, (namespace1, error1), (namespace2, error2) in zip(supported, exec_results, interpreter_results):
+        with contextlib.redirect_stdout(io.StringIO()):
+            entry1 = ADDRESS.sub('>', repr(SnippetExtraction.from_namespace(code, namespace1, error1).to_entry()))
+            entry2 = ADDRESS.sub('>', repr(SnippetExtraction.from_namespace(code, namespace2, error2).to_entry()))
+        if entry1 != entry2 or type(error1) is not type(error2) or str(error1) != str(error2):
+            mismatches += 1
+
+    errors = sum(1 for _, error in interpreter_results if error is not None)
+    print(f"Snippets: {len(snippets)}, supported by the interpreter: {len(supported)} ({errors} raise an error)")
+    for reason, count in sorted(reasons.items(), key=lambda item: -item[1])[:10]:
+        print(f"  unsupported: {reason} ({count})")
+    print(f"exec:        {exec_time * 1000:10.2f} ms")
+    print(f"Interpreter: {interpreter_time * 1000:10.2f} ms (speedup {exec_time / interpreter_time:.1f}x)")
+    print(f"Interpreter: {cached_time * 1000:10.2f} ms (speedup {exec_time / cached_time:.1f}x, parsed snippets cached)")
+    print(f"Extraction mismatches: {mismatches}")
+
+    if not args.no_sandbox:
+        with contextlib.redirect_stdout(io.StringIO()), SandboxExecutor() as sandbox:
+            start = time.perf_counter()
+            sandbox.extract_many(snippets)
+            sandbox_time = time.perf_counter() - start
+            extractor = StaticExtractor(fallback=sandbox)
+            start = time.perf_counter()
+            extractor.extract_many(snippets)
+            static_time = time.perf_counter() - start
+        print(f"Sandboxed extraction:        {sandbox_time * 1000:10.2f} ms")
+        print(f"Interpreted, else sandboxed: {static_time * 1000:10.2f} ms (speedup {sandbox_time / static_time:.1f}x, "
+              f"{extractor.fallbacks} sandboxed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,20 @@
 from typing import List, Optional, Union
 
+# Callables notified of every relationship added through the add_* methods of a Statement, as
+# observer(statement, relationship, target); see relationship_index.RelationshipIndex.observe.
+# The names are private, so `from class_structure import *` does not hand them to executed snippets.
+_RELATIONSHIP_OBSERVERS = []
+
+def _register_observer(observer):
+    _RELATIONSHIP_OBSERVERS.append(observer)
+
+def _unregister_observer(observer):
+    _RELATIONSHIP_OBSERVERS.remove(observer)
+
+def _notify(statement, relationship, target):
+    for observer in _RELATIONSHIP_OBSERVERS:
+        observer(statement, relationship, target)
+
 class Section:
     """
     A bullet point in the legal text. Every bullet point starts a new Section,
@@ -123,26 +138,32 @@ class Statement:
         self.relationships["refines"].append(target)
         if isinstance(target, Reference):
             target.relationship = "refines"
+        _notify(self, "refines", target)
     def add_exception(self, exception: Union['Expression', 'Statement']):
         self.relationships["has_exception"].append(exception)
         if isinstance(exception, Reference):
             exception.relationship = "has_exception"
+        _notify(self, "has_exception", exception)
     def add_follows(self, target: Union['Reference', 'Statement']):
         self.relationships["follows"].append(target)
         if isinstance(target, Reference):
             target.relationship = "follows"
+        _notify(self, "follows", target)
     def add_is_refined_by(self, target: Union['Reference', 'Statement']):
         self.relationships["is_refined_by"].append(target)
         if isinstance(target, Reference):
             target.relationship = "is_refined_by"
+        _notify(self, "is_refined_by", target)
     def add_is_exception_to(self, target: Union['Reference', 'Statement']):
         self.relationships["is_exception_to"].append(target)
         if isinstance(target, Reference):
             target.relationship = "is_exception_to"
+        _notify(self, "is_exception_to", target)
     def add_is_followed_by(self, target: Union['Reference', 'Statement']):
         self.relationships["is_followed_by"].append(target)
         if isinstance(target, Reference):
             target.relationship = "is_followed_by"
+        _notify(self, "is_followed_by", target)
 
 
 class Information(Statement):
@@ -0,0 +1,253 @@
+# This module provides a memory-lean variant of the classes in class_structure.py, for loading whole statutes.
+# The classes have the same names, constructors, attributes and methods, so generated code executes unchanged
+# with either variant, but they use __slots__ instead of a per-object __dict__, and the lists that usually stay
+# empty (the six relationship lists of a Statement, Expression.includes and Section.subSections) are only
+# allocated when they are first used.
+#
+# To execute code with these classes, run it in a namespace built from this module, e.g.
+#   namespace = dict(class_structure_lean.CLASSES); exec(code, namespace)
+
+from collections.abc import MutableMapping
+from typing import List, Optional, Union
+
+from class_structure import _notify
+
+# The relationship types of a Statement, in the order of Statement.relationships
+RELATIONSHIP_TYPES = ("refines", "is_refined_by", "has_exception", "is_exception_to", "follows", "is_followed_by")
+
+# Slot of a Statement holding each relationship list
+_RELATIONSHIP_SLOTS = {name: '_' + name for name in RELATIONSHIP_TYPES}
+
+
+class Section:
+    """
+    A bullet point in the legal text (see class_structure.Section).
+    subSections is only allocated when a subsection is added or the list is first read.
+    """
+
+    __slots__ = ('sectionNumber', 'sectionTitle', 'parent', '_subSections', 'expressions', 'statements')
+
+    def __init__(self, sectionNumber: str, sectionTitle: str = "", parent=None):
+        self.sectionNumber: str = sectionNumber
+        self.sectionTitle: str = sectionTitle
+        self.parent: Optional['Section'] = parent
+        self._subSections: Optional[List['Section']] = None
+        self.expressions: List['Expression'] = []
+        self.statements: List['Statement'] = []
+
+    @property
+    def subSections(self) -> List['Section']:
+        if self._subSections is None:
+            self._subSections = []
+        return self._subSections
+
+    @subSections.setter
+    def subSections(self, value: List['Section']):
+        self._subSections = value
+
+    def add_subsection(self, subsection: 'Section'):
+        self.subSections.append(subsection)
+        subsection.parent = self
+    def add_expression(self, expression: 'Expression'):
+        self.expressions.append(expression)
+    def add_statement(self, statement: 'Statement'):
+        self.statements.append(statement)
+
+
+class Expression:
+    """
+    A snippet of text within one bullet point (see class_structure.Expression).
+    includes is only allocated when it is first used.
+    """
+
+    __slots__ = ('section', 'text', '_includes')
+
+    def __init__(self, section: Section, text: str, includes=None):
+        self.section: Section = section
+        section.add_expression(self)
+        self.text: str = text
+        self._includes: Optional[List[Expression]] = includes
+
+    @property
+    def includes(self) -> List['Expression']:
+        if self._includes is None:
+            self._includes = []
+        return self._includes
+
+    @includes.setter
+    def includes(self, value: List['Expression']):
+        self._includes = value
+
+
+class Reference(Expression):
+    """
+    A type of Expression that refers to another part of the legal text (see class_structure.Reference).
+    """
+
+    __slots__ = ('target', 'relationship')
+
+    def __init__(self, section: Section, text: str, target):
+        super().__init__(section, text)
+        self.target: Statement = target
+        self.relationship: Optional[str] = None
+
+
+class Relationships(MutableMapping):
+    """
+    The relationships of a Statement, with the interface of the dict in class_structure.Statement.
+    It is a view over the Statement's relationship slots: reading a relationship allocates its list
+    on first use, and peek() reads one without allocating it.
+    """
+
+    __slots__ = ('_statement',)
+
+    def __init__(self, statement: 'Statement'):
+        self._statement = statement
+
+    def __getitem__(self, key: str) -> list:
+        slot = _RELATIONSHIP_SLOTS[key]
+        value = getattr(self._statement, slot)
+        if value is None:
+            value = []
+            setattr(self._statement, slot, value)
+        return value
+
+    def __setitem__(self, key: str, value: list):
+        setattr(self._statement, _RELATIONSHIP_SLOTS[key], value)
+
+    def __delitem__(self, key: str):
+        raise TypeError('The relationship types of a Statement are fixed.')
+
+    def __contains__(self, key) -> bool:
+        return key in _RELATIONSHIP_SLOTS
+
+    def __iter__(self):
+        return iter(RELATIONSHIP_TYPES)
+
+    def __len__(self) -> int:
+        return len(RELATIONSHIP_TYPES)
+
+    def peek(self, key: str):
+        """
+        Get a relationship list without allocating it.
+        Returns:
+            list or tuple: The list, or an empty tuple if it was never allocated.
+        """
+        return getattr(self._statement, _RELATIONSHIP_SLOTS[key]) or ()
+
+    def __repr__(self):
+        return repr({key: list(self.peek(key)) for key in RELATIONSHIP_TYPES})
+
+
+class Statement:
+    """
+    A legal statement (see class_structure.Statement).
+    relationships is a dict-like view (see Relationships); each relationship list is only allocated when
+    it is first used.
+    """
+
+    __slots__ = ('sections',) + tuple(_RELATIONSHIP_SLOTS.values())
+
+    def __init__(self, section: Optional[Section] = None):
+        self.sections: Section = section
+        self._refines = self._is_refined_by = self._has_exception = None
+        self._is_exception_to = self._follows = self._is_followed_by = None
+
+    @property
+    def relationships(self) -> Relationships:
+        return Relationships(self)
+
+    @relationships.setter
+    def relationships(self, value: dict):
+        for key in RELATIONSHIP_TYPES:
+            setattr(self, _RELATIONSHIP_SLOTS[key], value.get(key))
+
+    def _add(self, relationship: str, target):
+        self.relationships[relationship].append(target)
+        if isinstance(target, Reference):
+            target.relationship = relationship
+        _notify(self, relationship, target)
+
+    def add_refines(self, target: Union['Reference', 'Statement']):
+        self._add("refines", target)
+    def add_exception(self, exception: Union['Expression', 'Statement']):
+        self._add("has_exception", exception)
+    def add_follows(self, target: Union['Reference', 'Statement']):
+        self._add("follows", target)
+    def add_is_refined_by(self, target: Union['Reference', 'Statement']):
+        self._add("is_refined_by", target)
+    def add_is_exception_to(self, target: Union['Reference', 'Statement']):
+        self._add("is_exception_to", target)
+    def add_is_followed_by(self, target: Union['Reference', 'Statement']):
+        self._add("is_followed_by", target)
+
+
+class Information(Statement):
+    """
+    A type of Statement that represents something that is known or proved to be true (see class_structure.Information).
+    """
+
+    __slots__ = ('description',)
+
+    def __init__(self, section, description: Expression):
+        super().__init__(section)
+        self.description: List[Expression] = []
+        if description is not None:
+            self.description.append(description)
+
+
+class Definition(Statement):
+    """
+    A type of Statement that defines a concept or term in the legal text (see class_structure.Definition).
+    """
+
+    __slots__ = ('defined_term', 'meaning', 'exclusions')
+
+    def __init__(self, section, defined_term: Expression):
+        super().__init__(section)
+        self.defined_term: Expression = defined_term
+        self.meaning: List[Expression] = []
+        self.exclusions: List[Expression] = []
+
+
+class Rule(Statement):
+    """
+    A Statement describing a legal rule (see class_structure.Rule).
+    """
+
+    __slots__ = ('rule_type', 'entity', 'description', 'conditions')
+
+    OBLIGATION = 0
+    PERMISSION = 1
+    PROHIBITION = 2
+    PENALTY = 3
+
+    def __init__(self, section, entity: Expression):
+        super().__init__(section)
+        self.rule_type: int = None
+        self.entity: Expression = entity
+        self.description: Optional[Expression] = None
+        self.conditions: List[Expression] = []
+
+
+class Exemption(Statement):
+    """
+    A type of Statement indicating that a person, object, or situation is exempt
+    from another rule or requirement (see class_structure.Exemption).
+    """
+
+    __slots__ = ('description',)
+
+    def __init__(self, section=None, description: Optional[Expression] = None):
+        super().__init__(section)
+        self.description: List[Expression] = []
+        if description is not None:
+            self.description.append(description)
+
+
+# The names available to executed code, as with `from class_structure import *`
+CLASSES = {
+    'Section': Section, 'Expression': Expression, 'Reference': Reference, 'Statement': Statement,
+    'Information': Information, 'Definition': Definition, 'Rule': Rule, 'Exemption': Exemption,
+    'List': List, 'Optional': Optional, 'Union': Union
+}
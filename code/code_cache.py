@@ -0,0 +1,172 @@
+# This module provides a bounded cache of compiled code objects, keyed by a hash of the source.
+# The same snippets are compiled again and again: the ground truth code of every pass, the generated code checked
+# by the compilation notebook and then executed by the semantic tests, and exec(str) compiles implicitly every
+# time. With the cache, a source string is compiled once per process, and optionally once across runs: the
+# compiled code can be stored in a directory as marshalled bytecode (as in __pycache__), tagged with the
+# bytecode magic number of the interpreter that wrote it.
+#
+# Sources that fail to compile are cached too, and raise a new exception equal to the original one.
+# Parsed ASTs (flags=ast.PyCF_ONLY_AST, used by snippet_interpreter.py) are only cached in memory.
+#
+# Example:
+#   code = compile_cached(source)       # shared by test_statements and the compilation notebook
+#   exec(code, namespace)
+#   DEFAULT_CACHE.stats()               # {'hits': ..., 'disk_hits': ..., 'misses': ..., 'hit_rate': ...}
+
+import ast
+import hashlib
+import importlib.util
+import marshal
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Optional
+
+# Default upper bound for the number of compiled sources kept in memory
+DEFAULT_MAX_ENTRIES = 512
+
+
+class CompiledCodeCache:
+    """
+    A least recently used cache of compiled code objects in memory, optionally backed by a directory.
+
+    Attributes:
+        max_entries (int): The maximum number of compiled sources kept in memory.
+        directory (Optional[str]): The directory the marshalled code objects are stored in, if any.
+        hits (int): The number of compilations answered from memory.
+        disk_hits (int): The number of compilations answered from the directory.
+        misses (int): The number of sources that had to be compiled.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        if directory:
+            self.use_directory(directory)
+
+    def use_directory(self, directory: Optional[str]):
+        """
+        Store the compiled code in a directory from now on, and look it up there on a miss in memory.
+        Args:
+            directory (str, optional): The directory, created if needed; None stops persisting.
+        """
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    @staticmethod
+    def key(source, filename: str = '<string>', mode: str = 'exec', flags: int = 0) -> str:
+        """
+        Compute the cache key of a source: a hash of the source and of the arguments of compile().
+        """
+        digest = hashlib.sha256()
+        digest.update(f'{mode}\0{filename}\0{flags}\0'.encode('utf-8'))
+        digest.update(source.encode('utf-8', 'surrogatepass') if isinstance(source, str) else bytes(source))
+        return digest.hexdigest()
+
+    def compile(self, source, filename: str = '<string>', mode: str = 'exec', flags: int = 0):
+        """
+        Compile a source, or get its code object from the cache.
+        Args:
+            source (str or bytes): The source code.
+            filename (str): The file name reported in tracebacks and syntax errors.
+            mode (str): 'exec', 'eval' or 'single', as for compile().
+            flags (int): The flags of compile(), e.g. ast.PyCF_ONLY_AST to parse the source only.
+        Returns:
+            The code object (or AST) of the source.
+        Raises:
+            SyntaxError: If the source does not compile, as compile() would raise it.
+        """
+        key = self.key(source, filename, mode, flags)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            entry = self._load(key) if self._persistent(flags) else None
+            if entry is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                try:
+                    entry = (compile(source, filename, mode, flags, dont_inherit=True), None)
+                except (SyntaxError, ValueError) as e:
+                    entry = (None, (type(e), e.args))
+                if entry[1] is None and self._persistent(flags):
+                    self._store(key, entry[0])
+            self._entries[key] = entry
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        code, error = entry
+        if error is not None:
+            error_type, args = error
+            raise error_type(*args)
+        return code
+
+    def _persistent(self, flags: int) -> bool:
+        return self.directory is not None and not flags & ast.PyCF_ONLY_AST
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.bin')
+
+    def _load(self, key: str):
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        # Bytecode written by another Python version is ignored, and overwritten once recompiled
+        magic = importlib.util.MAGIC_NUMBER
+        if not data.startswith(magic):
+            return None
+        try:
+            return marshal.loads(data[len(magic):]), None
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def _store(self, key: str, code):
+        # Written to a temporary file first, so concurrent workers never read a partial file
+        try:
+            fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+            os.replace(temporary, self._path(key))
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of compilations answered from memory or from the directory.
+        """
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        """
+        Get the number of hits, disk hits and misses, the hit rate and the number of entries in memory.
+        """
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate, 'entries': len(self._entries)}
+
+    def clear(self):
+        """
+        Empty the cache in memory and reset its statistics; the stored files are kept.
+        """
+        self._entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+
+
+# The cache shared by the semantic tests, the snippet interpreter and the compilation notebook
+DEFAULT_CACHE = CompiledCodeCache()
+
+
+def compile_cached(source, filename: str = '<string>', mode: str = 'exec', flags: int = 0):
+    """
+    Compile a source with the shared cache (see CompiledCodeCache.compile).
+    """
+    return DEFAULT_CACHE.compile(source, filename, mode, flags)
@@ -0,0 +1,324 @@
+# This module provides the edit-distance comparisons of the semantic tests: the bounded, memoized comparison of
+# strings, and the comparison of serialized Expression and Reference dictionaries built on it. It is shared by
+# test_statements, which compares the lists of the attribute tests, and matching, which pairs items regardless
+# of their order.
+
+from functools import lru_cache
+
+from profiling import PROFILE
+
+# Maximum number of memoized string comparisons (see compare_strings_with_threshold)
+COMPARISON_CACHE_SIZE = 2 ** 16
+
+
+def edit_distance(s1, s2):
+    """
+    Compute the exact edit distance between two strings.
+    Only two rows of the dynamic programming table are kept, so memory is O(min(m, n)).
+    Parameters:
+      s1 (str): First string to compare.
+      s2 (str): Second string to compare.
+    Returns:
+      int: The edit distance between the two strings.
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    prev = list(range(len(s2) + 1))
+    if PROFILE.enabled:
+        PROFILE.count('edit_distance_cells', len(s1) * len(s2))
+    for i in range(1, len(s1) + 1):
+        cur = [i] + [0] * len(s2)
+        c1 = s1[i-1]
+        for j in range(1, len(s2) + 1):
+            cost = 0 if c1 == s2[j-1] else 1
+            cur[j] = min(
+                prev[j] + 1,         # deletion
+                cur[j-1] + 1,        # insertion
+                prev[j-1] + cost     # substitution
+            )
+        prev = cur
+    return prev[-1]
+
+def _bounded_compare_strings(s1, s2, threshold=10):
+    """
+    Compare two strings using the edit distance algorithm, without memoization.
+
+    Since only distances up to the threshold matter, the computation is bounded: strings whose
+    lengths differ by more than the threshold are rejected right away, common prefixes and suffixes
+    are skipped, only the diagonal band of width 2*threshold+1 of the table is filled (keeping a
+    single pair of rows in memory), and the computation stops as soon as every cell in the band
+    exceeds the threshold.
+    Parameters:
+      s1 (str): First string to compare.
+      s2 (str): Second string to compare.
+      threshold (int): Edit distance threshold for string comparisons.
+    Returns:
+      tuple: A tuple containing:
+        - bool: True if the strings are considered similar (edit distance <= threshold), False otherwise.
+        - int: The actual edit distance between the two strings if it is within the threshold,
+          otherwise a lower bound of it that is greater than the threshold.
+    """
+    if threshold < 0:
+        return (False, edit_distance(s1, s2))
+    if s1 == s2:
+        return (True, 0)
+    # Let s1 be the longer string, so the rows only span the shorter one
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    if len(s1) - len(s2) > threshold:
+        return (False, len(s1) - len(s2))
+
+    # Skip the common prefix and suffix, which do not change the edit distance
+    start = 0
+    end1, end2 = len(s1), len(s2)
+    while start < end2 and s1[start] == s2[start]:
+        start += 1
+    while end2 > start and s1[end1-1] == s2[end2-1]:
+        end1 -= 1
+        end2 -= 1
+    s1, s2 = s1[start:end1], s2[start:end2]
+    m, n = len(s1), len(s2)
+    if n == 0:
+        return (m <= threshold, m)
+
+    # Cells outside the band are capped at threshold + 1
+    limit = threshold + 1
+    prev = [j if j < limit else limit for j in range(n + 1)]
+    cur = [limit] * (n + 1)
+    cells = 0
+    for i in range(1, m + 1):
+        lo = max(1, i - threshold)
+        hi = min(n, i + threshold)
+        cells += hi - lo + 1
+        if lo == 1:
+            cur[0] = i if i < limit else limit
+            row_min = cur[0]
+        else:
+            cur[lo-1] = limit
+            row_min = limit
+        c1 = s1[i-1]
+        for j in range(lo, hi + 1):
+            value = prev[j-1] if c1 == s2[j-1] else prev[j-1] + 1  # substitution
+            if prev[j] + 1 < value:
+                value = prev[j] + 1                                # deletion
+            if cur[j-1] + 1 < value:
+                value = cur[j-1] + 1                               # insertion
+            if value > limit:
+                value = limit
+            cur[j] = value
+            if value < row_min:
+                row_min = value
+        # Every path to the last cell crosses this row, so it cannot get below the row minimum
+        if row_min > threshold:
+            if PROFILE.enabled:
+                PROFILE.count('edit_distance_cells', cells)
+            return (False, row_min)
+        prev, cur = cur, prev
+
+    if PROFILE.enabled:
+        PROFILE.count('edit_distance_cells', cells)
+    edit_distance_value = prev[n]
+    return (edit_distance_value <= threshold, edit_distance_value)
+
+_memoized_compare_strings = lru_cache(maxsize=COMPARISON_CACHE_SIZE)(_bounded_compare_strings)
+
+@PROFILE.timed('compare_strings')
+def compare_strings_with_threshold(s1, s2, threshold=10):
+    """
+    Compare two strings using the edit distance algorithm.
+    The edit distance is the minimum number of operations (insertions, deletions, substitutions)
+    required to change one string into the other.
+
+    The same pairs of texts, section numbers and relationship targets are compared by many attribute
+    tests, passes and models, so results for string pairs are memoized in a bounded LRU cache. The
+    edit distance is symmetric, so the pair is put in a canonical order before the lookup.
+    Parameters:
+      s1 (str): First string to compare.
+      s2 (str): Second string to compare.
+      threshold (int): Edit distance threshold for string comparisons.
+    Returns:
+      tuple: A tuple containing:
+        - bool: True if the strings are considered similar (edit distance <= threshold), False otherwise.
+        - int: The actual edit distance between the two strings if it is within the threshold,
+          otherwise a lower bound of it that is greater than the threshold.
+    """
+    if isinstance(s1, str) and isinstance(s2, str):
+        if s2 < s1:
+            s1, s2 = s2, s1
+        return _memoized_compare_strings(s1, s2, threshold)
+    return _bounded_compare_strings(s1, s2, threshold)
+
+def comparison_cache_info():
+    """
+    Get the statistics of the memoized string comparisons.
+    Returns:
+        dict: The number of hits and misses, the maximum size and the current size of the cache.
+    """
+    info = _memoized_compare_strings.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'maxsize': info.maxsize, 'currsize': info.currsize}
+
+def set_comparison_cache_size(maxsize: int):
+    """
+    Resize the cache of memoized string comparisons. The cache is emptied.
+    Args:
+        maxsize (int): The maximum number of memoized comparisons. None makes the cache unbounded
+            and 0 disables memoization.
+    """
+    global _memoized_compare_strings
+    _memoized_compare_strings = lru_cache(maxsize=maxsize)(_bounded_compare_strings)
+
+def clear_comparison_cache():
+    """
+    Empty the cache of memoized string comparisons and reset its statistics.
+    """
+    _memoized_compare_strings.cache_clear()
+
+def compare_list_strings_with_threshold(list1, list2, threshold=10):
+    """
+    Compare two lists of strings using the edit distance.
+    
+    Parameters:
+      list1 (list): First list of strings.
+      list2 (list): Second list of strings.
+      threshold (int): Edit distance threshold for string comparisons.
+      
+    Returns:
+      bool: True if every corresponding pair of strings are considered equal; False otherwise.
+    """
+    if len(list1) != len(list2):
+        return False
+    
+    for s1, s2 in zip(list1, list2):
+        similar, _ = compare_strings_with_threshold(s1, s2, threshold)
+        if not similar:
+            return False
+    return True
+
+
+def compare_serialized_expr(expr1, expr2, threshold=10):
+    """
+    Recursively compare two serialized Expression dictionaries.
+    
+    The dictionaries are assumed to have at least the following keys:
+      - "text": a string (already lower-cased)
+      - "includes": a list of nested serialized expressions or statements
+      - "sectionNumber": an integer (or None)
+    
+    For string values, the comparison is based on the edit distance.
+    For lists, elements are compared in order recursively.
+    Other values are compared using standard equality.
+    
+    Parameters:
+      expr1 (dict): First serialized expression.
+      expr2 (dict): Second serialized expression.
+      threshold (int): Edit distance threshold for string comparisons.
+      
+    Returns:
+      bool: True if expr1 and expr2 are considered equal under these rules; False otherwise.
+    """
+    # Check that both dictionaries have the same keys.
+    if set(expr1.keys()) != set(expr2.keys()):
+        return False
+
+    # Compare "text" using edit distance.
+    if "text" in expr1 and "text" in expr2:
+        if isinstance(expr1["text"], str) and isinstance(expr2["text"], str):
+            similar, _ = compare_strings_with_threshold(expr1["text"], expr2["text"], threshold)
+            if not similar:
+                return False
+        else:
+            if expr1["text"] != expr2["text"]:
+                return False
+
+    # Compare "sectionNumber" using edit distance.
+    if "sectionNumber" in expr1 and "sectionNumber" in expr2:
+            similar, _ = compare_strings_with_threshold(str(expr1["sectionNumber"]), str(expr2["sectionNumber"]), threshold)
+            if not similar:
+                return False
+
+    # Compare "includes" recursively.
+    if "includes" in expr1 and "includes" in expr2:
+        list1 = expr1["includes"]
+        list2 = expr2["includes"]
+        if len(list1) != len(list2):
+            return False
+        for item1, item2 in zip(list1, list2):
+            # If the items are dictionaries, assume they are serialized expressions/statements.
+            if isinstance(item1, dict) and isinstance(item2, dict):
+                if not compare_serialized_expr(item1, item2, threshold):
+                    return False
+            # Otherwise, if they are strings, use the string comparison.
+            elif isinstance(item1, str) and isinstance(item2, str):
+                similar, _ = compare_strings_with_threshold(item1, item2, threshold)
+                if not similar:
+                    return False
+            else:
+                # For any other types, use direct equality.
+                if item1 != item2:
+                    return False
+
+    return True
+
+def compare_serialized_references(ref1, ref2, threshold=10):
+    """
+    Recursively compare two serialized Reference dictionaries.
+    
+    The dictionaries are assumed to have at least the following keys:
+      - "text": a string (already lower-cased)
+      - "target": a string (already lower-cased)
+      - "sectionNumber": an integer (or None)
+      - "relationship": a string
+
+    For string values, the comparison is based on the edit distance.
+    For lists, elements are compared in order recursively.
+    Other values are compared using standard equality.
+
+    Parameters:
+        ref1 (dict): First serialized reference.
+        ref2 (dict): Second serialized reference.
+
+    Returns:
+        bool: True if ref1 and ref2 are considered equal under these rules; False otherwise.
+    """
+
+    # Check that both dictionaries have the same keys.
+    if set(ref1.keys()) != set(ref2.keys()):
+        return False
+
+    # Compare "text" using edit distance.
+    if "text" in ref1 and "text" in ref2:
+        if isinstance(ref1["text"], str) and isinstance(ref2["text"], str):
+            similar, _ = compare_strings_with_threshold(ref1["text"], ref2["text"], threshold)
+            if not similar:
+                return False
+        else:
+            if ref1["text"] != ref2["text"]:
+                return False
+
+    # Compare "target" using edit distance.
+    if "target" in ref1 and "target" in ref2:
+        if isinstance(ref1["target"], str) and isinstance(ref2["target"], str):
+            similar, _ = compare_strings_with_threshold(ref1["target"], ref2["target"], threshold)
+            if not similar:
+                return False
+        else:
+            if ref1["target"] != ref2["target"]:
+                return False
+
+    # Compare "sectionNumber" using edit distance.
+    if "sectionNumber" in ref1 and "sectionNumber" in ref2:
+        similar, _ = compare_strings_with_threshold(str(ref1["sectionNumber"]), str(ref2["sectionNumber"]), threshold)
+        if not similar:
+            return False
+
+    # Compare "relationship" using edit distance.
+    if "relationship" in ref1 and "relationship" in ref2:
+        if isinstance(ref1["relationship"], str) and isinstance(ref2["relationship"], str):
+            similar, _ = compare_strings_with_threshold(ref1["relationship"], ref2["relationship"], threshold)
+            if not similar:
+                return False
+        else:
+            if ref1["relationship"] != ref2["relationship"]:
+                return False
+
+    return True
@@ -0,0 +1,193 @@
+# This script is the command-line version of the compilability test of Code-Gen-Compliation-Testing.ipynb.
+# Every generated code segment is first compiled in the main process, which catches syntax errors cheaply; the
+# segments that compile are then executed in a pool of sandboxed workers (see sandbox.SandboxExecutor), with a
+# time and memory limit per segment. The result of every segment is written as soon as its batch completes, to a
+# CSV or JSON lines file, one record per segment:
+#   file, segment, status ("valid", "syntax_error", "runtime_error", "timeout", "memory", "crashed" or "missing"),
+#   error_type, error, line, elapsed
+#
+# Usage:
+#   python compilation_runner.py "../test files/"*.csv -o compilation_results.jsonl --workers 8
+
+import argparse
+import builtins
+import contextlib
+import csv
+import io
+import json
+import os
+import time
+import traceback
+from typing import IO, Iterable, Iterator, Optional
+
+import pandas as pd
+
+import class_structure
+from code_cache import compile_cached
+from sandbox import DEFAULT_MEMORY_LIMIT_MB, DEFAULT_TIMEOUT, SandboxExecutor
+
+FIELDS = ('file', 'segment', 'status', 'error_type', 'error', 'line', 'elapsed')
+
+# Columns holding the generated code, in order of preference (the notebook reads the second column)
+CODE_COLUMNS = ('Generated Code', 'generated code', 'code')
+
+
+def preprocess_code(code: str) -> str:
+    """
+    Remove the code block markers around a generated code segment, as the notebook does.
+    """
+    if code.startswith("```python"):
+        code = code[9:].strip()
+    elif code.startswith("```"):
+        code = code[3:].strip()
+    if code.endswith("```"):
+        code = code[:-3].strip()
+    return code
+
+
+def _error_line(error: BaseException) -> Optional[int]:
+    # The line of the segment that raised the error: the last frame of the executed code in the traceback
+    if isinstance(error, SyntaxError):
+        return error.lineno
+    frames = [frame for frame in traceback.extract_tb(error.__traceback__) if frame.filename == '<string>']
+    return frames[-1].lineno if frames else None
+
+
+def execute_segment(code: str):
+    """
+    The task of the sandboxed workers: execute a segment with the names of `from class_structure import *`,
+    as the notebook does.
+    Returns:
+        tuple: The status ("ok" or "error"), the type and line of the error, and a description of the error.
+    """
+    namespace = {name: value for name, value in vars(class_structure).items() if not name.startswith('_')}
+    namespace['__builtins__'] = builtins
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(compile_cached(code), namespace)
+    except MemoryError:
+        raise
+    except Exception as e:
+        return 'error', {'error_type': type(e).__name__, 'line': _error_line(e)}, f"{type(e).__name__}: {e}"
+    return 'ok', None, None
+
+
+def check_segments(path: str, codes: Iterable, executor: SandboxExecutor, batch_size: int) -> Iterator[dict]:
+    """
+    Check the segments of one file, yielding the result of every segment in order, one batch at a time.
+    Args:
+        path (str): The file the segments come from, reported in the results.
+        codes (Iterable): The generated code of every segment (None or NaN if missing).
+        executor (SandboxExecutor): The sandbox executing the segments that compile.
+        batch_size (int): The number of segments executed concurrently before their results are yielded.
+    Yields:
+        dict: The result of every segment, with the fields in FIELDS.
+    """
+    batch = []
+
+    def run_batch():
+        runnable = [record for record, code in batch if code is not None]
+        outcomes = executor.run_many([code for record, code in batch if code is not None])
+        for record, (status, result, error, elapsed) in zip(runnable, outcomes):
+            record['elapsed'] += elapsed or 0.0
+            if status == 'ok':
+                continue
+            record['status'] = 'runtime_error' if status == 'error' else status
+            record['error'] = error
+            if result:
+                record.update(result)
+        records = [record for record, _ in batch]
+        for record in records:
+            record['elapsed'] = round(record['elapsed'], 6)
+        batch.clear()
+        return records
+
+    for segment, code in enumerate(codes, start=1):
+        record = {'file': path, 'segment': segment, 'status': 'valid', 'error_type': None, 'error': None,
+                  'line': None, 'elapsed': 0.0}
+        if not isinstance(code, str) or not code:
+            record['status'] = 'missing'
+            batch.append((record, None))
+            continue
+        code = preprocess_code(code)
+        start = time.perf_counter()
+        try:
+            compile_cached(code)
+        except (SyntaxError, ValueError) as e:
+            record.update(status='syntax_error', error_type=type(e).__name__, error=str(e), line=_error_line(e))
+            code = None
+        record['elapsed'] = time.perf_counter() - start
+        batch.append((record, code))
+        if len(batch) >= batch_size:
+            yield from run_batch()
+    if batch:
+        yield from run_batch()
+
+
+def read_segments(path: str, column: Optional[str] = None) -> list:
+    """
+    Read the generated code segments of a CSV file.
+    Args:
+        path (str): The CSV file.
+        column (str, optional): The column with the generated code; by default the first of CODE_COLUMNS
+            present, or the second column as in the notebook.
+    Returns:
+        list: The generated code of every row.
+    """
+    df = pd.read_csv(path)
+    if column is None:
+        column = next((c for c in CODE_COLUMNS if c in df.columns), df.columns[1])
+    return df[column].tolist()
+
+
+class ResultWriter:
+    """
+    Writes the result records to a CSV or JSON lines file (by its extension), flushing every record.
+    """
+
+    def __init__(self, output: IO[str], jsonl: bool):
+        self.output = output
+        self.jsonl = jsonl
+        self._csv = None if jsonl else csv.DictWriter(output, fieldnames=FIELDS)
+        if self._csv is not None:
+            self._csv.writeheader()
+
+    def write(self, record: dict):
+        if self.jsonl:
+            self.output.write(json.dumps(record) + '\n')
+        else:
+            self._csv.writerow(record)
+        self.output.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that generated code segments compile and execute, in parallel.')
+    parser.add_argument('files', nargs='+', help='CSV files with the generated code')
+    parser.add_argument('-o', '--output', required=True, help='result file, JSON lines if it ends with .jsonl, CSV otherwise')
+    parser.add_argument('--column', help='column with the generated code (default: ' + ', '.join(CODE_COLUMNS) + ')')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of sandboxed worker processes')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='time limit per segment (seconds)')
+    parser.add_argument('--memory-limit', type=int, default=DEFAULT_MEMORY_LIMIT_MB, help='memory limit per segment (MB)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='number of segments executed before their results are written (default: 8 per worker)')
+    args = parser.parse_args()
+
+    batch_size = args.batch_size or 8 * args.workers
+    with open(args.output, 'w', newline='', encoding='utf-8') as output, \
+            SandboxExecutor(workers=args.workers, timeout=args.timeout, memory_limit_mb=args.memory_limit,
+                            task=execute_segment) as executor:
+        writer = ResultWriter(output, args.output.endswith('.jsonl'))
+        for path in args.files:
+            counts = {}
+            for record in check_segments(path, read_segments(path, args.column), executor, batch_size):
+                writer.write(record)
+                counts[record['status']] = counts.get(record['status'], 0) + 1
+            total = sum(counts.values())
+            valid = counts.get('valid', 0)
+            details = ', '.join(f"{status} {count}" for status, count in sorted(counts.items()) if status != 'valid')
+            print(f"{path}: {valid}/{total} valid code segments ({valid / total * 100 if total else 0:.2f}%)"
+                  + (f"; {details}" if details else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# This module provides a persistent approximate nearest-neighbor index over the development embeddings,
+# for selecting demonstrations from development pools too large to scan for every test sample.
+#
+# The index is an inverted file (IVF): the normalized embeddings are clustered with spherical k-means,
+# and every cluster (list) stores its members contiguously. A query only scans the lists whose centroids
+# are the most similar to it. Lists are also partitioned by tags: every list keeps the union of the tags
+# of its members, so lists without a member sharing a tag with the query are never probed, and rows
+# sharing no tag are dropped before the similarity ranking.
+
+import json
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from demo_selection import POPCOUNT, encode_tags
+
+# Arrays of a saved index, each stored as <name>.npy
+INDEX_ARRAYS = ('centroids', 'offsets', 'ids', 'vectors', 'tag_bits', 'list_tag_bits')
+
+# Number of training points per list used by k-means
+TRAINING_POINTS_PER_LIST = 256
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scale every row of a matrix to unit length (rows of zeros are left as they are).
+    Args:
+        matrix (np.ndarray): The matrix.
+    Returns:
+        np.ndarray: A float32 matrix with unit rows.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """
+    Cluster unit vectors by cosine similarity.
+    Args:
+        vectors (np.ndarray): The unit vectors, of shape (n, dim).
+        n_clusters (int): The number of clusters.
+        iterations (int): The number of assignment and update steps.
+        seed (int): The seed of the initialization.
+    Returns:
+        np.ndarray: The unit centroids, of shape (n_clusters, dim).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign_lists(vectors, centroids)
+        sizes = np.bincount(assignment, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        nonempty = np.flatnonzero(sizes)
+        starts = np.concatenate(([0], np.cumsum(sizes[nonempty])[:-1]))
+        sums[nonempty] = np.add.reduceat(vectors[np.argsort(assignment, kind='stable')], starts)
+        # Empty clusters restart from random points
+        empty = np.flatnonzero(sizes == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """
+    Assign every vector to its most similar centroid.
+    Args:
+        vectors (np.ndarray): The unit vectors, of shape (n, dim).
+        centroids (np.ndarray): The unit centroids, of shape (n_lists, dim).
+        batch_size (int): The number of vectors scored at a time.
+    Returns:
+        np.ndarray: The list of every vector.
+    """
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        assignment[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return assignment
+
+
+class DemoIndex:
+    """
+    An IVF index over the embeddings and tags of a development set. Search results are positions in the
+    development set, ranked like the demonstration selection (see demo_selection.py): by the number of
+    shared tags, then by cosine similarity.
+
+    Attributes:
+        centroids (np.ndarray): The unit centroids of the lists, of shape (n_lists, dim).
+        offsets (np.ndarray): The start of every list in ids, vectors and tag_bits, plus the total count.
+        ids (np.ndarray): The development set position of every row, grouped by list.
+        vectors (np.ndarray): The unit embeddings (float32), grouped by list.
+        tag_bits (np.ndarray): The packed tag bitmasks of every row, grouped by list.
+        list_tag_bits (np.ndarray): The union of the tag bitmasks of every list.
+        vocabulary (List[str]): The tag vocabulary of the bitmasks.
+    """
+
+    def __init__(self, centroids, offsets, ids, vectors, tag_bits, list_tag_bits, vocabulary: List[str]):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+        self.tag_bits = tag_bits
+        self.list_tag_bits = list_tag_bits
+        self.vocabulary = list(vocabulary)
+        self._tag_index = {tag: i for i, tag in enumerate(self.vocabulary)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, tag_lists: List[Iterable[str]], n_lists: Optional[int] = None,
+              iterations: int = 20, seed: int = 0) -> 'DemoIndex':
+        """
+        Build an index over a development set.
+        Args:
+            embeddings: The embeddings of the development set, of shape (n, dim).
+            tag_lists (List[Iterable[str]]): The tags of every sample of the development set.
+            n_lists (int, optional): The number of lists. Defaults to about 4 * sqrt(n).
+            iterations (int): The number of k-means iterations.
+            seed (int): The seed of the k-means initialization and training sample.
+        Returns:
+            DemoIndex: The index.
+        """
+        vectors = normalize_rows(embeddings)
+        n = len(vectors)
+        if n == 0:
+            raise ValueError('Cannot build an index over an empty development set.')
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        # K-means is trained on a sample, then every vector is assigned to its list
+        rng = np.random.default_rng(seed)
+        training = vectors
+        if n > n_lists * TRAINING_POINTS_PER_LIST:
+            training = vectors[rng.choice(n, n_lists * TRAINING_POINTS_PER_LIST, replace=False)]
+        centroids = spherical_kmeans(training, n_lists, iterations, seed)
+        assignment = assign_lists(vectors, centroids)
+
+        vocabulary = sorted({tag for tags in tag_lists for tag in tags})
+        tag_bits = encode_tags([list(tags) for tags in tag_lists], {tag: i for i, tag in enumerate(vocabulary)})
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+        list_tag_bits = np.zeros((n_lists, tag_bits.shape[1]), dtype=np.uint8)
+        np.bitwise_or.at(list_tag_bits, assignment, tag_bits)
+        return cls(centroids, offsets, order.astype(np.int64), vectors[order], tag_bits[order], list_tag_bits, vocabulary)
+
+    def save(self, directory: str):
+        """
+        Save the index to a directory, as one .npy file per array plus index.json.
+        Args:
+            directory (str): The directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), np.asarray(getattr(self, name)))
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump({'vocabulary': self.vocabulary, 'n_lists': self.n_lists, 'count': len(self)}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'DemoIndex':
+        """
+        Load an index saved with save().
+        Args:
+            directory (str): The directory.
+            mmap (bool): Whether to memory-map the arrays instead of reading them.
+        Returns:
+            DemoIndex: The index.
+        """
+        with open(os.path.join(directory, 'index.json')) as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, name + '.npy'), mmap_mode='r' if mmap else None) for name in INDEX_ARRAYS]
+        return cls(*arrays, meta['vocabulary'])
+
+    def search(self, embedding, tags: Iterable[str], k: int = 5, nprobe: int = 32) -> np.ndarray:
+        """
+        Find the best demonstrations for a test sample.
+        Args:
+            embedding: The embedding of the test sample.
+            tags (Iterable[str]): The tags of the test sample.
+            k (int): The number of demonstrations to return.
+            nprobe (int): The number of lists to scan, among those sharing a tag with the test sample.
+        Returns:
+            np.ndarray: The development set positions of up to k demonstrations sharing a tag, best first.
+        """
+        query = normalize_rows(np.asarray(embedding)[None, :])[0]
+        bits = encode_tags([list(tags)], self._tag_index)[0]
+        # Tag pre-filter: only lists with a member sharing a tag are probed
+        eligible = np.flatnonzero(POPCOUNT[self.list_tag_bits & bits].sum(axis=1))
+        if len(eligible) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        centroid_scores = self.centroids[eligible] @ query
+        if len(eligible) > nprobe:
+            eligible = eligible[np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]]
+        rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in eligible])
+        counts = POPCOUNT[self.tag_bits[rows] & bits].sum(axis=1, dtype=np.int64)
+        matching = counts > 0
+        rows, counts = rows[matching], counts[matching]
+        similarities = self.vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-(counts * 4.0 + similarities), k - 1)[:k]
+            rows, counts, similarities = rows[top], counts[top], similarities[top]
+        order = np.lexsort((-similarities, -counts))
+        return np.asarray(self.ids[rows[order]])
+
+    def select(self, test_sample: dict, demos: List[dict], n: int = 5, nprobe: int = 32) -> List[dict]:
+        """
+        Select the demonstrations for a test sample from the development set the index was built on.
+        Args:
+            test_sample (dict): The test sample containing 'tags' and 'embedding'.
+            demos (List[dict]): The development set, in the order used to build the index.
+            n (int): Number of top demonstrations to return.
+            nprobe (int): The number of lists to scan.
+        Returns:
+            list: The top n demonstrations (or fewer if not enough share a tag), best first.
+        """
+        return [demos[i] for i in self.search(test_sample['embedding'], test_sample['tags'], n, nprobe)]
@@ -0,0 +1,147 @@
+# This module provides the vectorized selection of demonstrations for the code generation prompts.
+# Demonstrations are ranked by the number of tags they share with the test sample, then by the cosine
+# similarity of their embeddings, with the ties broken by a random shuffle as in the original select_demos.
+
+import random
+from typing import Iterable, Iterator, List
+
+import numpy as np
+
+# Number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Margin around the n-th best approximate score within which candidates are ranked exactly
+RANKING_TOLERANCE = 1e-6
+
+
+def encode_tags(tag_lists: List[Iterable[str]], tag_index: dict) -> np.ndarray:
+    """
+    Encode tag lists as bitmasks over a tag vocabulary, packed into bytes.
+    Tags outside the vocabulary are dropped, as no demonstration can share them.
+    Args:
+        tag_lists (List[Iterable[str]]): The tags of every sample.
+        tag_index (dict): The position of every tag of the vocabulary.
+    Returns:
+        np.ndarray: A uint8 array of shape (len(tag_lists), ceil(len(tag_index) / 8)).
+    """
+    flags = np.zeros((len(tag_lists), len(tag_index)), dtype=bool)
+    for i, tags in enumerate(tag_lists):
+        for tag in tags:
+            j = tag_index.get(tag)
+            if j is not None:
+                flags[i, j] = True
+    return np.packbits(flags, axis=1)
+
+
+class DemoSelector:
+    """
+    Selects demonstrations from a development set for test samples.
+
+    The development set is indexed once: the tags of every demonstration are encoded as a bitmask over
+    the tag vocabulary and the embedding matrix is normalized, so scoring a batch of test samples is
+    one matrix multiply plus a vectorized popcount of the shared tags. The top n are found with
+    argpartition and only the few candidates around the cut-off are ranked with the scalar cosine
+    similarity, which keeps the rankings identical to the original select_demos.
+
+    Tie-breaking shuffles the matching demonstrations with rng exactly as select_demos did, so with
+    the global random module (the default) and the same seed, the selected demonstrations and the
+    random state left behind are the same as before.
+
+    Attributes:
+        demos (list): The demonstration samples, each containing 'tags' and 'embedding'.
+        rng: The random number generator used for tie-breaking (random or a random.Random).
+    """
+
+    def __init__(self, demos: List[dict], rng=random):
+        self.demos = list(demos)
+        self.rng = rng
+        vocabulary = sorted({tag for demo in self.demos for tag in demo['tags']})
+        self._tag_index = {tag: i for i, tag in enumerate(vocabulary)}
+        self._tag_bits = encode_tags([demo['tags'] for demo in self.demos], self._tag_index)
+        if self.demos:
+            # Keep the dtype of the embeddings, so the exact scores match np.dot on the original vectors
+            self._embeddings = np.asarray([demo['embedding'] for demo in self.demos])
+            self._norms = np.array([np.linalg.norm(v) for v in self._embeddings])
+            self._unit_embeddings = self._embeddings.astype(np.float64) / self._norms[:, None]
+        else:
+            self._embeddings = self._unit_embeddings = np.zeros((0, 0))
+            self._norms = np.zeros(0)
+
+    def overlap_counts(self, test_samples: List[dict]) -> np.ndarray:
+        """
+        Count the tags shared by every test sample and every demonstration.
+        Args:
+            test_samples (List[dict]): The test samples containing 'tags'.
+        Returns:
+            np.ndarray: An integer array of shape (len(test_samples), len(demos)).
+        """
+        bits = encode_tags([sample['tags'] for sample in test_samples], self._tag_index)
+        return POPCOUNT[bits[:, None, :] & self._tag_bits[None, :, :]].sum(axis=2, dtype=np.int64)
+
+    def similarities(self, test_samples: List[dict]) -> np.ndarray:
+        """
+        Compute the cosine similarity between every test sample and every demonstration.
+        Args:
+            test_samples (List[dict]): The test samples containing 'embedding'.
+        Returns:
+            np.ndarray: A float array of shape (len(test_samples), len(demos)).
+        """
+        queries = np.asarray([sample['embedding'] for sample in test_samples], dtype=np.float64)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        return queries @ self._unit_embeddings.T
+
+    def _rank(self, test_sample: dict, counts: np.ndarray, similarities: np.ndarray, n: int) -> List[dict]:
+        # Shuffle the matching demonstrations as select_demos did; the shuffle only depends on their number
+        matches = np.flatnonzero(counts > 0).tolist()
+        self.rng.shuffle(matches)
+        if not matches or n <= 0:
+            return []
+        matches = np.array(matches)
+        match_counts = counts[matches]
+        # The overlap counts are integers and the similarities lie in [-1, 1], so this orders by both
+        approx = match_counts * 4.0 + similarities[matches]
+        if len(matches) > n:
+            cutoff = approx[np.argpartition(-approx, n - 1)[:n]].min()
+            candidates = np.flatnonzero(approx >= cutoff - RANKING_TOLERANCE)
+        else:
+            candidates = np.arange(len(matches))
+        query = np.asarray(test_sample['embedding'])
+        query_norm = np.linalg.norm(query)
+        exact = np.array([np.dot(query, self._embeddings[j]) / (query_norm * self._norms[j]) for j in matches[candidates]])
+        # Descending by overlap and similarity; the shuffled position breaks ties like a stable sort
+        order = np.lexsort((candidates, -exact, -match_counts[candidates]))[:n]
+        return [self.demos[j] for j in matches[candidates[order]]]
+
+    def select(self, test_sample: dict, n: int = 5) -> List[dict]:
+        """
+        Select the demonstrations for one test sample.
+        Args:
+            test_sample (dict): The test sample containing 'tags' and 'embedding'.
+            n (int): Number of top demonstrations to return.
+        Returns:
+            list: The top n demonstrations (or fewer if not enough share a tag), best first.
+        """
+        return next(self.select_many([test_sample], n))
+
+    def select_many(self, test_samples: List[dict], n: int = 5) -> Iterator[List[dict]]:
+        """
+        Select the demonstrations for a batch of test samples, scored together.
+        The selections are yielded one test sample at a time, so random draws made by the caller between
+        two samples (e.g. random demonstrations when none match) happen in the same order as with select().
+        Args:
+            test_samples (List[dict]): The test samples containing 'tags' and 'embedding'.
+            n (int): Number of top demonstrations to return per test sample.
+        Yields:
+            list: The top n demonstrations of each test sample, in the order of the test samples.
+        """
+        test_samples = list(test_samples)
+        if not test_samples:
+            return
+        if not self.demos:
+            for _ in test_samples:
+                yield []
+            return
+        counts = self.overlap_counts(test_samples)
+        similarities = self.similarities(test_samples)
+        for i, test_sample in enumerate(test_samples):
+            yield self._rank(test_sample, counts[i], similarities[i], n)
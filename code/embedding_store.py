@@ -0,0 +1,184 @@
+# This module provides a persistent store of text embeddings for the development and test sets.
+# Texts are embedded in batches, identical texts are embedded only once, and the vectors are kept
+# on disk as a memory-mapped float32 array, so repeated runs and folds load them instantly.
+
+import hashlib
+import json
+import os
+from typing import List
+
+import numpy as np
+
+# The length of a text hash (a SHA-256 hex digest)
+HASH_LENGTH = 64
+
+
+def text_hash(text: str) -> str:
+    """
+    Compute the hash identifying a text in the store.
+    Args:
+        text (str): The text.
+    Returns:
+        str: The hex digest of the text.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class HashEmbeddings:
+    """
+    A deterministic, offline stand-in for an embedding model with the embed_query/embed_documents
+    interface of LangChain embeddings. Each word and word bigram is hashed into one of dim buckets
+    with a pseudo-random sign, and the vector is L2-normalized, so texts sharing words get similar vectors.
+
+    Attributes:
+        dim (int): The dimension of the vectors.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _bucket(self, token: str):
+        digest = hashlib.md5(token.encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'little') % self.dim, 1.0 if digest[4] & 1 else -1.0
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a single text.
+        Args:
+            text (str): The text.
+        Returns:
+            List[float]: The embedding vector.
+        """
+        vector = np.zeros(self.dim)
+        words = text.lower().split()
+        for token in words + [a + ' ' + b for a, b in zip(words, words[1:])]:
+            bucket, sign = self._bucket(token)
+            vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several texts.
+        Args:
+            texts (List[str]): The texts.
+        Returns:
+            List[List[float]]: The embedding vectors, in the order of the texts.
+        """
+        return [self.embed_query(text) for text in texts]
+
+
+class EmbeddingStore:
+    """
+    A persistent store of embeddings in a directory, holding:
+      - vectors.f32: the vectors as a raw float32 array of shape (n, dim), opened as a NumPy memmap
+      - index.json: the model name and the dimension, written once with the first vectors
+      - hashes.txt: the text hash of every row, one per line, appended once the vectors of a batch are written
+
+    New texts are de-duplicated and sent to embeddings.embed_documents in batches of batch_size,
+    then appended to the store. A store only holds vectors of one model; opening it with another
+    model name raises a ValueError.
+
+    Attributes:
+        directory (str): The directory of the store.
+        embeddings: The embedding model, e.g. OpenAIEmbeddings or HashEmbeddings.
+        model (str): The name of the embedding model.
+        batch_size (int): The number of texts per embed_documents call.
+    """
+
+    def __init__(self, directory: str, embeddings, model: str, batch_size: int = 64):
+        self.directory = directory
+        self.embeddings = embeddings
+        self.model = model
+        self.batch_size = batch_size
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._index_path = os.path.join(directory, 'index.json')
+        self._hashes_path = os.path.join(directory, 'hashes.txt')
+        self.dim = None
+        self._hashes = []
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                index = json.load(f)
+            if index['model'] != model:
+                raise ValueError(f"The embedding store in {directory} holds vectors of {index['model']}, not {model}.")
+            self.dim = index['dim']
+            self._hashes = self._read_hashes()
+        self._discard_incomplete_rows()
+        self._rows = {h: i for i, h in enumerate(self._hashes)}
+        self._vectors = None
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _read_hashes(self) -> List[str]:
+        if not os.path.exists(self._hashes_path):
+            return []
+        with open(self._hashes_path) as f:
+            lines = f.read().split('\n')
+        # The last element is empty, or a hash that was only partly written
+        return lines[:-1]
+
+    def _discard_incomplete_rows(self):
+        # A run that stopped while appending a batch leaves vectors without hashes (or a partial line);
+        # only the rows with both are kept
+        if self.dim is None:
+            return
+        vector_rows = os.path.getsize(self._vectors_path) // (self.dim * 4) if os.path.exists(self._vectors_path) else 0
+        rows = min(len(self._hashes), vector_rows)
+        self._hashes = self._hashes[:rows]
+        for path, size in ((self._vectors_path, rows * self.dim * 4), (self._hashes_path, rows * (HASH_LENGTH + 1))):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """
+        The stored vectors, memory-mapped read-only, with one row per stored text.
+        """
+        if self._vectors is None:
+            if not self._hashes:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(len(self._hashes), self.dim))
+        return self._vectors
+
+    def _append(self, hashes: List[str], vectors: np.ndarray):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            tmp_path = self._index_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'model': self.model, 'dim': self.dim}, f)
+            os.replace(tmp_path, self._index_path)
+        with open(self._vectors_path, 'ab') as f:
+            f.write(np.ascontiguousarray(vectors, dtype='<f4').tobytes())
+        # The hashes go after their vectors, so a hash is only ever stored for a complete vector
+        with open(self._hashes_path, 'a') as f:
+            f.write(''.join(h + '\n' for h in hashes))
+        for h in hashes:
+            self._rows[h] = len(self._hashes)
+            self._hashes.append(h)
+        self._vectors = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Get the embeddings of texts, computing only those that are not stored yet.
+        Args:
+            texts (List[str]): The texts.
+        Returns:
+            np.ndarray: A float32 array of shape (len(texts), dim), in the order of the texts.
+        """
+        hashes = [text_hash(text) for text in texts]
+        missing = {}
+        for text, h in zip(texts, hashes):
+            if h not in self._rows and h not in missing:
+                missing[h] = text
+        missing_hashes = list(missing)
+        for start in range(0, len(missing_hashes), self.batch_size):
+            batch = missing_hashes[start:start + self.batch_size]
+            vectors = np.asarray(self.embeddings.embed_documents([missing[h] for h in batch]), dtype=np.float32)
+            # Store every batch right away, so an interrupted run keeps what it already paid for
+            self._append(batch, vectors)
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self.vectors[[self._rows[h] for h in hashes]])
@@ -0,0 +1,240 @@
+# This module provides a persistent, content-addressed cache of executed and serialized code snippets.
+# Ground truth code is identical across passes and folds, so its extraction only has to be computed once.
+
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import time
+from typing import Optional
+
+import class_structure
+import class_structure_lean
+import serialize
+import snippet_interpreter
+import test_statements
+from test_statements import SerializedExtraction, SnippetExtraction
+
+# Default upper bound for the total size of the cached entries (in bytes)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Number of cache hits whose access times are kept in memory before they are written to the database
+ACCESS_FLUSH_SIZE = 256
+
+
+def structure_version() -> str:
+    """
+    Compute a fingerprint of the code that produces an extraction.
+    Cached extractions are only valid for the exact code that produced them, so the fingerprint is part of
+    every cache key: the class structure, the serialization, the snippet interpreter and test_statements
+    without its attribute test functions (which run the snippets and build the extractions).
+    Returns:
+        str: A hex digest of the source of these modules.
+    """
+    source = inspect.getsource(test_statements)
+    for test in dict.fromkeys(test for test, _ in test_statements.ATTRIBUTE_TESTS.values()):
+        source = source.replace(inspect.getsource(test), '')
+    digest = hashlib.sha256(source.encode('utf-8'))
+    for module in (class_structure, class_structure_lean, serialize, snippet_interpreter):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def normalize_code(code: str) -> str:
+    """
+    Normalize a code string before hashing it.
+    Only changes that cannot alter the result of executing the code are applied:
+    line endings are unified and trailing whitespace at the end of the snippet is removed.
+    Args:
+        code (str): The code string to normalize.
+    Returns:
+        str: The normalized code string.
+    """
+    return code.replace('\r\n', '\n').rstrip()
+
+
+class ExtractionCache:
+    """
+    A size-bounded, least recently used cache of serialized snippet extractions stored in SQLite.
+
+    Entries are keyed by a hash of the normalized code string and the class structure version.
+    When the total size of the entries exceeds max_bytes, the least recently used entries are evicted.
+    Hits only read the database: their access times are kept in memory and written in batches, when an
+    entry is stored, every ACCESS_FLUSH_SIZE hits and on close, so workers sharing the file do not
+    contend for its write lock on every hit.
+    On a miss the code is executed in-process, or by the executor if one is given (e.g. a
+    sandbox.SandboxExecutor); outcomes of executions that were stopped are not cached.
+
+    Attributes:
+        path (str): The path of the SQLite database file.
+        max_bytes (int): The maximum total size of the cached entries.
+        hits (int): The number of lookups served from the cache.
+        misses (int): The number of lookups that required executing the code.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, executor=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.executor = executor
+        self.version = structure_version()
+        self.hits = 0
+        self.misses = 0
+        self._accessed = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_access ON extractions (last_access)")
+        self._conn.commit()
+
+    def key(self, code: str) -> str:
+        """
+        Compute the cache key of a code string.
+        Args:
+            code (str): The code string.
+        Returns:
+            str: The hex digest identifying the code under the current class structure version.
+        """
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_code(code).encode('utf-8'))
+        return digest.hexdigest()
+
+    def extract(self, code):
+        """
+        Get the extraction of a code string, executing the code only on a cache miss.
+        Args:
+            code (str): The code string to extract.
+        Returns:
+            SerializedExtraction or SnippetExtraction: An object providing serialized(group) for the code.
+        """
+        if not isinstance(code, str):
+            # Missing code (e.g. NaN cells in a DataFrame) is not worth caching
+            return self._execute(code)
+        extraction = self._lookup(code)
+        if extraction is None:
+            extraction = self._execute(code)
+            self._remember(code, extraction)
+        return extraction
+
+    def extract_many(self, codes):
+        """
+        Get the extractions of several code strings. The cache misses are executed as one batch
+        if the executor supports it (see sandbox.SandboxExecutor.extract_many).
+        Args:
+            codes (list): The code strings to extract.
+        Returns:
+            list: The extractions, in the order of the code strings.
+        """
+        if self.executor is None or not hasattr(self.executor, 'extract_many'):
+            return [self.extract(code) for code in codes]
+        results = [self._lookup(code) if isinstance(code, str) else None for code in codes]
+        missing = [index for index, extraction in enumerate(results) if extraction is None]
+        for index, extraction in zip(missing, self.executor.extract_many([codes[i] for i in missing])):
+            results[index] = extraction
+            if isinstance(codes[index], str):
+                self._remember(codes[index], extraction)
+        return results
+
+    def _lookup(self, code: str):
+        key = self.key(code)
+        row = self._conn.execute("SELECT value FROM extractions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        self._accessed[key] = time.time()
+        if len(self._accessed) >= ACCESS_FLUSH_SIZE:
+            self.flush()
+        return SerializedExtraction(code, json.loads(row[0]))
+
+    def _remember(self, code: str, extraction):
+        self.misses += 1
+        if getattr(extraction, 'status', 'ok') in ('ok', 'error'):
+            entry = self._entry(extraction)
+            if entry is not None:
+                self._store(self.key(code), entry)
+
+    def _execute(self, code):
+        if self.executor is not None:
+            return self.executor.extract(code)
+        return SnippetExtraction(code)
+
+    def _entry(self, extraction) -> Optional[dict]:
+        entry = extraction.to_entry()
+        # Only cache entries that survive a JSON round trip unchanged, so that a cached
+        # result always compares exactly like a freshly computed one
+        try:
+            if json.loads(json.dumps(entry)) != entry:
+                return None
+        except (TypeError, ValueError):
+            return None
+        return entry
+
+    def _store(self, key: str, entry: dict):
+        value = json.dumps(entry)
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        # The pending access times go first, so the eviction sees the entries that were just used
+        self._write_accesses()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO extractions (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time())
+        )
+        self._evict()
+        self._conn.commit()
+
+    def _write_accesses(self):
+        if self._accessed:
+            self._conn.executemany("UPDATE extractions SET last_access = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed = {}
+
+    def flush(self):
+        """
+        Write the access times of the recent cache hits to the database.
+        """
+        if self._accessed:
+            self._write_accesses()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM extractions ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        """
+        Get the usage statistics of the cache.
+        Returns:
+            dict: The hits, misses, number of entries and total size of the cache.
+        """
+        entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        self._accessed = {}
+        self._conn.execute("DELETE FROM extractions")
+        self._conn.commit()
+
+    def close(self):
+        """
+        Write the pending access times and close the underlying database connection.
+        """
+        self.flush()
+        self._conn.close()
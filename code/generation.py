@@ -0,0 +1,233 @@
+# This module provides an asynchronous engine for prompting OpenAI-compatible chat models concurrently.
+# Almost all of the generation time is network latency, so requests are sent concurrently within the
+# request and token rate limits of the API, and failed requests are retried with jittered backoff. A prompt
+# that still fails gets None instead of a response, so the responses of the other prompts are kept in order.
+
+import asyncio
+import csv
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+# Default limits of the engine
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 30000
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of tokens of a text (about four characters per token for English).
+    Args:
+        text (str): The text.
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter. The bucket refills continuously at rate_per_minute and holds at most
+    capacity units; acquiring waits until enough units are available.
+
+    Attributes:
+        rate_per_minute (float): The number of units added to the bucket per minute.
+        capacity (float): The maximum number of units in the bucket.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate_per_minute / 60)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        """
+        Wait until amount units are available and take them from the bucket.
+        Requests larger than the capacity are allowed once the bucket is full.
+        Args:
+            amount (float): The number of units to take.
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._available >= amount:
+                    self._available -= amount
+                    return
+                await asyncio.sleep((amount - self._available) * 60 / self.rate_per_minute)
+
+    def adjust(self, amount: float):
+        """
+        Correct the bucket after the fact, e.g. once the actual token usage of a request is known.
+        Args:
+            amount (float): The number of units to give back (positive) or to take in addition (negative).
+        """
+        self._refill()
+        self._available = min(self.capacity, self._available + amount)
+
+
+class AsyncGenerationEngine:
+    """
+    Sends prompts to an OpenAI-compatible chat completions API concurrently and returns the responses
+    in the order of the prompts.
+
+    The number of requests in flight is bounded by concurrency, and token buckets keep the requests and
+    tokens per minute within the limits of the account. Rate limit, timeout, connection and server
+    errors are retried with exponential backoff and full jitter, honouring Retry-After when the server
+    sends it. The jitter uses its own random number generator, so the global random state used for
+    demonstration selection is left untouched.
+
+    Attributes:
+        model (str): The model name.
+        temperature (float): The sampling temperature.
+        concurrency (int): The maximum number of requests in flight.
+        max_retries (int): The number of retries of a failed request.
+        expected_output_tokens (int): The number of output tokens reserved per request before its usage is known.
+        retries (int): The number of retried requests so far.
+        failures (Dict[int, str]): The prompts of the last generate() call that failed, by index, with the
+            error; their responses are None.
+        cache (ResponseCache, optional): A persistent response cache (see response_cache.py).
+    """
+
+    def __init__(self, client=None, model: str = 'gpt-4o', temperature: float = 0.5,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 expected_output_tokens: int = 1024, seed: Optional[int] = None, cache=None, **client_kwargs):
+        if client is None:
+            from openai import AsyncOpenAI
+            # client_kwargs can point the engine to another server, e.g. base_url and api_key.
+            # Retries are handled by the engine, so that they go through the rate limiters
+            client_kwargs.setdefault('max_retries', 0)
+            client = AsyncOpenAI(**client_kwargs)
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.expected_output_tokens = expected_output_tokens
+        self.retries = 0
+        self.failures: Dict[int, str] = {}
+        self.cache = cache
+        self._requests_per_minute = requests_per_minute
+        self._tokens_per_minute = tokens_per_minute
+        self._rng = random.Random(seed)
+
+    async def _create(self, prompt: str):
+        return await self.client.chat.completions.create(
+            model=self.model,
+            store=True,
+            messages=[
+                {'role': 'user', 'content': prompt}
+            ],
+            temperature=self.temperature
+        )
+
+    def _retry_delay(self, attempt: int, error) -> float:
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after is not None:
+            try:
+                return min(self.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _complete(self, prompt: str, semaphore, request_bucket, token_bucket) -> str:
+        import openai
+        retryable = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+        reserved = estimate_tokens(prompt) + self.expected_output_tokens
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await request_bucket.acquire(1)
+                await token_bucket.acquire(reserved)
+                try:
+                    completion = await self._create(prompt)
+                except retryable as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self.retries += 1
+                    await asyncio.sleep(self._retry_delay(attempt, e))
+                    continue
+                usage = getattr(completion, 'usage', None)
+                if usage is not None and getattr(usage, 'total_tokens', None):
+                    token_bucket.adjust(reserved - usage.total_tokens)
+                # The content is None when the model produced no text, e.g. after a content filter finish
+                return completion.choices[0].message.content or ''
+
+    async def generate(self, prompts: List[str], progress: Optional[Callable[[int], None]] = None,
+                       pass_index: int = 0) -> List[Optional[str]]:
+        """
+        Prompt the model with every prompt concurrently.
+        Responses found in the response cache (if any) are served without a request, and new
+        responses are added to the cache as soon as they arrive. A prompt whose request fails after
+        all retries, or with an error that is not retried, gets None and is recorded in failures;
+        nothing is cached for it, so it is requested again on the next run.
+        Args:
+            prompts (List[str]): The prompts.
+            progress (Callable[[int], None], optional): Called with the prompt index whenever a response arrives.
+            pass_index (int): The index of the pass, which keeps the cached responses of different passes apart.
+        Returns:
+            List[Optional[str]]: The responses, in the order of the prompts, with None for the failed prompts.
+        """
+        # Synchronization primitives are bound to the running event loop, so they are created per call
+        semaphore = asyncio.Semaphore(self.concurrency)
+        request_bucket = TokenBucket(self._requests_per_minute)
+        token_bucket = TokenBucket(self._tokens_per_minute)
+        self.failures = {}
+
+        async def complete(index, prompt):
+            response = None
+            if self.cache is not None:
+                response = self.cache.get(prompt, self.model, self.temperature, pass_index)
+            if response is None:
+                try:
+                    response = await self._complete(prompt, semaphore, request_bucket, token_bucket)
+                except Exception as e:
+                    self.failures[index] = f"{type(e).__name__}: {e}"
+                if self.cache is not None and response:
+                    self.cache.put(prompt, self.model, self.temperature, response, pass_index)
+            if progress is not None:
+                progress(index)
+            return response
+
+        return await asyncio.gather(*(complete(i, p) for i, p in enumerate(prompts)))
+
+    def run(self, prompts: List[str], progress: Optional[Callable[[int], None]] = None,
+            pass_index: int = 0) -> List[Optional[str]]:
+        """
+        Synchronous wrapper of generate() for scripts. In a notebook, use `await engine.generate(prompts)` instead.
+        Args:
+            prompts (List[str]): The prompts.
+            progress (Callable[[int], None], optional): Called with the prompt index whenever a response arrives.
+            pass_index (int): The index of the pass, which keeps the cached responses of different passes apart.
+        Returns:
+            List[Optional[str]]: The responses, in the order of the prompts, with None for the failed prompts.
+        """
+        return asyncio.run(self.generate(prompts, progress, pass_index))
+
+
+def write_pass_csv(test_samples: List[dict], answers: List[str], output_file: str):
+    """
+    Write the generated code of one pass next to the test samples, in the format of testing_set_pass_N.csv.
+    Args:
+        test_samples (List[dict]): The test samples, with 'text' and 'tags'.
+        answers (List[str]): The generated code, in the order of the test samples.
+        output_file (str): The path of the CSV file.
+    """
+    with open(output_file, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['text', 'code', 'tags'])
+        for t, answer in zip(test_samples, answers):
+            writer.writerow([t['text'], answer, t['tags']])
@@ -0,0 +1,412 @@
+# This module provides a compact binary snapshot of the objects extracted from an executed code snippet, so
+# consumers (the semantic tests, compliance tooling, diffing) can load the Section/Statement graph of generated
+# code without executing the untrusted code again.
+#
+# A snapshot holds the graph of section_graph.py as fixed-size tables and a string pool:
+#   header      magic, version and the size of every table
+#   nodes       one record per node: kind, statement type and the pool IDs of its scalar fields
+#   edges       the (type, target) of every edge, grouped by source node; edge_offsets[i] is the first edge of node i
+#   groups      the node IDs of the SnippetExtraction groups (information, definitions, ...), in order
+#   strings     the pool: every distinct scalar value once, JSON-encoded, addressed by string_offsets
+#   meta        the execution status and the serialization errors of the extraction, as JSON
+# Every table is 8-byte aligned, so a loaded snapshot is a set of NumPy views on the file (memory-mapped or
+# in memory) and strings are only decoded when they are read.
+#
+# Usage: python graph_snapshot.py [--pattern "../test files/*.csv"] [--column code]
+#   checks that every snippet of the files round-trips (the snapshot rebuilds the output of serialize_statement
+#   and serialize_reference exactly) and compares the snapshot loading time with executing the code.
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Union
+
+import numpy as np
+
+from section_graph import EDGE_TYPES, node_record, walk
+from serialize import get_statement_or_expression_id
+from test_statements import SerializedExtraction, SnippetExtraction
+import class_structure_lean as lean
+
+MAGIC = b'LRGS'
+VERSION = 1
+# magic, version, reserved, then the number of nodes, edges, group entries and strings and the size of the
+# string blob and of the meta data
+HEADER = struct.Struct('<4sHH6I')
+
+KINDS = ('section', 'expression', 'reference', 'statement', 'object')
+STATEMENT_TYPES = ('Information', 'Definition', 'Rule', 'Exemption', 'UnknownStatementSubclass')
+# Pool ID of a field the node does not have
+ABSENT = -1
+
+NODE_DTYPE = np.dtype([('kind', 'u1'), ('type', 'u1'), ('reserved', '<u2'), ('text', '<i4'), ('section', '<i4'),
+                       ('extra', '<i4'), ('ident', '<i4')])
+EDGE_DTYPE = np.dtype([('type', '<u2'), ('reserved', '<u2'), ('target', '<u4')])
+
+# The field of the node table holding every key of a node record; 'extra' holds the title of a Section,
+# the relationship of a Reference and the rule type of a Rule
+_FIELDS = {'text': 'text', 'sectionNumber': 'section', 'section': 'section',
+           'sectionTitle': 'extra', 'relationship': 'extra', 'rule_type': 'extra'}
+_EDGE_INDEX = {edge: i for i, edge in enumerate(EDGE_TYPES)}
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _encode(value) -> bytes:
+    """
+    Encode a scalar value for the string pool.
+    Raises:
+        ValueError: If the value would not be decoded unchanged, e.g. a tuple or an arbitrary object.
+    """
+    try:
+        text = json.dumps(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{type(value).__name__} values cannot be stored in a snapshot.")
+    decoded = json.loads(text)
+    if type(decoded) is not type(value) or decoded != value:
+        raise ValueError(f"{type(value).__name__} values cannot be stored in a snapshot.")
+    return text.encode('utf-8')
+
+
+class _PoolBuilder:
+    def __init__(self):
+        self.ids: Dict[bytes, int] = {}
+        self.values: List[bytes] = []
+
+    def add(self, value) -> int:
+        encoded = _encode(value)
+        string_id = self.ids.get(encoded)
+        if string_id is None:
+            string_id = self.ids[encoded] = len(self.values)
+            self.values.append(encoded)
+        return string_id
+
+
+def _describe(obj):
+    # Nodes that cannot be serialized (e.g. a Statement whose section is a string) are kept as plain
+    # objects; the groups holding them failed to serialize and are restored as errors
+    try:
+        return node_record(obj)
+    except Exception:
+        return {'kind': 'object'}, []
+
+
+def dumps(extraction: SnippetExtraction) -> bytes:
+    """
+    Build the snapshot of an extraction.
+    Args:
+        extraction (SnippetExtraction): The extraction of an executed snippet.
+    Returns:
+        bytes: The snapshot.
+    Raises:
+        ValueError: If a scalar field of the graph cannot be stored (see _encode); such extractions are
+            better kept as code and executed.
+    """
+    entry = extraction.to_entry()
+    if extraction.error is None:
+        meta = {'status': 'ok', 'error': None}
+    else:
+        meta = {'status': 'error', 'error': f"{type(extraction.error).__name__}: {extraction.error}"}
+    meta['errors'] = entry['errors']
+
+    groups = [getattr(extraction, group) for group in SnippetExtraction.GROUPS]
+    roots = [obj for group in groups for obj in group]
+    pool = _PoolBuilder()
+    node_rows = {}
+    edges_of = {}
+    object_ids = {}
+    for node_id, obj, record, edges in walk(roots, _describe):
+        object_ids[id(obj)] = node_id
+        row = [KINDS.index(record['kind']), STATEMENT_TYPES.index(record['type']) if 'type' in record else 0,
+               0, ABSENT, ABSENT, ABSENT, ABSENT]
+        for key, field in _FIELDS.items():
+            if key in record:
+                row[NODE_DTYPE.names.index(field)] = pool.add(record[key])
+        # Relationship lists and Reference targets hold the identifiers of their nodes
+        try:
+            identifier = get_statement_or_expression_id(obj)
+        except Exception:
+            identifier = None
+        if identifier is not None:
+            row[6] = pool.add(identifier)
+        node_rows[node_id] = tuple(row)
+        edges_of[node_id] = [(_EDGE_INDEX[edge], 0, target) for edge, targets in edges for target in targets]
+
+    count = len(node_rows)
+    nodes = np.array([node_rows[i] for i in range(count)], dtype=NODE_DTYPE)
+    edge_list = [edge for i in range(count) for edge in edges_of[i]]
+    edges = np.array(edge_list, dtype=EDGE_DTYPE)
+    edge_offsets = np.zeros(count + 1, dtype='<u4')
+    np.cumsum([len(edges_of[i]) for i in range(count)], out=edge_offsets[1:])
+    group_offsets = np.zeros(len(groups) + 1, dtype='<u4')
+    np.cumsum([len(group) for group in groups], out=group_offsets[1:])
+    group_nodes = np.array([object_ids[id(obj)] for obj in roots], dtype='<u4')
+    string_offsets = np.zeros(len(pool.values) + 1, dtype='<u4')
+    np.cumsum([len(value) for value in pool.values], out=string_offsets[1:])
+    blob = b''.join(pool.values)
+    meta_bytes = json.dumps(meta).encode('utf-8')
+
+    out = io.BytesIO()
+    out.write(HEADER.pack(MAGIC, VERSION, 0, count, len(edges), len(group_nodes), len(pool.values),
+                          len(blob), len(meta_bytes)))
+    for part in (nodes.tobytes(), edge_offsets.tobytes(), edges.tobytes(), group_offsets.tobytes(),
+                 group_nodes.tobytes(), string_offsets.tobytes(), blob, meta_bytes):
+        out.write(b'\0' * (_align(out.tell()) - out.tell()))
+        out.write(part)
+    return out.getvalue()
+
+
+def write_snapshot(extraction: SnippetExtraction, path: str):
+    """
+    Write the snapshot of an extraction to a file (see dumps).
+    """
+    with open(path, 'wb') as f:
+        f.write(dumps(extraction))
+
+
+class Snapshot:
+    """
+    A loaded snapshot. The tables are NumPy views on the buffer, so loading copies nothing; serialized
+    dictionaries are rebuilt on request, in the format of serialize.py.
+
+    Attributes:
+        nodes (np.ndarray): The node table.
+        edge_offsets (np.ndarray): The first edge of every node in the edge table.
+        edges (np.ndarray): The edge table.
+        status (str): "ok" if the code ran, "error" if it raised an exception.
+        error (Optional[str]): The exception the code raised, if any.
+        errors (Dict[str, str]): The message of every group whose serialization failed.
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        magic, version, _, count, edge_count, group_count, string_count, blob_size, meta_size = \
+            HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a graph snapshot of a supported version.')
+        self._buffer = buffer
+        offset = HEADER.size
+
+        def table(dtype, length):
+            nonlocal offset
+            offset = _align(offset)
+            array = np.frombuffer(buffer, dtype=dtype, count=length, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self.nodes = table(NODE_DTYPE, count)
+        self.edge_offsets = table('<u4', count + 1)
+        self.edges = table(EDGE_DTYPE, edge_count)
+        self._group_offsets = table('<u4', len(SnippetExtraction.GROUPS) + 1)
+        self._group_nodes = table('<u4', group_count)
+        self._string_offsets = table('<u4', string_count + 1)
+        offset = _align(offset)
+        self._blob = memoryview(buffer)[offset:offset + blob_size]
+        offset = _align(offset + blob_size)
+        meta = json.loads(bytes(memoryview(buffer)[offset:offset + meta_size]))
+        self.status = meta['status']
+        self.error = meta['error']
+        self.errors = meta['errors']
+        self._values = {}
+        self._columns = None
+
+    @classmethod
+    def open(cls, path: str) -> 'Snapshot':
+        """
+        Load a snapshot file by memory-mapping it.
+        """
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def value(self, string_id: int):
+        """
+        Decode a value of the string pool.
+        """
+        if string_id == ABSENT:
+            raise KeyError('The node does not have this field.')
+        value = self._values.get(string_id, self)
+        if value is self:
+            start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+            value = self._values[string_id] = json.loads(bytes(self._blob[start:end]))
+        return value
+
+    def _column(self, name: str) -> list:
+        # Rebuilding a dictionary reads a few fields of many nodes, which is much faster on lists than
+        # element by element on the arrays, so the columns are converted once, on first use
+        if self._columns is None:
+            self._columns = {field: self.nodes[field].tolist() for field in NODE_DTYPE.names}
+            adjacency = {}
+            sources = np.repeat(np.arange(len(self.nodes)), np.diff(self.edge_offsets)).tolist()
+            for source, edge_type, target in zip(sources, self.edges['type'].tolist(), self.edges['target'].tolist()):
+                adjacency.setdefault((source, edge_type), []).append(target)
+            self._columns['adjacency'] = adjacency
+        return self._columns[name]
+
+    def kind(self, node_id: int) -> str:
+        """
+        Get the kind of a node ("section", "expression", "reference", "statement" or "object").
+        """
+        return KINDS[self._column('kind')[node_id]]
+
+    def targets(self, node_id: int, edge: str) -> List[int]:
+        """
+        Get the targets of the edges of one type leaving a node, in order.
+        """
+        return self._column('adjacency').get((node_id, _EDGE_INDEX[edge]), [])
+
+    def identifier(self, node_id: int) -> str:
+        """
+        Get the identifier of a node, as get_statement_or_expression_id returned it.
+        """
+        return self.value(self._column('ident')[node_id])
+
+    def _field(self, node_id: int, field: str):
+        return self.value(self._column(field)[node_id])
+
+    def serialize_expression(self, node_id: int) -> dict:
+        """
+        Rebuild the output of serialize_expression for an Expression node.
+        """
+        if self.kind(node_id) not in ('expression', 'reference'):
+            raise TypeError(f'Node {node_id} is not an Expression.')
+        return {
+            "text": self._field(node_id, 'text'),
+            "includes": [self.serialize_expression(e) for e in self.targets(node_id, 'includes')],
+            "sectionNumber": self._field(node_id, 'section')
+        }
+
+    def _single_expression(self, node_id: int, edge: str) -> dict:
+        targets = self.targets(node_id, edge)
+        if len(targets) != 1:
+            raise TypeError(f'Node {node_id} does not have a single {edge} Expression.')
+        return self.serialize_expression(targets[0])
+
+    def serialize_reference(self, node_id: int) -> dict:
+        """
+        Rebuild the output of serialize_reference for a Reference node.
+        """
+        if self.kind(node_id) != 'reference':
+            raise TypeError(f'Node {node_id} is not a Reference.')
+        return {
+            "text": self._field(node_id, 'text'),
+            "target": self.identifier(self.targets(node_id, 'target')[0]),
+            "sectionNumber": self._field(node_id, 'section'),
+            "relationship": self._field(node_id, 'extra')
+        }
+
+    def serialize_statement(self, node_id: int) -> dict:
+        """
+        Rebuild the output of serialize_statement for a Statement node.
+        """
+        if self.kind(node_id) != 'statement':
+            raise TypeError(f'Node {node_id} is not a Statement.')
+        base = {
+            "section": self._field(node_id, 'section'),
+            "relationships": {
+                key: [self.identifier(t) for t in self.targets(node_id, key)] for key in lean.RELATIONSHIP_TYPES
+            }
+        }
+        statement_type = STATEMENT_TYPES[self._column('type')[node_id]]
+        base["type"] = statement_type
+        if statement_type in ("Information", "Exemption"):
+            base["description"] = [self.serialize_expression(d) for d in self.targets(node_id, 'description')]
+        elif statement_type == "Definition":
+            base["defined_term"] = self._single_expression(node_id, 'defined_term')
+            base["meaning"] = [self.serialize_expression(m) for m in self.targets(node_id, 'meaning')]
+            base["exclusions"] = [self.serialize_expression(e) for e in self.targets(node_id, 'exclusions')]
+        elif statement_type == "Rule":
+            base["rule_type"] = self._field(node_id, 'extra')
+            base["entity"] = self._single_expression(node_id, 'entity')
+            base["description"] = (self._single_expression(node_id, 'description')
+                                   if self.targets(node_id, 'description') else None)
+            base["conditions"] = [self.serialize_expression(c) for c in self.targets(node_id, 'conditions')]
+        return base
+
+    def group(self, group: str) -> List[int]:
+        """
+        Get the node IDs of one group of extracted objects (see SnippetExtraction.GROUPS).
+        """
+        index = SnippetExtraction.GROUPS.index(group)
+        return self._group_nodes[self._group_offsets[index]:self._group_offsets[index + 1]].tolist()
+
+    def serialized(self, group: str) -> List[dict]:
+        """
+        Rebuild the serialized dictionaries of one group, as SnippetExtraction.serialized returned them.
+        """
+        serialize = self.serialize_reference if group == 'references' else self.serialize_statement
+        return [serialize(node_id) for node_id in self.group(group)]
+
+    def to_extraction(self, code: str) -> SerializedExtraction:
+        """
+        Rebuild the extraction the snapshot was made from, e.g. to build an EvaluationContext without
+        executing the code.
+        Args:
+            code (str): The code snippet of the extraction.
+        Returns:
+            SerializedExtraction: The extraction, with the same serialized groups and errors.
+        """
+        entry = {"groups": {}, "errors": dict(self.errors)}
+        for group in SnippetExtraction.GROUPS:
+            if group not in self.errors:
+                entry["groups"][group] = self.serialized(group)
+        return SerializedExtraction(code, entry, self.status, self.error)
+
+
+def loads(buffer) -> Snapshot:
+    """
+    Load a snapshot from a buffer (see Snapshot).
+    """
+    return Snapshot(buffer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that code snippets round-trip through graph snapshots.')
+    parser.add_argument('--pattern', default=os.path.join(os.path.dirname(__file__), '..', 'test files', '*.csv'),
+                        help='glob pattern of the CSV files with the code snippets')
+    parser.add_argument('--column', default='code', help='column of the CSV files holding the code')
+    args = parser.parse_args()
+
+    csv.field_size_limit(2 ** 31 - 1)
+    snippets = mismatches = unsupported = size = 0
+    exec_time = load_time = 0.0
+    for path in sorted(glob.glob(args.pattern)):
+        with open(path, newline='', encoding='utf-8') as f:
+            codes = [row[args.column] for row in csv.DictReader(f)]
+        for code in codes:
+            snippets += 1
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                extraction = SnippetExtraction(code)
+                expected = extraction.to_entry()
+            exec_time += time.perf_counter() - start
+            try:
+                data = dumps(extraction)
+            except ValueError:
+                unsupported += 1
+                continue
+            size += len(data)
+            start = time.perf_counter()
+            entry = loads(data).to_extraction(code).to_entry()
+            load_time += time.perf_counter() - start
+            if entry != expected:
+                mismatches += 1
+    stored = snippets - unsupported
+    print(f"Snippets: {snippets}, stored: {stored}, not storable: {unsupported}, round-trip mismatches: {mismatches}")
+    if stored:
+        print(f"Average snapshot size: {size / stored:.0f} bytes")
+    print(f"Execute and serialize: {exec_time * 1000:.1f} ms, load snapshots and rebuild the serialized groups: {load_time * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# This module re-scores semantic test results incrementally. Next to every result file it keeps a manifest
+# with the hashes of the ground truth and generated code of every row, and a version of every attribute test:
+# a hash of the source of its test function and arguments, and of the code shared by all tests (the class
+# structure, serialization, the snippet interpreter, the comparisons, matching and the helpers of
+# test_statements). On a re-run only the rows whose code changed are evaluated again, and on the other rows
+# only the attribute columns whose test version changed; all other outcomes are taken from the previous result
+# file. The consolidated results (best pass of every row) and the distribution of the attribute outcomes are
+# then patched for the changed rows.
+#
+# Usage:
+#   python incremental_runner.py "../test files/MS.csv" pass_1.csv pass_2.csv pass_3.csv \
+#       -o result_pass_1.csv -o result_pass_2.csv -o result_pass_3.csv \
+#       --consolidated consolidated_results.csv --distribution distribution_results.csv
+
+import argparse
+import ast
+import hashlib
+import inspect
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import comparison
+import matching
+from extraction_cache import structure_version
+from pass_at_k import attribute_columns, best_passes
+from profiling import PROFILE
+from result_store import OUTCOMES, encode_column
+from semantic_runner import RESULT_COLUMNS, preprocess_generated_code, print_profile, result_row, run_tasks
+from test_statements import ATTRIBUTE_TESTS, ORDER_INSENSITIVE_TESTS
+
+# Version of the manifest format
+MANIFEST_FORMAT = 1
+
+
+def _digest(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def code_hash(code) -> str:
+    """
+    Hash the code of a row; missing code (NaN) has a hash of its own.
+    """
+    return _digest(code) if isinstance(code, str) else 'missing'
+
+
+def core_version() -> str:
+    """
+    Hash the code shared by all attribute tests: the code that produces the extractions (see
+    extraction_cache.structure_version), the comparisons and the matching of unordered items.
+    """
+    return _digest(structure_version(), inspect.getsource(comparison), inspect.getsource(matching))
+
+
+def evaluator_versions(ordered: bool = True) -> Dict[str, str]:
+    """
+    Compute the version of every attribute test column.
+    Args:
+        ordered (bool): Whether the expression list, relationship and reference tests pair items by position.
+    Returns:
+        Dict[str, str]: The version of every column of ATTRIBUTE_TESTS.
+    """
+    core = core_version()
+    sources = {}
+    versions = {}
+    for name, (test, kwargs) in ATTRIBUTE_TESTS.items():
+        if test not in sources:
+            sources[test] = inspect.getsource(test)
+        mode = str(ordered) if test in ORDER_INSENSITIVE_TESTS else ''
+        versions[name] = _digest(core, sources[test], repr(sorted(kwargs.items())), mode)
+    return versions
+
+
+def manifest_path(result_path: str) -> str:
+    """
+    Get the path of the manifest of a result file, e.g. result_pass_1.manifest.json for result_pass_1.csv.
+    """
+    return os.path.splitext(result_path)[0] + '.manifest.json'
+
+
+def load_previous(result_path: str) -> Tuple[Optional[pd.DataFrame], Optional[dict]]:
+    """
+    Load a previous result file and its manifest, if both exist and the manifest is of the current format.
+    """
+    path = manifest_path(result_path)
+    if not os.path.exists(result_path) or not os.path.exists(path):
+        return None, None
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return None, None
+    return pd.read_csv(result_path), manifest
+
+
+def _outcome(value) -> Optional[tuple]:
+    # Outcomes read back from a result file are strings such as "(1, 0)"
+    if isinstance(value, str):
+        value = ast.literal_eval(value)
+    return tuple(value) if isinstance(value, tuple) else None
+
+
+def incremental_evaluate(gt_df: pd.DataFrame, gen_df: pd.DataFrame, previous: Optional[pd.DataFrame],
+                         manifest: Optional[dict], ordered: bool = True, versions: Optional[Dict[str, str]] = None,
+                         **run_options) -> Tuple[pd.DataFrame, dict, List[int], dict]:
+    """
+    Evaluate one pass, reusing the outcomes of a previous evaluation wherever its inputs did not change.
+    Args:
+        gt_df (pd.DataFrame): The ground truth, with 'text' and 'code' columns.
+        gen_df (pd.DataFrame): The generated code, with a 'code' column aligned with gt_df.
+        previous (pd.DataFrame, optional): The previous results of the pass.
+        manifest (dict, optional): The manifest of the previous results.
+        ordered (bool): If False, the expression list, relationship and reference tests match items regardless of their order.
+        versions (Dict[str, str], optional): The versions of the attribute tests (see evaluator_versions).
+        run_options: Options of semantic_runner.run_tasks, e.g. workers or cache_path.
+    Returns:
+        tuple: The results, the new manifest, the indices of the rows that were evaluated again, and the number
+            of rows evaluated in full, evaluated partially and reused.
+    """
+    versions = versions or evaluator_versions(ordered)
+    hashes = [[code_hash(gt_row['code']), code_hash(gen_df.loc[idx, 'code'])] for idx, gt_row in gt_df.iterrows()]
+    reusable = previous is not None and manifest is not None and len(previous) == len(manifest['rows'])
+    stale = list(ATTRIBUTE_TESTS)
+    if reusable:
+        stale = [name for name in ATTRIBUTE_TESTS if manifest['versions'].get(name) != versions[name]
+                 or name not in previous.columns]
+    if reusable and len(stale) == len(ATTRIBUTE_TESTS):
+        reusable = False
+
+    rows: List[Optional[dict]] = []
+    tasks = []
+    positions = []
+    partial = []
+    for position, (idx, gt_row) in enumerate(gt_df.iterrows()):
+        text, gt_code, gen_code = gt_row['text'], gt_row['code'], gen_df.loc[idx, 'code']
+        outcomes = None
+        if reusable and position < len(previous) and manifest['rows'][position] == hashes[position]:
+            outcomes = {name: _outcome(previous.iloc[position][name]) for name in ATTRIBUTE_TESTS
+                        if name not in stale}
+            if any(outcome is None for outcome in outcomes.values()):
+                outcomes = None
+        if outcomes is not None and not stale:
+            rows.append(result_row(text, gt_code, gen_code, {name: outcomes[name] for name in ATTRIBUTE_TESTS}))
+            continue
+        rows.append(None)
+        positions.append(position)
+        partial.append(outcomes)
+        tasks.append((text, gt_code, gen_code, None) if outcomes is None else (text, gt_code, gen_code, None, stale))
+
+    evaluated = run_tasks(tasks, ordered=ordered, **run_options) if tasks else []
+    for position, outcomes, row in zip(positions, partial, evaluated):
+        if outcomes is not None:
+            merged = {name: row[name] if name in stale else outcomes[name] for name in ATTRIBUTE_TESTS}
+            row = result_row(row['text'], row['GT Code'], row['Generated Code'], merged)
+        rows[position] = row
+
+    counts = {'full': sum(outcomes is None for outcomes in partial),
+              'partial': sum(outcomes is not None for outcomes in partial),
+              'reused': len(rows) - len(positions)}
+    new_manifest = {'format': MANIFEST_FORMAT, 'ordered': ordered, 'versions': versions, 'rows': hashes}
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS), new_manifest, positions, counts
+
+
+def save_results(result_path: str, df_result: pd.DataFrame, manifest: dict):
+    """
+    Write a result file and its manifest; the manifest is written last, so it never describes a stale file.
+    """
+    df_result.to_csv(result_path, index=False)
+    with open(manifest_path(result_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+def patch_consolidated(path: str, pass_results: Sequence[pd.DataFrame], rows: Sequence[int]) -> pd.DataFrame:
+    """
+    Update the consolidated results (the row of the best pass of every row, see pass_at_k.consolidate) for
+    some rows, and write them. The file is built from scratch if it does not exist or does not match.
+    Args:
+        path (str): The consolidated results file.
+        pass_results (Sequence[pd.DataFrame]): The results of every pass, with aligned rows.
+        rows (Sequence[int]): The positions of the rows that changed in any pass.
+    Returns:
+        pd.DataFrame: The consolidated results.
+    """
+    n = len(pass_results[0])
+    total_passed = np.stack([df['Total Passed'].to_numpy()[:n] for df in pass_results], axis=1)
+    _, best_index = best_passes(total_passed)
+    consolidated = pd.read_csv(path) if os.path.exists(path) else None
+    if consolidated is None or len(consolidated) != n or list(consolidated.columns) != list(pass_results[0].columns):
+        consolidated = pass_results[0].copy()
+        rows = range(n)
+    else:
+        consolidated = consolidated.astype(object)
+    for row in rows:
+        consolidated.iloc[row] = pass_results[best_index[row]].iloc[row].astype(object)
+    consolidated.to_csv(path, index=False)
+    return consolidated
+
+
+def distribution_frame(df_result: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute the accuracy, recall and precision of every attribute column, as the distribution files of the
+    pass@k notebook (one column per attribute, one row per metric).
+    """
+    dist = {}
+    for column in attribute_columns(df_result):
+        codes = encode_column(df_result[column])
+        counts = np.bincount(codes[codes >= 0], minlength=len(OUTCOMES))
+        passed = counts[3:].sum()
+        tp = counts[OUTCOMES.index((1, 1))]
+        fp = counts[OUTCOMES.index((0, 0))]
+        fn = counts[OUTCOMES.index((0, 1))]
+        dist[column] = {'Accuracy': passed / len(df_result) if len(df_result) else 0,
+                        'Recall': tp / (tp + fn) if (tp + fn) else 0,
+                        'Precision': tp / (tp + fp) if (tp + fp) else 0}
+    return pd.DataFrame(dist)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run the semantic tests only where the code or the tests changed.')
+    parser.add_argument('gt_file', help="CSV file with the ground truth 'text' and 'code' columns")
+    parser.add_argument('gen_files', nargs='+', help="CSV files with the generated 'code' column, one per pass")
+    parser.add_argument('-o', '--output', action='append', required=True,
+                        help='result CSV file, given once per generated code file; updated in place')
+    parser.add_argument('--consolidated', help='consolidated results file (best pass of every row) to patch')
+    parser.add_argument('--distribution', help='distribution file of the consolidated results to update')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=8, help='number of rows sent to a worker at a time')
+    parser.add_argument('--cache', help='path of a persistent extraction cache (see extraction_cache.py)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='match expressions, statements and references by an optimal assignment instead of by position')
+    parser.add_argument('--force', action='store_true', help='ignore the previous results and evaluate every row')
+    args = parser.parse_args()
+
+    if len(args.output) != len(args.gen_files):
+        parser.error('give one --output file per generated code file')
+    if args.distribution and not args.consolidated:
+        parser.error('--distribution is computed from the --consolidated results')
+
+    ordered = not args.unordered
+    versions = evaluator_versions(ordered)
+    gt_df = pd.read_csv(args.gt_file)
+    pass_results = []
+    changed = set()
+    for gen_file, output in zip(args.gen_files, args.output):
+        gen_df = pd.read_csv(gen_file)
+        gen_df['code'] = gen_df['code'].apply(preprocess_generated_code)
+        previous, manifest = (None, None) if args.force else load_previous(output)
+        df_result, manifest, rows, counts = incremental_evaluate(
+            gt_df, gen_df, previous, manifest, ordered=ordered, versions=versions, workers=args.workers,
+            chunksize=args.chunksize, cache_path=args.cache)
+        save_results(output, df_result, manifest)
+        pass_results.append(df_result)
+        changed.update(rows)
+        print(f"{gen_file}: {counts['full']} rows evaluated, {counts['partial']} partially, "
+              f"{counts['reused']} reused -> {output}")
+
+    if args.consolidated:
+        consolidated = patch_consolidated(args.consolidated, pass_results, sorted(changed))
+        print(f"{args.consolidated}: {len(changed)} rows updated")
+        if args.distribution:
+            distribution_frame(consolidated).to_csv(args.distribution, index=False)
+    if PROFILE.enabled:
+        print_profile()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+# This module matches the items of a ground truth list with those of a generated list (statements, references or
+# the items of a relationship list) regardless of their order, as an optimal one-to-one assignment.
+#
+# The cost of a pair is the bounded edit distance of the texts that identify the items (see
+# comparison.compare_strings_with_threshold); pairs whose distance exceeds the threshold, or that fail the
+# full comparison of the items, cannot be matched. Leaving an item unmatched costs threshold + 1, so the
+# assignment prefers matching every pair within the threshold. To keep the cost matrix cheap on rows with many
+# statements:
+#   - items are only compared within the same bucket (e.g. statement type or reference relationship), and every
+#     bucket is solved on its own;
+#   - identical texts are matched right away, without an edit distance;
+#   - pairs whose lengths differ by more than the threshold are ruled out without an edit distance, and the
+#     remaining distances are bounded by the threshold, so hopeless pairs stop early.
+
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from comparison import compare_serialized_references, compare_strings_with_threshold
+
+
+class MatchResult:
+    """
+    The outcome of matching a ground truth list with a generated list.
+
+    Attributes:
+        pairs (List[Tuple[int, int]]): The matched (ground truth index, generated index) pairs, by ground truth index.
+        missing (List[int]): The indices of the ground truth items without a match.
+        extra (List[int]): The indices of the generated items without a match.
+    """
+
+    def __init__(self, pairs: List[Tuple[int, int]], missing: List[int], extra: List[int]):
+        self.pairs = pairs
+        self.missing = missing
+        self.extra = extra
+
+    @property
+    def matched(self) -> int:
+        return len(self.pairs)
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether every item of both lists is matched.
+        """
+        return not self.missing and not self.extra
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Get the number of matched, missing and extra items.
+        """
+        return {'matched': len(self.pairs), 'missing': len(self.missing), 'extra': len(self.extra)}
+
+    def __repr__(self):
+        return f"MatchResult(matched={len(self.pairs)}, missing={len(self.missing)}, extra={len(self.extra)})"
+
+
+def solve_assignment(cost: Sequence[Sequence[float]]) -> List[int]:
+    """
+    Solve the rectangular assignment problem with the Hungarian algorithm (shortest augmenting paths with
+    potentials), in O(n^2 m) time.
+    Args:
+        cost (Sequence[Sequence[float]]): The cost matrix, with n rows and m >= n columns.
+    Returns:
+        List[int]: The column assigned to every row, minimizing the total cost.
+    """
+    n = len(cost)
+    if n == 0:
+        return []
+    m = len(cost[0])
+    if m < n:
+        raise ValueError('The cost matrix must have at least as many columns as rows.')
+    infinity = float('inf')
+    # Potentials of the rows and columns, and the row assigned to every column (1-based; 0 is free)
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    assigned = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        assigned[0] = i
+        j0 = 0
+        min_slack = [infinity] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = assigned[j0]
+            row = cost[i0 - 1]
+            u_i0 = u[i0]
+            delta = infinity
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    slack = row[j - 1] - u_i0 - v[j]
+                    if slack < min_slack[j]:
+                        min_slack[j] = slack
+                        way[j] = j0
+                    if min_slack[j] < delta:
+                        delta = min_slack[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[assigned[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            j0 = j1
+            if assigned[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            assigned[j0] = assigned[j1]
+            j0 = j1
+    result = [-1] * n
+    for j in range(1, m + 1):
+        if assigned[j]:
+            result[assigned[j] - 1] = j - 1
+    return result
+
+
+def _match_bucket(gt: List[int], generated: List[int], keys1: List[str], keys2: List[str],
+                  accept: Optional[Callable[[int, int], bool]], threshold: int) -> List[Tuple[int, int]]:
+    """
+    Match the items of one bucket, given by their indices.
+    """
+    pairs = []
+    # Identical texts are matched first, in order, without an edit distance
+    unmatched = defaultdict(list)
+    for j in generated:
+        unmatched[keys2[j]].append(j)
+    rest1 = []
+    for i in gt:
+        candidates = unmatched.get(keys1[i])
+        if candidates:
+            for position, j in enumerate(candidates):
+                if accept is None or accept(i, j):
+                    pairs.append((i, j))
+                    del candidates[position]
+                    break
+            else:
+                rest1.append(i)
+        else:
+            rest1.append(i)
+    rest2 = sorted(j for candidates in unmatched.values() for j in candidates)
+    if not rest1 or not rest2:
+        return pairs
+
+    unmatched_cost = threshold + 1
+    forbidden = 2 * unmatched_cost + 1
+    cost = []
+    for i in rest1:
+        key1 = keys1[i]
+        row = []
+        for j in rest2:
+            key2 = keys2[j]
+            value = forbidden
+            if abs(len(key1) - len(key2)) <= threshold:
+                similar, distance = compare_strings_with_threshold(key1, key2, threshold)
+                if similar and (accept is None or accept(i, j)):
+                    value = distance
+            row.append(value)
+        # One column per ground truth item stands for leaving it unmatched
+        row.extend([unmatched_cost] * len(rest1))
+        cost.append(row)
+    for row_index, column in enumerate(solve_assignment(cost)):
+        if column < len(rest2) and cost[row_index][column] <= threshold:
+            pairs.append((rest1[row_index], rest2[column]))
+    return pairs
+
+
+def match_items(list1: Sequence, list2: Sequence, key: Callable[[object], str],
+                bucket: Optional[Callable[[object], object]] = None,
+                accept: Optional[Callable[[object, object], bool]] = None, threshold: int = 10) -> MatchResult:
+    """
+    Match two lists of items as an optimal one-to-one assignment, regardless of their order.
+    Args:
+        list1 (Sequence): The ground truth items.
+        list2 (Sequence): The generated items.
+        key (Callable): The text identifying an item, compared by edit distance.
+        bucket (Callable, optional): Only items in the same bucket can be matched.
+        accept (Callable, optional): The full comparison of two items within the threshold; pairs that fail
+            it cannot be matched.
+        threshold (int): Edit distance threshold for string comparisons.
+    Returns:
+        MatchResult: The matched pairs and the unmatched items of both lists.
+    """
+    keys1 = [str(key(item)) for item in list1]
+    keys2 = [str(key(item)) for item in list2]
+    buckets1 = defaultdict(list)
+    buckets2 = defaultdict(list)
+    for i, item in enumerate(list1):
+        buckets1[bucket(item) if bucket else None].append(i)
+    for j, item in enumerate(list2):
+        buckets2[bucket(item) if bucket else None].append(j)
+    check = (lambda i, j: accept(list1[i], list2[j])) if accept else None
+
+    pairs = []
+    for name, gt in buckets1.items():
+        if name in buckets2:
+            pairs.extend(_match_bucket(gt, buckets2[name], keys1, keys2, check, threshold))
+    pairs.sort()
+    matched1 = {i for i, _ in pairs}
+    matched2 = {j for _, j in pairs}
+    return MatchResult(pairs, [i for i in range(len(list1)) if i not in matched1],
+                       [j for j in range(len(list2)) if j not in matched2])
+
+
+def statement_key(stmt: dict) -> str:
+    """
+    Get the text identifying a serialized statement: its entity, defined term or first description.
+    """
+    if stmt.get("type") == "Rule":
+        return (stmt.get("entity") or {}).get("text", "")
+    if stmt.get("type") == "Definition":
+        return (stmt.get("defined_term") or {}).get("text", "")
+    description = stmt.get("description") or [{}]
+    return description[0].get("text", "") if isinstance(description, list) else description.get("text", "")
+
+
+def match_strings(list1: Sequence[str], list2: Sequence[str], threshold: int = 10) -> MatchResult:
+    """
+    Match two lists of strings, e.g. the identifiers of a relationship list.
+    """
+    return match_items(list1, list2, key=lambda s: s, threshold=threshold)
+
+
+def match_references(list1: Sequence[dict], list2: Sequence[dict], threshold: int = 10) -> MatchResult:
+    """
+    Match two lists of serialized references, within the same relationship; matched pairs also pass
+    compare_serialized_references.
+    """
+    return match_items(list1, list2, key=lambda r: r.get("text", ""), bucket=lambda r: r.get("relationship"),
+                       accept=lambda r1, r2: compare_serialized_references(r1, r2, threshold), threshold=threshold)
+
+
+def match_statements(list1: Sequence[dict], list2: Sequence[dict], threshold: int = 10) -> MatchResult:
+    """
+    Match two lists of serialized statements of the same type by their identifying text (see statement_key).
+    """
+    return match_items(list1, list2, key=statement_key, bucket=lambda s: s.get("type"), threshold=threshold)
@@ -0,0 +1,188 @@
+# This module computes pass@k over several passes of semantic test results with NumPy.
+# The per-pass result frames are stacked into one boolean array of shape (rows, passes, attributes),
+# from which the unbiased pass@k estimator, its bootstrap confidence intervals and the best pass of
+# every row are computed without per-row Python loops.
+
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Columns of the result files that are not attribute tests
+METRIC_COLUMNS = ['text', 'GT Code', 'Generated Code', 'Total Passed', 'True Positives', 'False Positives',
+                  'False Negatives', 'Accuracy', 'Recall', 'Precision', 'Mismacthes']
+
+# Name of the pass@k of whole rows (all attribute tests passed)
+OVERALL = 'Overall'
+
+
+def attribute_columns(df: pd.DataFrame) -> List[str]:
+    """
+    Get the attribute test columns of a result dataframe.
+    """
+    return [col for col in df.columns if col not in METRIC_COLUMNS]
+
+
+def outcome_passed(column: pd.Series) -> np.ndarray:
+    """
+    Get whether each outcome of an attribute column passed. Outcomes are written as "(passed, has_value)".
+    Args:
+        column (pd.Series): The attribute column.
+    Returns:
+        np.ndarray: A boolean array.
+    """
+    return column.astype(str).str[1].to_numpy() == '1'
+
+
+def stack_results(df_list: List[pd.DataFrame], attributes: Optional[List[str]] = None) -> Tuple[np.ndarray, List[str]]:
+    """
+    Stack the results of several passes into one array.
+    Args:
+        df_list (List[pd.DataFrame]): The result dataframes of the passes, with aligned rows.
+        attributes (List[str], optional): The attribute columns. Defaults to those of the first dataframe.
+    Returns:
+        tuple: A boolean array of shape (rows, passes, attributes) telling whether each test passed,
+        and the attribute names.
+    """
+    if attributes is None:
+        attributes = attribute_columns(df_list[0])
+    passed = np.stack([
+        np.stack([outcome_passed(df[col]) for col in attributes], axis=-1) for df in df_list
+    ], axis=1)
+    return passed, attributes
+
+
+def estimator_table(n: int, ks: Sequence[int]) -> np.ndarray:
+    """
+    Tabulate the unbiased pass@k estimator 1 - C(n-c, k) / C(n, k) for every number of passed samples c.
+    The ratio is computed as the product of (1 - k / i) for i from n-c+1 to n, which is numerically stable.
+    Args:
+        n (int): The number of samples (passes) per row.
+        ks (Sequence[int]): The values of k, each at most n.
+    Returns:
+        np.ndarray: An array of shape (len(ks), n + 1), indexed by k and c.
+    """
+    ks = np.asarray(ks, dtype=np.float64)
+    if np.any(ks < 1) or np.any(ks > n):
+        raise ValueError(f'k must be between 1 and the number of passes ({n}).')
+    factors = 1 - ks[:, None] / np.arange(n, 0, -1)[None, :]
+    ratios = np.concatenate([np.ones((len(ks), 1)), np.cumprod(factors, axis=1)], axis=1)
+    # Once n - c < k, C(n - c, k) is 0: the product passed a zero factor
+    return 1 - np.maximum(ratios, 0)
+
+
+def pass_at_k_per_row(passed: np.ndarray, ks: Union[int, Sequence[int]]) -> np.ndarray:
+    """
+    Compute the unbiased pass@k estimate of every row.
+    Args:
+        passed (np.ndarray): A boolean array of shape (rows, passes, ...).
+        ks (int or Sequence[int]): The value(s) of k.
+    Returns:
+        np.ndarray: The estimates, of shape (rows, ...) for one k or (len(ks), rows, ...) for several.
+    """
+    table = estimator_table(passed.shape[1], np.atleast_1d(ks))
+    estimates = table[:, passed.sum(axis=1)]
+    return estimates[0] if np.isscalar(ks) else estimates
+
+
+def with_overall(passed: np.ndarray) -> np.ndarray:
+    """
+    Append the outcome of whole rows (all attribute tests passed) as a last attribute.
+    Args:
+        passed (np.ndarray): A boolean array of shape (rows, passes, attributes).
+    Returns:
+        np.ndarray: A boolean array of shape (rows, passes, attributes + 1).
+    """
+    return np.concatenate([passed, passed.all(axis=2, keepdims=True)], axis=2)
+
+
+def bootstrap_intervals(per_row: np.ndarray, samples: int = 1000, confidence: float = 0.95,
+                        seed: Optional[int] = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute percentile bootstrap confidence intervals of the mean over rows.
+    Every resample is turned into row weights (how often each row was drawn), so all resamples are
+    averaged in one matrix product.
+    Args:
+        per_row (np.ndarray): The per-row values, of shape (rows, ...).
+        samples (int): The number of bootstrap resamples.
+        confidence (float): The confidence level of the intervals.
+        seed (int, optional): The seed of the resampling.
+    Returns:
+        tuple: The lower and upper bounds, each of shape per_row.shape[1:].
+    """
+    rows = per_row.shape[0]
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, rows, size=(samples, rows)) + rows * np.arange(samples)[:, None]
+    weights = np.bincount(draws.ravel(), minlength=samples * rows).reshape(samples, rows) / rows
+    means = weights @ per_row.reshape(rows, -1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return low.reshape(per_row.shape[1:]), high.reshape(per_row.shape[1:])
+
+
+def pass_at_k(df_list: List[pd.DataFrame], ks: Union[int, Sequence[int], None] = None, bootstrap: int = 1000,
+              confidence: float = 0.95, seed: Optional[int] = 0) -> pd.DataFrame:
+    """
+    Compute pass@k per attribute and overall over several passes.
+    Args:
+        df_list (List[pd.DataFrame]): The result dataframes of the passes, with aligned rows.
+        ks (int or Sequence[int], optional): The value(s) of k. Defaults to every k from 1 to the number of passes.
+        bootstrap (int): The number of bootstrap resamples for the confidence intervals (0 to skip them).
+        confidence (float): The confidence level of the intervals.
+        seed (int, optional): The seed of the bootstrap.
+    Returns:
+        pd.DataFrame: One row per attribute (and 'Overall') and k, with the columns 'pass@k' and, with
+        bootstrap, 'CI Low' and 'CI High'.
+    """
+    passed, attributes = stack_results(df_list)
+    return pass_at_k_from_array(passed, attributes, ks, bootstrap, confidence, seed)
+
+
+def pass_at_k_from_array(passed: np.ndarray, attributes: List[str], ks: Union[int, Sequence[int], None] = None,
+                         bootstrap: int = 1000, confidence: float = 0.95, seed: Optional[int] = 0) -> pd.DataFrame:
+    """
+    Compute pass@k per attribute and overall from stacked results (see stack_results and pass_at_k).
+    """
+    ks = list(range(1, passed.shape[1] + 1)) if ks is None else list(np.atleast_1d(ks))
+    per_row = pass_at_k_per_row(with_overall(passed), ks)  # (ks, rows, attributes + 1)
+    names = list(attributes) + [OVERALL]
+    result = pd.DataFrame({
+        'Attribute': np.tile(names, len(ks)),
+        'k': np.repeat(ks, len(names)),
+        'pass@k': per_row.mean(axis=1).ravel()
+    })
+    if bootstrap:
+        low, high = bootstrap_intervals(np.moveaxis(per_row, 1, 0), bootstrap, confidence, seed)
+        result['CI Low'] = low.ravel()
+        result['CI High'] = high.ravel()
+    return result
+
+
+def best_passes(total_passed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the highest number of passed tests of every row and the pass it comes from.
+    Ties go to the last pass, as in the original calculate_pass_rate.
+    Args:
+        total_passed (np.ndarray): The number of passed tests, of shape (rows, passes).
+    Returns:
+        tuple: The highest number of passed tests and the index of its pass, for every row.
+    """
+    passes = total_passed.shape[1]
+    best_index = passes - 1 - np.argmax(total_passed[:, ::-1], axis=1)
+    return total_passed.max(axis=1), best_index
+
+
+def consolidate(df_list: List[pd.DataFrame], best_index: np.ndarray) -> pd.DataFrame:
+    """
+    Build a result dataframe with the row of the best pass of every row.
+    Args:
+        df_list (List[pd.DataFrame]): The result dataframes of the passes, with aligned rows.
+        best_index (np.ndarray): The best pass of every row (see best_passes).
+    Returns:
+        pd.DataFrame: The consolidated results.
+    """
+    rows = len(best_index)
+    stacked = pd.concat([df.iloc[:rows] for df in df_list], ignore_index=True)
+    consolidated = stacked.iloc[best_index * rows + np.arange(rows)]
+    consolidated.index = df_list[0].index[:rows]
+    return consolidated
@@ -0,0 +1,196 @@
+# This module provides the timing instrumentation of the semantic tests. It is switched off by default and
+# switched on with environment variables, without editing the code:
+#   SEMANTIC_PROFILE=1                   time every stage and count the edit distance cells (0, false, no and
+#                                        off, or an empty value, keep it switched off)
+#   SEMANTIC_PROFILE_DUMP=run.pstats     also collect a cProfile profile and write it to this pstats file
+#
+# The stages are the execution of the snippets ("exec"), the serialization of the extracted objects
+# ("serialize"), the string comparisons ("compare_strings"), the reading and writing of result files
+# ("pandas io") and every attribute test, one stage per column ("test: Rule Conditions"). Stages nest, so
+# the time of an attribute test includes the comparisons it makes. semantic_runner.py collects the timers
+# of its worker processes and prints the summary table at the end of the run; in a notebook, print
+# PROFILE.summary() after the tests.
+
+import cProfile
+import os
+import pstats
+import time
+from typing import Callable, Dict, Optional
+
+ENABLE_VARIABLE = 'SEMANTIC_PROFILE'
+DUMP_VARIABLE = 'SEMANTIC_PROFILE_DUMP'
+
+# Values of ENABLE_VARIABLE that keep profiling switched off
+DISABLED_VALUES = ('', '0', 'false', 'no', 'off')
+
+
+class _CollectedStats:
+    # The collected statistics of a cProfile profile, in the form pstats.Stats.add accepts
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profile:
+    """
+    Timers and counters of the stages of a run.
+
+    Attributes:
+        enabled (bool): Whether the instrumented code records anything.
+        dump_path (Optional[str]): The pstats file the cProfile profile is written to, if any.
+        timers (Dict[str, list]): The number of calls and the total time in seconds of every stage.
+        counters (Dict[str, int]): Event counts, e.g. "edit_distance_cells".
+    """
+
+    def __init__(self, enabled: bool = False, dump_path: Optional[str] = None):
+        self.enabled = enabled or bool(dump_path)
+        self.dump_path = dump_path
+        self.timers: Dict[str, list] = {}
+        self.counters: Dict[str, int] = {}
+        self._profiler: Optional[cProfile.Profile] = None
+        self._stats: Optional[pstats.Stats] = None
+
+    def add(self, stage: str, seconds: float, calls: int = 1):
+        """
+        Record calls of a stage.
+        """
+        timer = self.timers.get(stage)
+        if timer is None:
+            self.timers[stage] = [calls, seconds]
+        else:
+            timer[0] += calls
+            timer[1] += seconds
+
+    def count(self, name: str, n: int = 1):
+        """
+        Increase an event counter.
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def call(self, stage: str, function: Callable, *args, **kwargs):
+        """
+        Call a function, timing it as a stage if profiling is enabled.
+        """
+        if not self.enabled:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str) -> Callable:
+        """
+        Decorate a function to time every call as a stage. The decision is made when the function is
+        defined, so a disabled profile adds no overhead at all.
+        """
+        def decorate(function):
+            if not self.enabled:
+                return function
+
+            def wrapper(*args, **kwargs):
+                return self.call(stage, function, *args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            wrapper.__wrapped__ = function
+            return wrapper
+        return decorate
+
+    def start(self):
+        """
+        Start collecting the cProfile profile, if a dump path is set.
+        """
+        if self.dump_path and self._profiler is None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def snapshot(self, reset: bool = True) -> dict:
+        """
+        Get the recorded timers, counters and cProfile statistics, e.g. to send them from a worker process
+        to the main process (see merge).
+        Args:
+            reset (bool): Whether to start recording from zero afterwards.
+        """
+        snapshot = {'timers': {stage: list(timer) for stage, timer in self.timers.items()},
+                    'counters': dict(self.counters), 'stats': None}
+        if self._profiler is not None:
+            self._profiler.create_stats()
+            snapshot['stats'] = self._profiler.stats
+            if reset:
+                self._profiler = None
+                self.start()
+            else:
+                self._profiler.enable()
+        if reset:
+            self.timers = {}
+            self.counters = {}
+        return snapshot
+
+    def merge(self, snapshot: dict):
+        """
+        Add the timers, counters and cProfile statistics of a snapshot.
+        """
+        for stage, (calls, seconds) in snapshot['timers'].items():
+            self.add(stage, seconds, calls)
+        for name, n in snapshot['counters'].items():
+            self.count(name, n)
+        if snapshot.get('stats'):
+            collected = _CollectedStats(snapshot['stats'])
+            if self._stats is None:
+                self._stats = pstats.Stats(collected)
+            else:
+                self._stats.add(collected)
+
+    def dump(self) -> Optional[str]:
+        """
+        Write the cProfile statistics of this process and of the merged snapshots to the dump path.
+        Returns:
+            str: The dump path, or None if there was nothing to write.
+        """
+        if not self.dump_path:
+            return None
+        if self._profiler is not None:
+            self.merge({'timers': {}, 'counters': {}, 'stats': self.snapshot(reset=False)['stats']})
+            self._profiler = None
+        if self._stats is None:
+            return None
+        self._stats.dump_stats(self.dump_path)
+        return self.dump_path
+
+    def summary(self) -> str:
+        """
+        Format the timers, slowest stage first, and the counters as a table.
+        """
+        lines = [f"{'Stage':<32} {'Calls':>10} {'Total (s)':>10} {'Mean (ms)':>10}"]
+        for stage, (calls, seconds) in sorted(self.timers.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{stage:<32} {calls:>10} {seconds:>10.3f} {seconds / calls * 1000 if calls else 0:>10.3f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name:<32} {n:>10}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        """
+        Forget the recorded timers, counters and statistics, e.g. those a forked worker process inherited.
+        """
+        self.timers = {}
+        self.counters = {}
+        self._stats = None
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler = None
+            self.start()
+
+
+def enabled_in_environment() -> bool:
+    """
+    Whether ENABLE_VARIABLE switches profiling on, e.g. SEMANTIC_PROFILE=1 but not SEMANTIC_PROFILE=0.
+    """
+    return os.environ.get(ENABLE_VARIABLE, '').strip().lower() not in DISABLED_VALUES
+
+
+# The profile of this process, configured from the environment
+PROFILE = Profile(enabled=enabled_in_environment(), dump_path=os.environ.get(DUMP_VARIABLE) or None)
+PROFILE.start()
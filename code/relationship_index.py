@@ -0,0 +1,267 @@
+# This module provides a compiled index of the relationships between Statements of an executed corpus.
+# Every Statement keeps its relationships as Python lists, so a question such as "which rules have an exception
+# reachable from section 12(3)" means scanning every object. The index gives every node (Statement, Expression
+# or Reference) an int ID, keeps the edges of every relationship type in compressed sparse row (CSR) arrays,
+# looks nodes up by section number, and answers reachability queries with vectorized frontier expansion.
+#
+# The index is built incrementally: while observe() is active, every relationship added through the add_*
+# methods of a Statement (of class_structure or class_structure_lean) is recorded as it is added; objects
+# created before can be added with add_statement or add_objects. The CSR arrays of a relationship type are
+# recompiled lazily, on the first query after new edges were added.
+#
+# Example:
+#   index = RelationshipIndex()
+#   with index.observe():
+#       namespace = execute_code_string(code)
+#   index.add_objects(namespace.values())
+#   # Rules with an exception, reachable from section 12(3)
+#   rules = index.rules_with_exceptions(index.reachable(index.in_section(("12", "(3)"))))
+
+import contextlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import class_structure
+import class_structure_lean as lean
+from serialize import REFERENCE_TYPES, RULE_TYPES, NodeIds, relationship_list, section_path
+
+# The relationship types of a Statement, and the edge from a Reference to its target
+RELATIONSHIP_TYPES = lean.RELATIONSHIP_TYPES
+TARGET = "target"
+EDGE_TYPES = RELATIONSHIP_TYPES + (TARGET,)
+
+STATEMENT_TYPES = (class_structure.Statement, lean.Statement)
+NODE_TYPES = STATEMENT_TYPES + (class_structure.Expression, lean.Expression)
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """
+    Get the neighbors of several nodes at once from CSR arrays.
+    Args:
+        indptr (np.ndarray): The row pointers.
+        indices (np.ndarray): The column indices.
+        nodes (np.ndarray): The node IDs.
+    Returns:
+        np.ndarray: The neighbors of all the nodes, concatenated in order.
+    """
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Position of every gathered edge: the start of its row plus its rank within the row
+    first = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - first, lengths) + np.arange(total)
+    return indices[positions]
+
+
+class RelationshipIndex:
+    """
+    An incrementally built index of the relationships between the nodes of a corpus.
+
+    Attributes:
+        nodes (list): The indexed objects, indexed by node ID.
+    """
+
+    def __init__(self):
+        self._ids = NodeIds()
+        self.nodes: list = self._ids.nodes
+        self._by_number: Dict[object, List[int]] = defaultdict(list)
+        self._by_path: Dict[Tuple, List[int]] = defaultdict(list)
+        self._sources: Dict[str, List[int]] = {edge: [] for edge in EDGE_TYPES}
+        self._targets: Dict[str, List[int]] = {edge: [] for edge in EDGE_TYPES}
+        self._csr: Dict[Tuple[str, bool], Tuple[np.ndarray, np.ndarray]] = {}
+        # The Statements whose relationship lists are indexed (not only the Statement itself, as a target)
+        self._complete: set = set()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, obj) -> bool:
+        return obj in self._ids
+
+    def node_id(self, obj) -> int:
+        """
+        Get the ID of an object, adding it to the index if needed. Adding a Reference also adds the edge
+        to its target, and every node is registered under the section number and path of its Section.
+        """
+        node_id, new = self._ids.add(obj)
+        if not new:
+            return node_id
+        section = obj.sections if isinstance(obj, STATEMENT_TYPES) else getattr(obj, "section", None)
+        if section is not None:
+            self._by_number[getattr(section, "sectionNumber", None)].append(node_id)
+            self._by_path[section_path(section)].append(node_id)
+        if isinstance(obj, REFERENCE_TYPES) and isinstance(obj.target, NODE_TYPES):
+            self.add_relationship(obj, TARGET, obj.target)
+        return node_id
+
+    def add_relationship(self, source, relationship: str, target):
+        """
+        Record one edge. Targets that are not Statements or Expressions (e.g. strings) are ignored.
+        Args:
+            source: The Statement (or Reference, for the target edge).
+            relationship (str): One of EDGE_TYPES.
+            target: The related object.
+        """
+        if not isinstance(target, NODE_TYPES):
+            return
+        source_id = self.node_id(source)
+        target_id = self.node_id(target)
+        self._sources[relationship].append(source_id)
+        self._targets[relationship].append(target_id)
+        self._csr.pop((relationship, False), None)
+        self._csr.pop((relationship, True), None)
+
+    def add_statement(self, statement):
+        """
+        Add a Statement and the relationships it already has, e.g. for objects created before observe().
+        """
+        node_id = self.node_id(statement)
+        if node_id in self._complete:
+            return
+        self._complete.add(node_id)
+        for relationship in RELATIONSHIP_TYPES:
+            for target in relationship_list(statement, relationship):
+                self.add_relationship(statement, relationship, target)
+
+    def add_objects(self, objects: Iterable):
+        """
+        Add the Statements and Expressions among some objects, e.g. the values of an executed namespace.
+        The relationships of Statements that were observed while the code ran are not added twice.
+        """
+        for obj in objects:
+            if isinstance(obj, STATEMENT_TYPES):
+                self.add_statement(obj)
+            elif isinstance(obj, NODE_TYPES):
+                self.node_id(obj)
+
+    @contextlib.contextmanager
+    def observe(self):
+        """
+        Record the relationships added through the add_* methods of any Statement while the context is active.
+        The Statements of executed code are usually not reachable from their Sections, so call add_objects on
+        the namespace afterwards to index the Statements without relationships too.
+        """
+        class_structure._register_observer(self._observed)
+        try:
+            yield self
+        finally:
+            class_structure._unregister_observer(self._observed)
+
+    def _observed(self, statement, relationship: str, target):
+        node_id = self.node_id(statement)
+        if node_id not in self._complete:
+            # The Statement's own lists are indexed on its first observed edge, which is the last of its list
+            self._complete.add(node_id)
+            for other in RELATIONSHIP_TYPES:
+                previous = relationship_list(statement, other)
+                for item in (previous[:-1] if other == relationship else previous):
+                    self.add_relationship(statement, other, item)
+        self.add_relationship(statement, relationship, target)
+
+    def csr(self, relationship: str, inverse: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the CSR adjacency arrays of one relationship type, compiling them if edges were added since.
+        Args:
+            relationship (str): One of EDGE_TYPES.
+            inverse (bool): Whether to follow the edges backwards (from target to source).
+        Returns:
+            tuple: The row pointers (of length len(self) + 1) and the neighbor IDs, in the order the edges
+            were added.
+        """
+        key = (relationship, inverse)
+        if key not in self._csr or len(self._csr[key][0]) != len(self.nodes) + 1:
+            sources = np.asarray(self._sources[relationship], dtype=np.int64)
+            targets = np.asarray(self._targets[relationship], dtype=np.int64)
+            if inverse:
+                sources, targets = targets, sources
+            order = np.argsort(sources, kind="stable")
+            indptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(sources, minlength=len(self.nodes)), out=indptr[1:])
+            self._csr[key] = (indptr, targets[order])
+        return self._csr[key]
+
+    def neighbors(self, node: int, relationship: str, inverse: bool = False) -> List[int]:
+        """
+        Get the nodes directly related to a node, in the order the edges were added.
+        """
+        indptr, indices = self.csr(relationship, inverse)
+        return indices[indptr[node]:indptr[node + 1]].tolist()
+
+    def in_section(self, section_number, nested: bool = False) -> List[int]:
+        """
+        Look nodes up by the section they belong to.
+        Args:
+            section_number: A section number, e.g. "(3)", or a section path, e.g. ("12", "(3)").
+            nested (bool): With a path, also include the nodes of its subsections.
+        Returns:
+            List[int]: The IDs of the nodes, in the order they were indexed.
+        """
+        if not isinstance(section_number, tuple):
+            return list(self._by_number.get(section_number, []))
+        if not nested:
+            return list(self._by_path.get(section_number, []))
+        length = len(section_number)
+        return sorted(node for path, nodes in self._by_path.items() if path[:length] == section_number
+                      for node in nodes)
+
+    def reachable(self, sources: Iterable[int], relationships: Sequence[str] = RELATIONSHIP_TYPES,
+                  inverse: Sequence[str] = (), include_sources: bool = False,
+                  through_references: bool = True, max_depth: Optional[int] = None) -> List[int]:
+        """
+        Compute the transitive closure of some relationships from a set of nodes, one frontier at a time.
+        Args:
+            sources (Iterable[int]): The node IDs to start from.
+            relationships (Sequence[str]): The relationship types followed forwards.
+            inverse (Sequence[str]): The relationship types followed backwards, from target to source.
+            include_sources (bool): Whether the sources are always part of the result; otherwise a source
+                is only included if it is reached through a cycle.
+            through_references (bool): Whether a reached Reference also reaches its target.
+            max_depth (int, optional): The maximum number of relationship steps.
+        Returns:
+            List[int]: The reached node IDs, sorted.
+        """
+        steps = [self.csr(r) for r in relationships] + [self.csr(r, inverse=True) for r in inverse]
+        target_csr = self.csr(TARGET) if through_references else None
+        visited = np.zeros(len(self.nodes), dtype=bool)
+        frontier = np.unique(np.asarray(list(sources), dtype=np.int64))
+        if include_sources:
+            visited[frontier] = True
+        depth = 0
+        while len(frontier) and steps and (max_depth is None or depth < max_depth):
+            reached = np.concatenate([_gather(indptr, indices, frontier) for indptr, indices in steps])
+            if target_csr is not None and len(reached):
+                reached = np.concatenate([reached, _gather(*target_csr, reached)])
+            reached = np.unique(reached)
+            frontier = reached[~visited[reached]]
+            visited[frontier] = True
+            depth += 1
+        return np.flatnonzero(visited).tolist()
+
+    def exceptions(self, rule: int) -> List[int]:
+        """
+        Get all the exceptions that apply to a Statement: the exceptions of the Statement itself and of every
+        Statement it refines, directly or transitively, whether they were recorded with has_exception on
+        the Statement or with is_exception_to on the exception. Exceptions given as References are resolved
+        to their targets (the References are included too).
+        Args:
+            rule (int): The node ID of the Statement.
+        Returns:
+            List[int]: The node IDs of the exceptions, sorted.
+        """
+        refined = self.reachable([rule], ("refines",), inverse=("is_refined_by",), include_sources=True)
+        refined = np.asarray(refined, dtype=np.int64)
+        direct = np.concatenate([_gather(*self.csr("has_exception"), refined),
+                                 _gather(*self.csr("is_exception_to", inverse=True), refined)])
+        if not len(direct):
+            return []
+        return sorted(set(direct.tolist()) | set(_gather(*self.csr(TARGET), direct).tolist()))
+
+    def rules_with_exceptions(self, nodes: Iterable[int]) -> List[int]:
+        """
+        Get the Rules among some nodes that have at least one exception that applies to them (see exceptions).
+        """
+        return [node for node in nodes if isinstance(self.nodes[node], RULE_TYPES) and self.exceptions(node)]
@@ -0,0 +1,123 @@
+# This module provides a persistent cache of model responses for tagging and code generation.
+# Re-running a notebook (e.g. after fixing a scoring bug) serves identical prompts from the cache
+# instead of querying the model again.
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Callable, Optional
+
+
+def prompt_hash(prompt: str) -> str:
+    """
+    Compute the hash of a fully rendered prompt.
+    Args:
+        prompt (str): The prompt.
+    Returns:
+        str: The hex digest of the prompt.
+    """
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    A SQLite-backed cache of model responses, keyed on the model, the temperature, the pass index and
+    a hash of the rendered prompt. The key is the primary key of the table, so lookups use its index.
+
+    The pass index is part of the key because every pass samples the model anew: the same prompt in
+    pass 1 and pass 2 must produce two independent responses, while re-running pass 2 reuses pass 2.
+
+    Attributes:
+        path (str): The path of the SQLite database file.
+        hits (int): The number of responses served from the cache.
+        misses (int): The number of responses that were not cached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "model TEXT NOT NULL, temperature REAL NOT NULL, pass_index INTEGER NOT NULL, "
+            "prompt_hash TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (model, temperature, pass_index, prompt_hash))"
+        )
+        self._conn.commit()
+
+    def get(self, prompt: str, model: str, temperature: float, pass_index: int = 0) -> Optional[str]:
+        """
+        Look up the cached response to a prompt.
+        Args:
+            prompt (str): The rendered prompt.
+            model (str): The model name.
+            temperature (float): The sampling temperature.
+            pass_index (int): The index of the pass the response belongs to.
+        Returns:
+            str or None: The cached response, or None if there is none.
+        """
+        row = self._conn.execute(
+            "SELECT response FROM responses WHERE model = ? AND temperature = ? AND pass_index = ? AND prompt_hash = ?",
+            (model, float(temperature), pass_index, prompt_hash(prompt))
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, prompt: str, model: str, temperature: float, response: str, pass_index: int = 0):
+        """
+        Store the response to a prompt.
+        Args:
+            prompt (str): The rendered prompt.
+            model (str): The model name.
+            temperature (float): The sampling temperature.
+            response (str): The model's response.
+            pass_index (int): The index of the pass the response belongs to.
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (model, temperature, pass_index, prompt_hash, response, created) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (model, float(temperature), pass_index, prompt_hash(prompt), response, time.time())
+        )
+        self._conn.commit()
+
+    def get_or_call(self, prompt: str, call: Callable[[str], str], model: str, temperature: float,
+                    pass_index: int = 0) -> str:
+        """
+        Return the cached response to a prompt, or call the model and cache its response.
+        Args:
+            prompt (str): The rendered prompt.
+            call (Callable[[str], str]): The function prompting the model, e.g. prompt_model.
+            model (str): The model name used by call.
+            temperature (float): The sampling temperature used by call.
+            pass_index (int): The index of the pass the response belongs to.
+        Returns:
+            str: The model's response.
+        """
+        response = self.get(prompt, model, temperature, pass_index)
+        if response is None:
+            response = call(prompt)
+            self.put(prompt, model, temperature, response, pass_index)
+        return response
+
+    def stats(self) -> dict:
+        """
+        Get the usage statistics of the cache.
+        Returns:
+            dict: The hits, misses and number of cached responses.
+        """
+        entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def close(self):
+        """
+        Close the underlying database connection.
+        """
+        self._conn.close()
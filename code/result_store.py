@@ -0,0 +1,304 @@
+# This module provides a compact, typed store for semantic test results.
+# The result CSV files repeat the legal text and both code snippets on every row of every pass and write
+# each attribute outcome as a string such as "(1, 0)". The store keeps one int8 outcome code per row and
+# attribute and the metric columns as typed arrays in a compressed .npz file per result set, while the
+# texts go to a string pool shared by all result sets of the store, so identical texts are stored once.
+#
+# Usage: python result_store.py STORE_DIR result_pass_1.csv result_pass_2.csv ...
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# The (passed, value) outcome of every code; the code of an outcome is 3 * passed + value
+OUTCOMES = [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)]
+# Code of a missing outcome
+MISSING = -1
+
+# Columns holding texts, stored in the string pool
+TEXT_COLUMNS = ['text', 'GT Code', 'Generated Code']
+# Metric columns and their types
+METRIC_TYPES = {
+    'Total Passed': np.int16, 'Mismacthes': np.int16, 'True Positives': np.int16, 'False Positives': np.int16,
+    'False Negatives': np.int16, 'Accuracy': np.float64, 'Recall': np.float64, 'Precision': np.float64
+}
+
+
+def encode_outcome(outcome) -> int:
+    """
+    Encode an attribute outcome.
+    Args:
+        outcome (tuple or str): The (passed, value) outcome, or its string form, e.g. "(1, 0)".
+    Returns:
+        int: The outcome code, or MISSING.
+    """
+    if isinstance(outcome, str):
+        outcome = ast.literal_eval(outcome)
+    if not isinstance(outcome, tuple):
+        return MISSING
+    passed, value = outcome
+    return 3 * int(bool(passed)) + int(value)
+
+
+def encode_column(column: pd.Series) -> np.ndarray:
+    """
+    Encode an attribute column, parsing each distinct outcome only once.
+    Args:
+        column (pd.Series): The outcomes of an attribute.
+    Returns:
+        np.ndarray: The int8 outcome codes.
+    """
+    codes, uniques = pd.factorize(column.astype(object), use_na_sentinel=True)
+    table = np.array([encode_outcome(u) for u in uniques] + [MISSING], dtype=np.int8)
+    # The sentinel -1 of missing values picks the last entry of the table
+    return table[codes]
+
+
+def decode_outcome(code: int) -> Optional[tuple]:
+    """
+    Decode an outcome code into its (passed, value) tuple (None if missing).
+    """
+    return OUTCOMES[code] if code != MISSING else None
+
+
+class StringPool:
+    """
+    An append-only pool of strings in a JSON lines file, where each distinct string is stored once and is
+    identified by its line number. Missing values (None or NaN) are stored as null.
+
+    Attributes:
+        path (str): The path of the pool file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._strings = []
+        self._ids = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    self._add(json.loads(line))
+
+    def _key(self, value):
+        return hashlib.sha256(json.dumps(value).encode('utf-8')).digest()
+
+    def _add(self, value) -> int:
+        self._ids[self._key(value)] = len(self._strings)
+        self._strings.append(value)
+        return len(self._strings) - 1
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __getitem__(self, string_id: int):
+        return self._strings[string_id]
+
+    def intern(self, values) -> np.ndarray:
+        """
+        Add strings to the pool (unless they are already in it).
+        Args:
+            values: The strings.
+        Returns:
+            np.ndarray: The int32 ids of the strings.
+        """
+        ids = np.empty(len(values), dtype=np.int32)
+        new_lines = []
+        for i, value in enumerate(values):
+            if not isinstance(value, str):
+                value = None
+            string_id = self._ids.get(self._key(value))
+            if string_id is None:
+                string_id = self._add(value)
+                new_lines.append(json.dumps(value) + '\n')
+            ids[i] = string_id
+        if new_lines:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(new_lines)
+        return ids
+
+
+class Results:
+    """
+    The results of one pass, as loaded from a ResultStore.
+
+    Attributes:
+        name (str): The name of the result set.
+        columns (List[str]): The columns of the original result dataframe, in order.
+        attributes (List[str]): The attribute test columns.
+        outcomes (np.ndarray): The int8 outcome codes, of shape (rows, attributes).
+        metrics (Dict[str, np.ndarray]): The metric columns.
+        text_ids (Dict[str, np.ndarray]): The string pool ids of the text columns.
+    """
+
+    def __init__(self, name, columns, attributes, outcomes, metrics, text_ids, pool: StringPool):
+        self.name = name
+        self.columns = columns
+        self.attributes = attributes
+        self.outcomes = outcomes
+        self.metrics = metrics
+        self.text_ids = text_ids
+        self._pool = pool
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    @property
+    def passed(self) -> np.ndarray:
+        """
+        Whether each attribute test passed, as a boolean array of shape (rows, attributes).
+        """
+        return self.outcomes >= 3
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        The value of each attribute outcome (0, 1 or 2; -1 if missing), of shape (rows, attributes).
+        """
+        return np.where(self.outcomes == MISSING, MISSING, self.outcomes % 3)
+
+    def text(self, column: str, row: int):
+        """
+        Get a text of a row from the string pool.
+        Args:
+            column (str): 'text', 'GT Code' or 'Generated Code'.
+            row (int): The row.
+        Returns:
+            str or None: The text.
+        """
+        return self._pool[self.text_ids[column][row]]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Rebuild the result dataframe in the format of the semantic test result files.
+        """
+        data = {}
+        for column in self.columns:
+            if column in self.text_ids:
+                data[column] = [self._pool[i] for i in self.text_ids[column]]
+            elif column in self.metrics:
+                data[column] = self.metrics[column]
+            else:
+                codes = self.outcomes[:, self.attributes.index(column)]
+                data[column] = [str(decode_outcome(c)) if c != MISSING else None for c in codes]
+        return pd.DataFrame(data)
+
+
+class ResultStore:
+    """
+    A directory of result sets: one <name>.npz file per result set and a strings.jsonl string pool.
+
+    Attributes:
+        directory (str): The directory of the store.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.pool = StringPool(os.path.join(directory, 'strings.jsonl'))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name + '.npz')
+
+    def names(self) -> List[str]:
+        """
+        Get the names of the stored result sets.
+        """
+        return sorted(f[:-4] for f in os.listdir(self.directory) if f.endswith('.npz'))
+
+    def save(self, name: str, df: pd.DataFrame):
+        """
+        Store a result dataframe, e.g. read from semantic_test_result_pass_1.csv or built by semantic_runner.
+        Args:
+            name (str): The name of the result set.
+            df (pd.DataFrame): The results.
+        """
+        attributes = [col for col in df.columns if col not in TEXT_COLUMNS and col not in METRIC_TYPES]
+        arrays = {
+            'columns': np.array(list(df.columns)),
+            'attributes': np.array(attributes),
+            'outcomes': np.stack([encode_column(df[col]) for col in attributes], axis=1)
+            if attributes else np.zeros((len(df), 0), dtype=np.int8)
+        }
+        for column, dtype in METRIC_TYPES.items():
+            if column in df.columns:
+                arrays['metric:' + column] = df[column].to_numpy(dtype=dtype)
+        for column in TEXT_COLUMNS:
+            if column in df.columns:
+                arrays['text:' + column] = self.pool.intern(df[column].tolist())
+        np.savez_compressed(self._path(name), **arrays)
+
+    def load(self, name: str) -> Results:
+        """
+        Load a stored result set.
+        Args:
+            name (str): The name of the result set.
+        Returns:
+            Results: The results.
+        """
+        with np.load(self._path(name)) as data:
+            metrics = {key[len('metric:'):]: data[key] for key in data.files if key.startswith('metric:')}
+            text_ids = {key[len('text:'):]: data[key] for key in data.files if key.startswith('text:')}
+            return Results(name, data['columns'].tolist(), data['attributes'].tolist(), data['outcomes'],
+                           metrics, text_ids, self.pool)
+
+
+def distribution(results: Results) -> Dict[str, dict]:
+    """
+    Compute the accuracy, recall and precision of every attribute, like calculate_distribution in the
+    notebooks, from the outcome codes.
+    Args:
+        results (Results): The results.
+    Returns:
+        dict: The metrics of every attribute.
+    """
+    # Number of rows with each outcome code, per attribute, of shape (attributes, codes)
+    counts = np.stack([np.bincount(results.outcomes[:, j][results.outcomes[:, j] != MISSING], minlength=len(OUTCOMES))
+                       for j in range(len(results.attributes))]) if results.attributes else np.zeros((0, len(OUTCOMES)))
+    rows = len(results)
+    dist = {}
+    for j, attribute in enumerate(results.attributes):
+        passed = counts[j, 3:].sum()
+        tp = counts[j, OUTCOMES.index((1, 1))]
+        fp = counts[j, OUTCOMES.index((0, 0))]
+        fn = counts[j, OUTCOMES.index((0, 1))]
+        dist[attribute] = {
+            'Accuracy': passed / rows,
+            'Recall': tp / (tp + fn) if (tp + fn) else 0,
+            'Precision': tp / (tp + fp) if (tp + fp) else 0
+        }
+    return dist
+
+
+def stack_passed(results_list: List[Results]) -> np.ndarray:
+    """
+    Stack the outcomes of several passes for pass@k (see pass_at_k.pass_at_k_from_array).
+    Args:
+        results_list (List[Results]): The results of the passes, with aligned rows and the same attributes.
+    Returns:
+        np.ndarray: A boolean array of shape (rows, passes, attributes).
+    """
+    return np.stack([results.passed for results in results_list], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert semantic test result CSV files into a result store.')
+    parser.add_argument('store', help='directory of the result store')
+    parser.add_argument('csv_files', nargs='+', help='result CSV files; each is stored under its file name')
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    for path in args.csv_files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        store.save(name, pd.read_csv(path))
+        print(f"{path} ({os.path.getsize(path)} bytes) -> {store._path(name)} ({os.path.getsize(store._path(name))} bytes)")
+    print(f"String pool: {os.path.getsize(store.pool.path)} bytes, {len(store.pool)} strings")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# This module provides a sandboxed executor for code snippets. Snippets are executed in pre-forked worker
+# processes with a wall-clock timeout and a memory cap, so that a generated snippet with an infinite loop
+# or a huge allocation cannot stall or kill the evaluation run.
+
+import contextlib
+import io
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Callable, List, Optional, Tuple
+
+from test_statements import SerializedExtraction, SnippetExtraction
+
+try:
+    import resource
+except ImportError:  # Windows: no memory caps, the timeout still applies
+    resource = None
+
+# Default limits of the executor
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MEMORY_LIMIT_MB = 1024
+DEFAULT_MAX_TASKS_PER_WORKER = 500
+
+
+def _start_context():
+    # Forked workers inherit the already imported class_structure classes
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+def _address_space_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def extract_snippet(code):
+    """
+    The default task of the workers: execute a snippet and serialize its extraction.
+    Returns:
+        tuple: The status ("ok", "error" or "memory"), the serialized entry and a description of the error.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        extraction = SnippetExtraction(code)
+        entry = extraction.to_entry()
+    if isinstance(extraction.error, MemoryError):
+        return ('memory', None, 'MemoryError: the snippet exceeded the memory limit')
+    elif extraction.error is not None:
+        return ('error', entry, f"{type(extraction.error).__name__}: {extraction.error}")
+    return ('ok', entry, None)
+
+
+def _worker_main(conn, memory_limit, task):
+    rss_limit = None
+    if resource is not None and memory_limit:
+        # The snippet may allocate memory_limit bytes on top of what the worker already uses
+        address_space = _address_space_bytes()
+        if address_space is not None:
+            limit = address_space + memory_limit
+            with contextlib.suppress(ValueError, OSError):
+                resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        rss_limit = _peak_rss_bytes() + memory_limit
+
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError):
+            break
+        if code is None:
+            break
+        start = time.perf_counter()
+        try:
+            outcome = task(code)
+        except MemoryError:
+            outcome = ('memory', None, 'MemoryError: the snippet exceeded the memory limit')
+        elapsed = time.perf_counter() - start
+        # Recycle the worker once its peak memory went over the limit, or after running out of memory
+        recycle = outcome[0] == 'memory' or (rss_limit is not None and _peak_rss_bytes() > rss_limit)
+        try:
+            message = pickle.dumps(outcome + (elapsed, recycle))
+        except Exception as e:
+            message = pickle.dumps(('error', None, f"unpicklable extraction: {e}", elapsed, recycle))
+        conn.send_bytes(message)
+        if recycle:
+            break
+    conn.close()
+
+
+class _Worker:
+
+    def __init__(self, context, memory_limit, task):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit, task), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            with contextlib.suppress(OSError, BrokenPipeError):
+                self.conn.send(None)
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class SandboxExecutor:
+    """
+    Executes code snippets in a pool of pre-forked worker processes and returns their serialized extractions.
+
+    Every snippet runs with a wall-clock timeout and a memory cap. A worker that times out is killed,
+    and workers are recycled after running out of memory, after their peak memory exceeds the cap, and
+    after max_tasks_per_worker snippets. A snippet that could not complete yields a SerializedExtraction
+    with empty groups and a status of "timeout", "memory" or "crashed", so it is scored like code that
+    fails to execute.
+
+    Attributes:
+        workers (int): The number of worker processes.
+        timeout (float): The wall-clock time limit per snippet, in seconds.
+        memory_limit_mb (int): The memory a snippet may allocate, in megabytes (not enforced on Windows).
+        max_tasks_per_worker (int): The number of snippets after which a worker is replaced.
+        task (Callable): The function the workers run on every snippet (a module-level function, so it can
+            be given to spawned workers). It returns the status ("ok", "error" or "memory"), a picklable
+            result and a description of the error; extract_snippet by default.
+        counts (dict): The number of snippets per outcome status.
+    """
+
+    def __init__(self, workers: int = 1, timeout: float = DEFAULT_TIMEOUT,
+                 memory_limit_mb: int = DEFAULT_MEMORY_LIMIT_MB,
+                 max_tasks_per_worker: int = DEFAULT_MAX_TASKS_PER_WORKER, task: Callable = extract_snippet):
+        if workers < 1:
+            raise ValueError('The sandbox needs at least one worker process.')
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.task = task
+        self.counts = {'ok': 0, 'error': 0, 'timeout': 0, 'memory': 0, 'crashed': 0}
+        self._context = _start_context()
+        self._memory_limit = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        self._pool = [self._spawn() for _ in range(workers)]
+        self._closed = False
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self._memory_limit, self.task)
+
+    def _replace(self, worker: _Worker, kill=False) -> _Worker:
+        worker.stop(kill=kill)
+        replacement = self._spawn()
+        self._pool[self._pool.index(worker)] = replacement
+        return replacement
+
+    def extract(self, code) -> SerializedExtraction:
+        """
+        Execute one code snippet in the sandbox.
+        Args:
+            code (str): The code snippet.
+        Returns:
+            SerializedExtraction: The serialized extraction, or an empty one with the reason the execution failed.
+        """
+        return self.extract_many([code])[0]
+
+    def extract_many(self, codes: List[str]) -> List[SerializedExtraction]:
+        """
+        Execute several code snippets concurrently in the sandbox.
+        Args:
+            codes (List[str]): The code snippets.
+        Returns:
+            List[SerializedExtraction]: The extractions, in the order of the snippets.
+        """
+        return [SerializedExtraction(code, entry, status=status, error=error, elapsed=elapsed)
+                for code, (status, entry, error, elapsed) in zip(codes, self.run_many(codes))]
+
+    def run_many(self, codes: List[str]) -> List[Tuple[str, object, Optional[str], Optional[float]]]:
+        """
+        Run the task of the workers on several code snippets concurrently.
+        Args:
+            codes (List[str]): The code snippets.
+        Returns:
+            list: The (status, result, error, elapsed time) of every snippet, in order. The result is None
+                unless the status is "ok" or "error".
+        Raises:
+            ValueError: If the executor is closed.
+        """
+        if self._closed:
+            raise ValueError('The sandbox executor is closed.')
+        results = [None] * len(codes)
+        pending = deque(enumerate(codes))
+        busy = {}  # worker -> (index, deadline)
+        while pending or busy:
+            for worker in self._pool:
+                if pending and worker not in busy:
+                    index, code = pending.popleft()
+                    try:
+                        worker.conn.send(code)
+                    except (OSError, BrokenPipeError):
+                        results[index] = self._outcome(code, 'crashed', 'the worker process died', None)
+                        self._replace(worker, kill=True)
+                        continue
+                    busy[worker] = (index, time.monotonic() + self.timeout)
+            if not busy:
+                continue
+
+            now = time.monotonic()
+            wait_time = max(0.0, min(deadline for _, deadline in busy.values()) - now)
+            ready = wait([worker.conn for worker in busy], timeout=wait_time)
+            for worker in list(busy):
+                index, deadline = busy[worker]
+                code = codes[index]
+                if worker.conn in ready:
+                    del busy[worker]
+                    try:
+                        status, entry, error, elapsed, recycle = pickle.loads(worker.conn.recv_bytes())
+                    except (EOFError, OSError):
+                        # Killed from outside, e.g. by the operating system running out of memory
+                        results[index] = self._outcome(code, 'crashed', 'the worker process died', None)
+                        self._replace(worker, kill=True)
+                        continue
+                    results[index] = self._outcome(code, status, error, elapsed, entry)
+                    worker.tasks += 1
+                    if recycle or worker.tasks >= self.max_tasks_per_worker:
+                        self._replace(worker)
+                elif time.monotonic() >= deadline:
+                    del busy[worker]
+                    results[index] = self._outcome(code, 'timeout', f'the snippet ran longer than {self.timeout} seconds', self.timeout)
+                    self._replace(worker, kill=True)
+        return results
+
+    def _outcome(self, code, status, error, elapsed, entry=None) -> tuple:
+        self.counts[status] += 1
+        return status, entry, error, elapsed
+
+    def close(self):
+        """
+        Stop all worker processes.
+        """
+        for worker in self._pool:
+            worker.stop()
+        self._pool = []
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
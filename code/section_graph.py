@@ -0,0 +1,251 @@
+# This module serializes an object graph of the class_structure module (Sections, Expressions, References and
+# Statements) as a flat node table plus edge lists, instead of the nested dictionaries of serialize.py.
+# The graph is walked iteratively with an explicit stack, so deeply nested statutes do not hit the recursion
+# limit, and every node is serialized exactly once (keyed by id()), even when it is reachable from several
+# places, e.g. an Expression included by several others. The records are produced one at a time, so
+# write_jsonl can export a full statute without building the whole table in memory.
+#
+# A node record holds the scalar fields of a node:
+#   {"id": 0, "kind": "section", "sectionNumber": "1", "sectionTitle": ""}
+#   {"id": 1, "kind": "expression", "text": "the seller", "sectionNumber": "1"}
+#   {"id": 2, "kind": "reference", "text": "section 2", "sectionNumber": "1", "relationship": "refines"}
+#   {"id": 3, "kind": "statement", "type": "Rule", "section": "1", "rule_type": 0}
+#   {"id": 4, "kind": "object", "text": "..."}   (anything else, identified as by get_statement_or_expression_id)
+# An edge record links two nodes; edges of the same source and type are written in list order:
+#   {"edge": "conditions", "source": 3, "target": 1}
+
+import json
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Tuple, Union
+
+import class_structure_lean as lean
+from class_structure import Expression, Section, Statement
+from serialize import (DEFINITION_TYPES, EXEMPTION_TYPES, INFORMATION_TYPES, REFERENCE_TYPES, RULE_TYPES, NodeIds,
+                       get_statement_or_expression_id, relationship_list)
+
+SECTION_TYPES = (Section, lean.Section)
+EXPRESSION_TYPES = (Expression, lean.Expression)
+STATEMENT_TYPES = (Statement, lean.Statement)
+
+# The edge types of every kind of node, in the order their edges are written
+SECTION_EDGES = ("subSections", "expressions", "statements")
+EXPRESSION_EDGES = ("includes",)
+REFERENCE_EDGES = ("includes", "target")
+STATEMENT_EDGES = {
+    "Information": ("description",),
+    "Definition": ("defined_term", "meaning", "exclusions"),
+    "Rule": ("entity", "description", "conditions"),
+    "Exemption": ("description",),
+    "UnknownStatementSubclass": (),
+}
+EDGE_TYPES = (SECTION_EDGES + REFERENCE_EDGES
+              + ("description", "defined_term", "meaning", "exclusions", "entity", "conditions")
+              + lean.RELATIONSHIP_TYPES)
+
+
+def statement_type(stmt) -> str:
+    """
+    Get the type name of a Statement, as written by serialize_statement.
+    """
+    if isinstance(stmt, INFORMATION_TYPES):
+        return "Information"
+    elif isinstance(stmt, DEFINITION_TYPES):
+        return "Definition"
+    elif isinstance(stmt, RULE_TYPES):
+        return "Rule"
+    elif isinstance(stmt, EXEMPTION_TYPES):
+        return "Exemption"
+    return "UnknownStatementSubclass"
+
+
+def _section_number(section):
+    return section.sectionNumber if section else None
+
+
+def node_record(obj) -> Tuple[dict, List[Tuple[str, list]]]:
+    """
+    Serialize the scalar fields of a node and list its outgoing edges.
+    Returns:
+        tuple: The node record (without its id) and the (edge type, targets) of the node, in order.
+    """
+    if isinstance(obj, SECTION_TYPES):
+        record = {"kind": "section", "sectionNumber": obj.sectionNumber, "sectionTitle": obj.sectionTitle}
+        return record, [(edge, getattr(obj, edge)) for edge in SECTION_EDGES]
+    if isinstance(obj, REFERENCE_TYPES):
+        record = {"kind": "reference", "text": obj.text.lower(), "sectionNumber": _section_number(obj.section),
+                  "relationship": obj.relationship}
+        return record, [("includes", obj.includes), ("target", [obj.target])]
+    if isinstance(obj, EXPRESSION_TYPES):
+        record = {"kind": "expression", "text": obj.text.lower(), "sectionNumber": _section_number(obj.section)}
+        return record, [("includes", obj.includes)]
+    if isinstance(obj, STATEMENT_TYPES):
+        kind = statement_type(obj)
+        record = {"kind": "statement", "type": kind, "section": _section_number(obj.sections)}
+        if kind == "Rule":
+            record["rule_type"] = obj.rule_type
+        edges = []
+        for edge in STATEMENT_EDGES[kind]:
+            value = getattr(obj, edge)
+            # defined_term, entity and the description of a Rule hold a single Expression (or None)
+            if not isinstance(value, (list, tuple)):
+                value = [value] if value is not None else []
+            edges.append((edge, value))
+        edges.extend((key, relationship_list(obj, key)) for key in lean.RELATIONSHIP_TYPES)
+        return record, edges
+    return {"kind": "object", "text": get_statement_or_expression_id(obj)}, []
+
+
+def walk(roots: Iterable, describe: Callable = None) -> Iterator[Tuple[int, object, dict, List[Tuple[str, List[int]]]]]:
+    """
+    Walk the graph reachable from some nodes, iteratively and visiting every node once.
+    Nodes get their IDs in the order they are first reached (the distinct roots first, in order), and
+    are visited in depth-first pre-order.
+    Args:
+        roots (Iterable): The nodes to start from.
+        describe (Callable, optional): Serializes the scalar fields of a node and lists its outgoing
+            edges, as (record, [(edge type, targets)]). Defaults to the node records of this module.
+    Yields:
+        tuple: The ID, the object, the record (without its id) and the (edge type, target IDs) of every node.
+    """
+    describe = describe or node_record
+    ids = NodeIds()
+
+    stack = []
+    for root in roots:
+        node_id, new = ids.add(root)
+        if new:
+            stack.append(node_id)
+    stack.reverse()
+
+    while stack:
+        node_id = stack.pop()
+        obj = ids.nodes[node_id]
+        record, edges = describe(obj)
+        discovered = []
+        edge_ids = []
+        for edge, targets in edges:
+            target_ids = []
+            for target in targets:
+                target_id, new = ids.add(target)
+                if new:
+                    discovered.append(target_id)
+                target_ids.append(target_id)
+            edge_ids.append((edge, target_ids))
+        yield node_id, obj, record, edge_ids
+        # Pushed in reverse, so the first child is visited next
+        stack.extend(reversed(discovered))
+
+
+def iter_records(roots: Iterable) -> Iterator[dict]:
+    """
+    Walk the graph reachable from some nodes (see walk) and produce its node and edge records.
+    Every node record is followed by the records of its outgoing edges.
+    Args:
+        roots (Iterable): The nodes to start from, e.g. the top-level Sections of a statute, or all the
+            Sections and Statements of an executed snippet (Statements are not always added to a Section).
+    Yields:
+        dict: Node records and edge records.
+    """
+    for node_id, _, record, edges in walk(roots):
+        yield {"id": node_id, **record}
+        for edge, target_ids in edges:
+            for target_id in target_ids:
+                yield {"edge": edge, "source": node_id, "target": target_id}
+
+
+class GraphTable:
+    """
+    A serialized graph held in memory: the node records indexed by ID and the edges of every type.
+
+    Attributes:
+        nodes (List[dict]): The node records, indexed by ID.
+        edges (Dict[str, List[Tuple[int, int]]]): The (source, target) pairs of every edge type, in order.
+    """
+
+    def __init__(self):
+        self.nodes: List[dict] = []
+        self.edges: Dict[str, List[Tuple[int, int]]] = {}
+        self._adjacency = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, record: dict):
+        """
+        Add a node or edge record, e.g. read from a JSON lines file.
+        """
+        if "edge" in record:
+            self.edges.setdefault(record["edge"], []).append((record["source"], record["target"]))
+        else:
+            node_id = record["id"]
+            if node_id >= len(self.nodes):
+                self.nodes.extend([None] * (node_id + 1 - len(self.nodes)))
+            self.nodes[node_id] = record
+        self._adjacency = None
+
+    def targets(self, node_id: int, edge: str) -> List[int]:
+        """
+        Get the targets of the edges of one type leaving a node, in order.
+        """
+        if self._adjacency is None:
+            self._adjacency = {}
+            for edge_type, pairs in self.edges.items():
+                for source, target in pairs:
+                    self._adjacency.setdefault((source, edge_type), []).append(target)
+        return self._adjacency.get((node_id, edge), [])
+
+    def records(self) -> Iterator[dict]:
+        """
+        Produce the node records followed by the edge records.
+        """
+        yield from self.nodes
+        for edge, pairs in self.edges.items():
+            for source, target in pairs:
+                yield {"edge": edge, "source": source, "target": target}
+
+
+def serialize_graph(roots: Iterable) -> GraphTable:
+    """
+    Serialize the graph reachable from some nodes into a table (see iter_records).
+    Args:
+        roots (Iterable): The nodes to start from.
+    Returns:
+        GraphTable: The node table and edge lists.
+    """
+    table = GraphTable()
+    for record in iter_records(roots):
+        table.add(record)
+    return table
+
+
+def write_jsonl(roots: Iterable, output: Union[str, IO[str]]) -> int:
+    """
+    Stream the records of the graph reachable from some nodes to a JSON lines file, one record per line.
+    Args:
+        roots (Iterable): The nodes to start from.
+        output (str or file): The path of the file, or a text file open for writing.
+    Returns:
+        int: The number of nodes written.
+    """
+    if isinstance(output, str):
+        with open(output, "w", encoding="utf-8") as f:
+            return write_jsonl(roots, f)
+    nodes = 0
+    for record in iter_records(roots):
+        output.write(json.dumps(record) + "\n")
+        nodes += "id" in record
+    return nodes
+
+
+def read_jsonl(path: str) -> GraphTable:
+    """
+    Load a graph written by write_jsonl.
+    Args:
+        path (str): The path of the JSON lines file.
+    Returns:
+        GraphTable: The node table and edge lists.
+    """
+    table = GraphTable()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            table.add(json.loads(line))
+    return table
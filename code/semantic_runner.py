@@ -0,0 +1,303 @@
+# This module provides a command-line runner for the semantic tests, which spreads the rows of one
+# or more generated code files across a pool of worker processes.
+#
+# Usage:
+#   python semantic_runner.py "../test files/OR.csv" pass_1.csv pass_2.csv pass_3.csv \
+#       -o result_pass_1.csv -o result_pass_2.csv -o result_pass_3.csv --workers 8
+#
+# With SEMANTIC_PROFILE=1 in the environment, the time of every stage and attribute test is collected from the
+# workers and printed at the end of the run (see profiling.py).
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import multiprocessing.util
+import os
+import unittest
+from typing import List, Optional
+
+import pandas as pd
+
+from code_cache import DEFAULT_CACHE
+from profiling import PROFILE
+from test_statements import ATTRIBUTE_TESTS, EvaluationContext, run_all_tests, summarize_outcomes
+
+total_tests = len(ATTRIBUTE_TESTS)
+
+# Columns of the result files, in order
+RESULT_COLUMNS = ['text', 'GT Code', 'Generated Code', 'Total Passed', 'Mismacthes', 'True Positives',
+                  'False Positives', 'False Negatives', 'Accuracy', 'Recall', 'Precision'] + list(ATTRIBUTE_TESTS)
+
+# Per-process state, set up by _init_worker
+_worker_cache = None
+_worker_verbose = False
+_worker_ordered = True
+
+# Key of the profile snapshot a worker attaches to a result row when profiling is enabled
+PROFILE_KEY = '_profile'
+
+
+def preprocess_generated_code(code):
+    """
+    Extract the code from a model response wrapped in a ```python code block.
+    Args:
+        code (str): The generated code, possibly wrapped in a code block.
+    Returns:
+        str: The code without the code block markers.
+    """
+    return code.split("```")[1][7:].strip() if isinstance(code, str) and "```" in code else code
+
+
+def evaluate_row(text, gt_code, gen_code, cache=None, context=None, ordered=True, columns=None) -> dict:
+    """
+    Run all semantic tests on one row and build its result columns.
+    Args:
+        text (str): The legal text of the row.
+        gt_code (str): The ground truth code.
+        gen_code (str): The generated code.
+        cache (ExtractionCache, optional): A persistent extraction cache.
+        context (EvaluationContext, optional): The already extracted snippets of the row.
+        ordered (bool): If False, the expression list, relationship and reference tests match items regardless of their order.
+        columns (List[str], optional): Only run the tests of these attribute columns (see run_all_tests).
+    Returns:
+        dict: The row of the result file, with the overall metrics and one column per attribute test.
+    """
+    test_case = unittest.TestCase()
+    _, _, _, _, _, test_map = run_all_tests(test_case, gt_code, gen_code, context=context, cache=cache, ordered=ordered,
+                                            columns=columns)
+    return result_row(text, gt_code, gen_code, test_map)
+
+
+def result_row(text, gt_code, gen_code, test_map: dict) -> dict:
+    """
+    Build the result columns of a row from the outcomes of its attribute tests.
+    Args:
+        text (str): The legal text of the row.
+        gt_code (str): The ground truth code.
+        gen_code (str): The generated code.
+        test_map (dict): The (passed, value) outcome of every attribute test.
+    Returns:
+        dict: The row of the result file.
+    """
+    total_passed, tp, fp, fn, mismatch = summarize_outcomes(test_map)
+    row_data = {
+        'text': text,
+        'GT Code': gt_code,
+        'Generated Code': gen_code,
+        'Total Passed': total_passed,
+        'Mismacthes': mismatch,
+        'True Positives': tp,
+        'False Positives': fp,
+        'False Negatives': fn,
+        'Accuracy': total_passed / total_tests if total_tests else 0,
+        'Recall': tp / (tp + fn) if (tp + fn) else 0,
+        'Precision': tp / (tp + fp) if (tp + fp) else 0
+    }
+    row_data.update(test_map)
+    return row_data
+
+
+def _init_worker(cache_path, verbose, ordered=True, code_cache_dir=None):
+    global _worker_cache, _worker_verbose, _worker_ordered
+    _worker_verbose = verbose
+    _worker_ordered = ordered
+    if PROFILE.enabled and multiprocessing.parent_process() is not None:
+        # A forked worker starts with a copy of the profile of the main process
+        PROFILE.reset()
+    if code_cache_dir:
+        DEFAULT_CACHE.use_directory(code_cache_dir)
+    if cache_path:
+        from extraction_cache import ExtractionCache
+        _worker_cache = ExtractionCache(cache_path)
+        # Writes the access times of the last cache hits when the worker process exits
+        multiprocessing.util.Finalize(_worker_cache, _worker_cache.close, exitpriority=10)
+
+
+def _evaluate_task(task):
+    # (text, gt_code, gen_code, extractions), optionally followed by the attribute columns to evaluate
+    text, gt_code, gen_code, extractions = task[:4]
+    columns = task[4] if len(task) > 4 else None
+    context = EvaluationContext.from_extractions(*extractions) if extractions else None
+    # The tests print a line per attribute; keep the workers quiet unless asked otherwise
+    with contextlib.nullcontext() if _worker_verbose else contextlib.redirect_stdout(io.StringIO()):
+        row = PROFILE.call('row', evaluate_row, text, gt_code, gen_code, cache=_worker_cache, context=context,
+                           ordered=_worker_ordered, columns=columns)
+    if PROFILE.enabled:
+        # Sent back with the row, and merged into the profile of the main process by run_tasks
+        row[PROFILE_KEY] = PROFILE.snapshot()
+    return row
+
+
+def _sandboxed_extractions(codes, workers, timeout, memory_limit_mb, cache_path):
+    """
+    Extract every distinct code snippet once and map each snippet to its extraction. Snippets the snippet
+    interpreter supports are interpreted in-process; only the others are executed in a sandbox.
+    """
+    from sandbox import SandboxExecutor
+    from snippet_interpreter import StaticExtractor
+    distinct = list(dict.fromkeys(code for code in codes if isinstance(code, str)))
+    with SandboxExecutor(workers=workers, timeout=timeout, memory_limit_mb=memory_limit_mb) as sandbox:
+        executor = StaticExtractor(fallback=sandbox)
+        if cache_path:
+            from extraction_cache import ExtractionCache
+            cache = ExtractionCache(cache_path, executor=executor)
+            extractions = cache.extract_many(distinct)
+            cache.close()
+        else:
+            extractions = executor.extract_many(distinct)
+        stopped = {status: count for status, count in sandbox.counts.items() if status in ('timeout', 'memory', 'crashed') and count}
+        if stopped:
+            print(f"Sandboxed snippets that did not complete: {stopped}")
+    return dict(zip(distinct, extractions))
+
+
+def evaluate_frames(gt_df, gen_dfs: List[pd.DataFrame], workers: Optional[int] = None, chunksize: int = 8,
+                    cache_path: Optional[str] = None, verbose: bool = False, sandbox: bool = False,
+                    timeout: float = 10.0, memory_limit_mb: int = 1024, ordered: bool = True,
+                    code_cache_dir: Optional[str] = None):
+    """
+    Run the semantic tests of several generated code files against the same ground truth in a process pool.
+    The rows of all files are distributed across the workers in chunks, and the results keep the row order.
+    Args:
+        gt_df (pd.DataFrame): The ground truth, with 'text' and 'code' columns.
+        gen_dfs (List[pd.DataFrame]): The generated code of each pass, with a 'code' column aligned with gt_df.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        chunksize (int): The number of rows sent to a worker at a time.
+        cache_path (str, optional): Path of a persistent extraction cache shared by the workers.
+        verbose (bool): Whether to keep the per-test output of the workers.
+        sandbox (bool): Whether to extract the snippets first, executing those the snippet interpreter does not
+            support in a sandbox (see snippet_interpreter.StaticExtractor and sandbox.SandboxExecutor).
+        timeout (float): The time limit per snippet in the sandbox, in seconds.
+        memory_limit_mb (int): The memory limit per snippet in the sandbox, in megabytes.
+        ordered (bool): If False, the expression list, relationship and reference tests match items regardless of their order.
+        code_cache_dir (str, optional): Directory in which the compiled snippets are kept across runs
+            (see code_cache.CompiledCodeCache).
+    Returns:
+        List[pd.DataFrame]: One result dataframe per generated code file.
+    """
+    if code_cache_dir:
+        DEFAULT_CACHE.use_directory(code_cache_dir)
+    tasks = []
+    for gen_df in gen_dfs:
+        for idx, gt_row in gt_df.iterrows():
+            tasks.append((gt_row['text'], gt_row['code'], gen_df.loc[idx, 'code'], None))
+
+    if sandbox:
+        codes = [code for task in tasks for code in task[1:3]]
+        extractions = PROFILE.call('extraction', _sandboxed_extractions, codes, workers or os.cpu_count(), timeout,
+                                   memory_limit_mb, cache_path)
+        tasks = [
+            (text, gt_code, gen_code, (extractions[gt_code], extractions[gen_code]))
+            if isinstance(gt_code, str) and isinstance(gen_code, str) else (text, gt_code, gen_code, None)
+            for text, gt_code, gen_code, _ in tasks
+        ]
+        # The extractions are already made, the workers only compare them
+        cache_path = None
+
+    rows = run_tasks(tasks, workers, chunksize, cache_path, verbose, ordered, code_cache_dir)
+    n = len(gt_df)
+    return [pd.DataFrame(rows[i * n:(i + 1) * n]) for i in range(len(gen_dfs))]
+
+
+def run_tasks(tasks: list, workers: Optional[int] = None, chunksize: int = 8, cache_path: Optional[str] = None,
+              verbose: bool = False, ordered: bool = True, code_cache_dir: Optional[str] = None) -> List[dict]:
+    """
+    Evaluate rows in a process pool (or in this process with a single worker), keeping their order.
+    Args:
+        tasks (list): The (text, gt_code, gen_code, extractions) of every row, optionally followed by the
+            attribute columns to evaluate; extractions is None unless the snippets were already extracted.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        The other arguments are those of evaluate_frames.
+    Returns:
+        List[dict]: The result row of every task.
+    """
+    if workers == 1:
+        _init_worker(cache_path, verbose, ordered, code_cache_dir)
+        rows = [_evaluate_task(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(cache_path, verbose, ordered, code_cache_dir)) as pool:
+            rows = list(pool.imap(_evaluate_task, tasks, chunksize=chunksize))
+            # Let the workers exit on their own, rather than being terminated, so they close their caches
+            pool.close()
+            pool.join()
+    if PROFILE.enabled:
+        for row in rows:
+            PROFILE.merge(row.pop(PROFILE_KEY))
+    return rows
+
+
+def print_profile():
+    """
+    Print the profile summary of the run, and write the cProfile statistics if SEMANTIC_PROFILE_DUMP is set
+    (see profiling.py).
+    """
+    print(PROFILE.summary())
+    dump_path = PROFILE.dump()
+    if dump_path:
+        print(f"cProfile statistics written to {dump_path} (python -m pstats {dump_path})")
+
+
+def mean_metrics(df_result):
+    """
+    Compute the average accuracy, recall and precision over all rows of a result dataframe.
+    Returns:
+        tuple: The mean accuracy, mean recall and mean precision.
+    """
+    n = len(df_result)
+    if not n:
+        return 0, 0, 0
+    return df_result['Accuracy'].sum() / n, df_result['Recall'].sum() / n, df_result['Precision'].sum() / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the semantic tests on generated code files in parallel.')
+    parser.add_argument('gt_file', help="CSV file with the ground truth 'text' and 'code' columns")
+    parser.add_argument('gen_files', nargs='+', help="CSV files with the generated 'code' column, one per pass")
+    parser.add_argument('-o', '--output', action='append', required=True,
+                        help='result CSV file, given once per generated code file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=8, help='number of rows sent to a worker at a time')
+    parser.add_argument('--cache', help='path of a persistent extraction cache (see extraction_cache.py)')
+    parser.add_argument('--verbose', action='store_true', help='print the output of every test')
+    parser.add_argument('--sandbox', action='store_true',
+                        help='execute the snippets the snippet interpreter does not support in isolated worker processes '
+                             'with a timeout and memory limit')
+    parser.add_argument('--timeout', type=float, default=10.0, help='time limit per snippet in the sandbox (seconds)')
+    parser.add_argument('--memory-limit', type=int, default=1024, help='memory limit per snippet in the sandbox (MB)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='match expressions, statements and references by an optimal assignment instead of by position')
+    parser.add_argument('--code-cache', help='directory in which compiled snippets are kept across runs (see code_cache.py)')
+    parser.add_argument('--store', help='also save the results in this result store directory (see result_store.py)')
+    args = parser.parse_args()
+
+    if len(args.output) != len(args.gen_files):
+        parser.error('give one --output file per generated code file')
+
+    gt_df = PROFILE.call('pandas io', pd.read_csv, args.gt_file)
+    gen_dfs = []
+    for gen_file in args.gen_files:
+        gen_df = PROFILE.call('pandas io', pd.read_csv, gen_file)
+        gen_df['code'] = gen_df['code'].apply(preprocess_generated_code)
+        gen_dfs.append(gen_df)
+
+    results = evaluate_frames(gt_df, gen_dfs, workers=args.workers, chunksize=args.chunksize,
+                              cache_path=args.cache, verbose=args.verbose, sandbox=args.sandbox,
+                              timeout=args.timeout, memory_limit_mb=args.memory_limit, ordered=not args.unordered,
+                              code_cache_dir=args.code_cache)
+    store = None
+    if args.store:
+        from result_store import ResultStore
+        store = ResultStore(args.store)
+    for gen_file, output, df_result in zip(args.gen_files, args.output, results):
+        PROFILE.call('pandas io', df_result.to_csv, output, index=False)
+        if store is not None:
+            store.save(os.path.splitext(os.path.basename(output))[0], df_result)
+        m_accuracy, m_recall, m_precision = mean_metrics(df_result)
+        print(f"{gen_file}: Mean Accuracy {m_accuracy:.4f}, Mean Recall {m_recall:.4f}, Mean Precision {m_precision:.4f} -> {output}")
+    if PROFILE.enabled:
+        print_profile()
+
+
+if __name__ == '__main__':
+    main()
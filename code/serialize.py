@@ -1,8 +1,19 @@
 # This module provides functions to serialize various classes from the class_structure module into a dictionary format.
 # It includes serialization for Section, Expression, Statement, Information, Definition, Rule, Exemption, and Reference classes.
 
+import sys
+from typing import Callable, Dict, Optional, Tuple
+
 # Import necessary classes from the class_structure module
 from class_structure import Section, Expression, Statement, Information, Definition, Rule, Exemption, Reference
+import class_structure_lean as lean
+
+# The classes of both variants of the class structure (see class_structure_lean.py)
+INFORMATION_TYPES = (Information, lean.Information)
+DEFINITION_TYPES = (Definition, lean.Definition)
+RULE_TYPES = (Rule, lean.Rule)
+EXEMPTION_TYPES = (Exemption, lean.Exemption)
+REFERENCE_TYPES = (Reference, lean.Reference)
 
 def serialize_section(section: Section) -> dict:
     """
@@ -40,59 +51,61 @@ def serialize_expression(expr: Expression) -> dict:
         "sectionNumber": expr.section.sectionNumber if expr.section else None
     }
 
-def serialize_reference(ref: Reference) -> dict:
+def serialize_reference(ref: Reference, identify: Optional[Callable] = None) -> dict:
     """
     Serialize a Reference object into a dictionary format.
     Args:
         ref (Reference): The Reference object to serialize.
+        identify (Callable, optional): Identifies the target, e.g. CanonicalTexts.canonical_text to reuse
+            the texts of a graph. Defaults to get_statement_or_expression_id.
     Returns:
         dict: A dictionary representation of the Reference object.
     """
+    identify = identify or get_statement_or_expression_id
     return {
         "text": ref.text.lower(),
-        "target": get_statement_or_expression_id(ref.target),
+        "target": identify(ref.target),
         "sectionNumber": ref.section.sectionNumber if ref.section else None,
         "relationship": ref.relationship
     }
 
-def serialize_statement(stmt: Statement) -> dict:
+def serialize_statement(stmt: Statement, identify: Optional[Callable] = None) -> dict:
     """
     Serialize a Statement object into a dictionary format.
     This function handles different subclasses of Statement and extracts relevant fields.
     Args:
         stmt (Statement): The Statement object to serialize.
+        identify (Callable, optional): Identifies the related objects, e.g. CanonicalTexts.canonical_text to
+            reuse the texts of a graph. Defaults to get_statement_or_expression_id.
     Returns:
         dict: A dictionary representation of the Statement object.
     """
+    identify = identify or get_statement_or_expression_id
     base = {
         "section": stmt.sections.sectionNumber if stmt.sections else None,
         "relationships": {
             # relationships are references to other Statement/Expression objects,
             # so you may need to gather their identifiers or convert them fully
-            "refines": [get_statement_or_expression_id(x) for x in stmt.relationships["refines"]],
-            "is_refined_by": [get_statement_or_expression_id(x) for x in stmt.relationships["is_refined_by"]],
-            "has_exception": [get_statement_or_expression_id(x) for x in stmt.relationships["has_exception"]],
-            "is_exception_to": [get_statement_or_expression_id(x) for x in stmt.relationships["is_exception_to"]],
-            "follows": [get_statement_or_expression_id(x) for x in stmt.relationships["follows"]],
-            "is_followed_by": [get_statement_or_expression_id(x) for x in stmt.relationships["is_followed_by"]],
+            key: [identify(x) for x in relationship_list(stmt, key)]
+            for key in lean.RELATIONSHIP_TYPES
         }
     }
     
-    if isinstance(stmt, Information):
+    if isinstance(stmt, INFORMATION_TYPES):
         base["type"] = "Information"
         base["description"] = [serialize_expression(d) for d in stmt.description]
-    elif isinstance(stmt, Definition):
+    elif isinstance(stmt, DEFINITION_TYPES):
         base["type"] = "Definition"
         base["defined_term"] = serialize_expression(stmt.defined_term)
         base["meaning"] = [serialize_expression(m) for m in stmt.meaning]
         base["exclusions"] = [serialize_expression(e) for e in stmt.exclusions]
-    elif isinstance(stmt, Rule):
+    elif isinstance(stmt, RULE_TYPES):
         base["type"] = "Rule"
         base["rule_type"] = stmt.rule_type
         base["entity"] = serialize_expression(stmt.entity)
         base["description"] = serialize_expression(stmt.description) if stmt.description else None
         base["conditions"] = [serialize_expression(c) for c in stmt.conditions]
-    elif isinstance(stmt, Exemption):
+    elif isinstance(stmt, EXEMPTION_TYPES):
         base["type"] = "Exemption"
         base["description"] = [serialize_expression(d) for d in stmt.description]
     else:
@@ -101,6 +114,19 @@ def serialize_statement(stmt: Statement) -> dict:
     return base
 
 
+def relationship_list(stmt: Statement, key: str) -> list:
+    """
+    Get one relationship list of a Statement, without allocating the unused lists of a lean Statement.
+    Args:
+        stmt (Statement): The Statement.
+        key (str): The relationship type, e.g. "refines".
+    Returns:
+        list: The related Statements or Expressions.
+    """
+    relationships = stmt.relationships
+    return relationships.peek(key) if isinstance(relationships, lean.Relationships) else relationships[key]
+
+
 def get_statement_or_expression_id(obj):
     """
     Get a unique identifier for a Statement or Expression object.
@@ -109,15 +135,95 @@ def get_statement_or_expression_id(obj):
     Returns:
         str: A string representation of the object, typically its text or a unique identifier.
     """
-    if isinstance(obj, Reference):
+    if isinstance(obj, REFERENCE_TYPES):
         return obj.text.lower()
-    elif isinstance(obj, Rule):
+    elif isinstance(obj, RULE_TYPES):
         return obj.entity.text.lower()
-    elif isinstance(obj, Information):
+    elif isinstance(obj, INFORMATION_TYPES):
         return obj.description[0].text.lower()
-    elif isinstance(obj, Definition):
+    elif isinstance(obj, DEFINITION_TYPES):
         return obj.defined_term.text.lower()
-    elif isinstance(obj, Exemption):
+    elif isinstance(obj, EXEMPTION_TYPES):
         return obj.description[0].text.lower()
     else:
-        return repr(obj)
\ No newline at end of file
+        return repr(obj)
+
+
+def section_path(section) -> Tuple:
+    """
+    Get the section numbers from the top-level Section down to a Section.
+    Args:
+        section (Section): The Section, or None.
+    Returns:
+        tuple: The section numbers, e.g. ("1", "1(a)"); empty for None.
+    """
+    path = []
+    seen = set()
+    while section is not None and id(section) not in seen:
+        seen.add(id(section))
+        path.append(getattr(section, "sectionNumber", None))
+        section = getattr(section, "parent", None)
+    return tuple(reversed(path))
+
+
+class NodeIds:
+    """
+    Int IDs of the nodes of an object graph, in the order the nodes are first seen. Nodes are keyed by
+    identity, so two Statements with the same text get distinct IDs, and they are kept alive, so their id()
+    is not reused while they are keyed by it. Used by section_graph.walk and relationship_index.RelationshipIndex.
+
+    Attributes:
+        nodes (list): The nodes, indexed by ID.
+    """
+
+    def __init__(self):
+        self.nodes: list = []
+        self._ids: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, obj) -> bool:
+        return id(obj) in self._ids
+
+    def add(self, obj) -> Tuple[int, bool]:
+        """
+        Get the ID of a node, assigning one on first use.
+        Args:
+            obj: The node.
+        Returns:
+            tuple: The ID, and whether it was just assigned.
+        """
+        node_id = self._ids.get(id(obj))
+        if node_id is not None:
+            return node_id, False
+        node_id = self._ids[id(obj)] = len(self.nodes)
+        self.nodes.append(obj)
+        return node_id, True
+
+
+class CanonicalTexts:
+    """
+    The canonical texts of the Statements and Expressions of one object graph, e.g. of one executed snippet
+    (see get_statement_or_expression_id). The text of a node is computed once and interned, so a node
+    referenced by many relationships is not described again, and equal texts of different graphs are the
+    same object.
+    """
+
+    def __init__(self):
+        self._texts: Dict[int, str] = {}
+        # Keeps the nodes alive, so their id() is not reused while they are keyed by it
+        self._nodes: list = []
+
+    def canonical_text(self, obj) -> str:
+        """
+        Get the canonical text of a node, as get_statement_or_expression_id, computing it only once.
+        Errors are not cached: they are raised again on every call, as get_statement_or_expression_id would.
+        """
+        key = id(obj)
+        text = self._texts.get(key)
+        if text is None:
+            text = sys.intern(get_statement_or_expression_id(obj))
+            self._texts[key] = text
+            self._nodes.append(obj)
+        return text
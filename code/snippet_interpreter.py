@@ -0,0 +1,468 @@
+# This module interprets generated code snippets without exec, for the restricted subset of Python they are written
+# in: straight-line assignments, constructor calls of the class structure, method calls such as add_refines, and
+# attribute and item assignments, with literal values. The snippet's ast.Module is walked statement by statement
+# and builds the same objects, in the same namespace order, as executing it would. semantic_runner.py --sandbox
+# uses it (see StaticExtractor) to extract the snippets it supports in-process, and only sends the others to the
+# sandbox; the semantic tests otherwise execute snippets with exec.
+#
+# Snippets using anything outside the subset (loops, function definitions, imports of other modules, builtins other
+# than print, attributes the classes do not have, ...) raise UnsupportedConstruct before any of their statements
+# runs. Imports only give a snippet the classes and typing constructs, and lists and dictionaries can only be
+# modified if the snippet created them or holds them through its objects. What can only be checked while the
+# snippet runs raises UnsupportedOperation; its earlier statements only touched objects the snippet created, so
+# StaticExtractor discards them and passes the snippet to its fallback, as it does an unsupported one. Runtime
+# errors of supported snippets (e.g. an undefined name, or an error raised by a constructor) are raised as exec
+# would raise them.
+
+import ast
+import builtins
+import contextlib
+import io
+import time
+import typing
+from typing import Dict, List, Optional
+
+import class_structure
+import class_structure_lean
+from code_cache import compile_cached
+from profiling import PROFILE
+
+# The classes whose objects a snippet may create, read, modify and call methods of
+CLASS_TYPES = tuple(
+    cls for module in (class_structure, class_structure_lean) for cls in vars(module).values()
+    if isinstance(cls, type) and cls.__module__ == module.__name__ and cls.__name__ in class_structure_lean.CLASSES
+)
+# Containers a snippet may read items of
+CONTAINER_TYPES = (list, dict, tuple, class_structure_lean.Relationships)
+# Methods of lists and dictionaries a snippet may call, e.g. statement.relationships["refines"].append(target),
+# on the containers the snippet created itself or holds through the objects it created
+CONTAINER_METHODS = {list: {'append', 'extend', 'insert'}, dict: {'get'}}
+# Builtins a snippet may call
+BUILTINS = {'print': print}
+
+
+def _usable(value) -> bool:
+    # Whether a global value may be read by a snippet: a class of the class structure or a typing construct
+    return (isinstance(value, type) and issubclass(value, CLASS_TYPES)) or getattr(value, '__module__', None) == 'typing'
+
+
+def _class_attributes() -> frozenset:
+    # The public attributes and methods of the classes, including the instance attributes set by their methods
+    names = {name for methods in CONTAINER_METHODS.values() for name in methods}
+    for cls in CLASS_TYPES:
+        for klass in cls.__mro__[:-1]:
+            names.update(vars(klass))
+            names.update(getattr(klass, '__slots__', ()))
+            for value in vars(klass).values():
+                for function in (value, getattr(value, 'fget', None), getattr(value, 'fset', None)):
+                    code = getattr(function, '__code__', None)
+                    if code is not None:
+                        names.update(code.co_names)
+    return frozenset(name for name in names if not name.startswith('_'))
+
+
+# The names a snippet may import from each module, e.g. with "from class_structure import *": only the classes
+# and typing constructs, so a snippet never gets hold of the other globals of the module
+IMPORTABLE_NAMES = {
+    'class_structure': {name: getattr(class_structure, name) for name in class_structure_lean.CLASSES},
+    'typing': {name: getattr(typing, name) for name in typing.__all__},
+}
+# The attributes a snippet may read
+CLASS_ATTRIBUTES = _class_attributes()
+
+_STATEMENTS = (ast.Assign, ast.Expr, ast.Pass, ast.ImportFrom)
+_TARGETS = (ast.Name, ast.Attribute, ast.Subscript)
+
+
+def _children(node) -> list:
+    """
+    Get the sub-expressions of a supported expression node.
+    Raises:
+        UnsupportedConstruct: If the node is not supported.
+    """
+    kind = type(node)
+    if kind is ast.Constant:
+        return []
+    if kind is ast.Name:
+        if node.id.startswith('__'):
+            raise UnsupportedConstruct(f'special name {node.id}')
+        return []
+    if kind is ast.Attribute:
+        if node.attr.startswith('_'):
+            raise UnsupportedConstruct(f'private attribute {node.attr}')
+        return [node.value]
+    if kind is ast.Call:
+        if any(keyword.arg is None for keyword in node.keywords):
+            raise UnsupportedConstruct('** arguments')
+        return [node.func, *node.args, *(keyword.value for keyword in node.keywords)]
+    if kind is ast.List or kind is ast.Tuple:
+        return node.elts
+    if kind is ast.Dict:
+        if None in node.keys:
+            raise UnsupportedConstruct('** in a dictionary')
+        return [*node.keys, *node.values]
+    if kind is ast.Subscript:
+        return [node.value, node.slice]
+    if kind is ast.UnaryOp and type(node.op) in (ast.USub, ast.UAdd):
+        return [node.operand]
+    if kind is ast.BinOp and type(node.op) is ast.Add:
+        return [node.left, node.right]
+    raise UnsupportedConstruct(kind.__name__)
+
+
+class UnsupportedConstruct(Exception):
+    """
+    Raised before a snippet runs when it uses a construct the interpreter does not support; the snippet must be
+    executed instead.
+    """
+
+
+class UnsupportedOperation(TypeError):
+    """
+    Raised while a supported snippet runs when it does something the interpreter does not allow, e.g. calls a
+    method of a list it did not create, or an unbound method of a class. Earlier statements only touched the
+    objects the snippet created, so the snippet can be run again from the start by other means (see
+    StaticExtractor).
+    """
+
+
+def _check_name(name: str, defined: set, global_names: dict):
+    # The same resolution as SnippetInterpreter._name, decided before the snippet runs
+    if name in defined or name in BUILTINS:
+        return
+    if name in global_names:
+        if not _usable(global_names[name]):
+            raise UnsupportedConstruct(f'global {name}')
+    elif hasattr(builtins, name):
+        raise UnsupportedConstruct(f'builtin {name}')
+
+
+def _check_expression(node, defined: set, global_names: dict):
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        children = _children(node)
+        if type(node) is ast.Name:
+            _check_name(node.id, defined, global_names)
+        elif type(node) is ast.Attribute and node.attr not in CLASS_ATTRIBUTES:
+            raise UnsupportedConstruct(f'attribute {node.attr}')
+        pending.extend(children)
+
+
+def check_supported(tree: ast.Module, global_names: Optional[dict] = None):
+    """
+    Check that a parsed snippet only uses the supported statements, expressions, names and attributes, before
+    any of it runs. What is left to decide while it runs depends on the values (e.g. whether an attribute is
+    read from an object of the class structure), and raises UnsupportedOperation.
+    Args:
+        tree (ast.Module): The parsed snippet.
+        global_names (dict, optional): The globals the snippet would be executed with.
+    Raises:
+        UnsupportedConstruct: If the snippet uses anything else.
+    """
+    if global_names is None:
+        global_names = IMPORTABLE_NAMES['class_structure']
+    # The names assigned or imported by the statements checked so far
+    defined = set()
+    for node in tree.body:
+        kind = type(node)
+        if kind is ast.Assign:
+            _check_expression(node.value, defined, global_names)
+            assigned = []
+            for target in node.targets:
+                elements = target.elts if type(target) in (ast.Tuple, ast.List) else [target]
+                for element in elements:
+                    if not isinstance(element, _TARGETS):
+                        raise UnsupportedConstruct('assignment target')
+                    if type(element) is ast.Name:
+                        assigned.append(element.id)
+                    elif type(element) is ast.Attribute:
+                        _children(element)
+                        _check_expression(element.value, defined, global_names)
+                    else:
+                        _check_expression(element, defined, global_names)
+            defined.update(assigned)
+        elif kind is ast.Expr:
+            _check_expression(node.value, defined, global_names)
+        elif kind is ast.ImportFrom:
+            exports = IMPORTABLE_NAMES.get(node.module) if not node.level else None
+            if exports is None:
+                raise UnsupportedConstruct(f'import from {node.module}')
+            for alias in node.names:
+                if alias.name == '*':
+                    defined.update(exports)
+                elif alias.name in exports:
+                    defined.add(alias.asname or alias.name)
+                else:
+                    raise UnsupportedConstruct(f'import of {alias.name}')
+        elif kind is not ast.Pass:
+            raise UnsupportedConstruct(f'{kind.__name__} statement')
+
+
+class SnippetInterpreter:
+    """
+    Interprets the supported subset of Python for one snippet (see check_supported).
+
+    Attributes:
+        global_names (dict): The names the snippet can read besides its own, as the globals given to exec;
+            only classes of the class structure and typing constructs among them are usable.
+    """
+
+    def __init__(self, global_names: Optional[dict] = None):
+        if global_names is None:
+            # As with `from class_structure import *`
+            global_names = dict(IMPORTABLE_NAMES['class_structure'])
+        self.global_names = global_names
+        # The objects created by the running snippet, or held by them, by id; only their containers can be modified
+        self._owned: Dict[int, object] = {}
+
+    def run(self, code: str) -> dict:
+        """
+        Interpret a snippet.
+        Args:
+            code (str): The code snippet.
+        Returns:
+            dict: The namespace the snippet populated, as exec would have populated it.
+        Raises:
+            SyntaxError: If the code does not parse (with the message compiling it for exec gives).
+            UnsupportedConstruct: If the code uses a construct outside the supported subset; nothing has run.
+            UnsupportedOperation: If the code does something the interpreter does not allow while it runs.
+            Exception: Any error executing the code would raise.
+        """
+        # The parsed tree is only read, so it is shared with other runs of the same code
+        tree = compile_cached(code, flags=ast.PyCF_ONLY_AST)
+        check_supported(tree, self.global_names)
+        namespace: Dict[str, object] = {}
+        try:
+            for node in tree.body:
+                self._statement(node, namespace)
+        finally:
+            self._owned = {}
+        return namespace
+
+    def _own(self, value):
+        if isinstance(value, CLASS_TYPES) or type(value) in CONTAINER_METHODS:
+            self._owned[id(value)] = value
+        return value
+
+    def _held(self, owner, value):
+        # A value read from an object of the snippet belongs to the snippet too
+        return self._own(value) if id(owner) in self._owned else value
+
+    def _statement(self, node, namespace):
+        if isinstance(node, ast.Assign):
+            value = self._evaluate(node.value, namespace)
+            for target in node.targets:
+                self._assign(target, value, namespace)
+        elif isinstance(node, ast.Expr):
+            self._evaluate(node.value, namespace)
+        elif isinstance(node, ast.ImportFrom):
+            exports = IMPORTABLE_NAMES[node.module]
+            for alias in node.names:
+                if alias.name == '*':
+                    namespace.update(exports)
+                else:
+                    namespace[alias.asname or alias.name] = exports[alias.name]
+
+    def _assign(self, target, value, namespace):
+        if isinstance(target, ast.Name):
+            namespace[target.id] = value
+        elif isinstance(target, ast.Attribute):
+            obj = self._evaluate(target.value, namespace)
+            if not isinstance(obj, CLASS_TYPES):
+                raise UnsupportedOperation(f'attribute assignment on {type(obj).__name__}')
+            setattr(obj, target.attr, value)
+        elif isinstance(target, ast.Subscript):
+            container = self._evaluate(target.value, namespace)
+            key = self._evaluate(target.slice, namespace)
+            if type(container) not in CONTAINER_METHODS or id(container) not in self._owned:
+                raise UnsupportedOperation(f'item assignment on {type(container).__name__}')
+            container[key] = value
+        else:
+            if not isinstance(value, (list, tuple)) or len(value) != len(target.elts):
+                raise UnsupportedOperation('unpacking')
+            for element, item in zip(target.elts, value):
+                self._assign(element, item, namespace)
+
+    def _name(self, name: str, namespace):
+        if name in namespace:
+            return namespace[name]
+        if name in self.global_names:
+            value = self.global_names[name]
+            if _usable(value):
+                return value
+            raise UnsupportedOperation(f'global {name}')
+        if name in BUILTINS:
+            return BUILTINS[name]
+        if hasattr(builtins, name):
+            raise UnsupportedOperation(f'builtin {name}')
+        raise NameError(f"name '{name}' is not defined")
+
+    def _callable(self, func):
+        if isinstance(func, type) and issubclass(func, CLASS_TYPES):
+            return func
+        owner = getattr(func, '__self__', None)
+        name = getattr(func, '__name__', '')
+        if isinstance(owner, CLASS_TYPES) and not name.startswith('_'):
+            return func
+        for container, methods in CONTAINER_METHODS.items():
+            if type(owner) is container and name in methods and id(owner) in self._owned:
+                return func
+        if func is print:
+            return func
+        raise UnsupportedOperation(f'call of {name or type(func).__name__}')
+
+    def _evaluate(self, node, namespace):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return self._name(node.id, namespace)
+        if isinstance(node, ast.Attribute):
+            obj = self._evaluate(node.value, namespace)
+            if not isinstance(obj, CLASS_TYPES) and not (isinstance(obj, type) and issubclass(obj, CLASS_TYPES)) \
+                    and not any(type(obj) is c and node.attr in m for c, m in CONTAINER_METHODS.items()):
+                raise UnsupportedOperation(f'attribute of {type(obj).__name__}')
+            return self._held(obj, getattr(obj, node.attr))
+        if isinstance(node, ast.Call):
+            function = self._callable(self._evaluate(node.func, namespace))
+            args = [self._evaluate(arg, namespace) for arg in node.args]
+            kwargs = {kw.arg: self._evaluate(kw.value, namespace) for kw in node.keywords}
+            result = function(*args, **kwargs)
+            # The objects a constructor creates belong to the snippet
+            return self._own(result) if isinstance(function, type) else result
+        if isinstance(node, ast.List):
+            return self._own([self._evaluate(e, namespace) for e in node.elts])
+        if isinstance(node, ast.Tuple):
+            return tuple(self._evaluate(e, namespace) for e in node.elts)
+        if isinstance(node, ast.Dict):
+            result = {}
+            for key, value in zip(node.keys, node.values):
+                k = self._evaluate(key, namespace)
+                result[k] = self._evaluate(value, namespace)
+            return self._own(result)
+        if isinstance(node, ast.Subscript):
+            container = self._evaluate(node.value, namespace)
+            key = self._evaluate(node.slice, namespace)
+            if not isinstance(container, CONTAINER_TYPES) or isinstance(key, slice):
+                raise UnsupportedOperation(f'subscript of {type(container).__name__}')
+            return self._held(container, container[key])
+        if isinstance(node, ast.UnaryOp):
+            operand = self._evaluate(node.operand, namespace)
+            if type(operand) not in (int, float):
+                raise UnsupportedOperation('unary operator')
+            return -operand if isinstance(node.op, ast.USub) else +operand
+        if isinstance(node, ast.BinOp):
+            left = self._evaluate(node.left, namespace)
+            right = self._evaluate(node.right, namespace)
+            if type(left) is not type(right) or type(left) not in (str, int, float, list):
+                raise UnsupportedOperation('binary operator')
+            result = left + right
+            return self._own(result) if type(result) is list else result
+        raise UnsupportedOperation(type(node).__name__)
+
+
+def interpret(code: str, global_names: Optional[dict] = None) -> dict:
+    """
+    Interpret a snippet without exec (see SnippetInterpreter.run).
+    Args:
+        code (str): The code snippet.
+        global_names (dict, optional): The globals the snippet would be executed with.
+    Returns:
+        dict: The namespace the snippet populated.
+    """
+    return SnippetInterpreter(global_names).run(code)
+
+
+class StaticExtractor:
+    """
+    Extracts snippets by interpreting them in-process, and passes the snippets with unsupported constructs or
+    operations to a fallback executor, e.g. a sandbox.SandboxExecutor. It offers the extract(code) interface of
+    extraction_cache.ExtractionCache and sandbox.SandboxExecutor, so it can be given as the cache of an
+    EvaluationContext.
+
+    Attributes:
+        fallback (optional): The executor of unsupported snippets; they are executed in-process if None.
+        interpreted (int): The number of snippets that were interpreted.
+        fallbacks (int): The number of snippets passed to the fallback.
+        reasons (Dict[str, int]): The number of fallbacks per unsupported construct.
+    """
+
+    def __init__(self, fallback=None, global_names: Optional[dict] = None):
+        self.fallback = fallback
+        self.interpreter = SnippetInterpreter(global_names)
+        self.interpreted = 0
+        self.fallbacks = 0
+        self.reasons: Dict[str, int] = {}
+
+    def _interpret(self, code):
+        from test_statements import SerializedExtraction, SnippetExtraction
+        if not isinstance(code, str):
+            raise UnsupportedConstruct('code that is not a string')
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                namespace, error = PROFILE.call('exec', self.interpreter.run, code), None
+        except (UnsupportedConstruct, UnsupportedOperation) as reason:
+            self.fallbacks += 1
+            self.reasons[str(reason)] = self.reasons.get(str(reason), 0) + 1
+            raise UnsupportedConstruct(str(reason)) from reason
+        except (SyntaxError, Exception) as e:
+            namespace, error = {}, e
+        entry = SnippetExtraction.from_namespace(code, namespace, error).to_entry()
+        self.interpreted += 1
+        # The same outcome as a sandboxed worker (see sandbox._worker_main)
+        if error is not None:
+            return SerializedExtraction(code, entry, 'error', f"{type(error).__name__}: {error}",
+                                        time.perf_counter() - start)
+        return SerializedExtraction(code, entry, 'ok', None, time.perf_counter() - start)
+
+    def _fall_back(self, code):
+        if self.fallback is not None:
+            return self.fallback.extract(code)
+        from test_statements import SnippetExtraction
+        return SnippetExtraction(code)
+
+    def extract(self, code):
+        """
+        Get the extraction of a code string, interpreting it if possible.
+        Args:
+            code (str): The code snippet.
+        Returns:
+            SerializedExtraction, or the extraction of the fallback for unsupported code.
+        """
+        try:
+            return self._interpret(code)
+        except UnsupportedConstruct:
+            return self._fall_back(code)
+
+    def extract_many(self, codes: List[str]) -> list:
+        """
+        Get the extractions of several code strings. The unsupported ones are passed to the fallback as
+        one batch if it supports it (see sandbox.SandboxExecutor.extract_many).
+        Args:
+            codes (List[str]): The code snippets.
+        Returns:
+            list: The extractions, in the order of the codes.
+        """
+        results = []
+        unsupported = []
+        for index, code in enumerate(codes):
+            try:
+                results.append(self._interpret(code))
+            except UnsupportedConstruct:
+                results.append(None)
+                unsupported.append(index)
+        if unsupported and hasattr(self.fallback, 'extract_many'):
+            extracted = self.fallback.extract_many([codes[i] for i in unsupported])
+        else:
+            extracted = [self._fall_back(codes[i]) for i in unsupported]
+        for index, extraction in zip(unsupported, extracted):
+            results[index] = extraction
+        return results
+
+    def stats(self) -> dict:
+        """
+        Get the number of interpreted snippets and of fallbacks, with the most common unsupported constructs.
+        """
+        reasons = sorted(self.reasons.items(), key=lambda item: -item[1])[:10]
+        return {'interpreted': self.interpreted, 'fallbacks': self.fallbacks, 'reasons': dict(reasons)}
@@ -0,0 +1,146 @@
+# This module provides a streaming pipeline for code generation:
+#   test sample -> build prompt (select demonstrations) -> generate -> write row
+# Test samples flow through in small batches, so only one batch of prompts and responses is held at a time,
+# and every completed row is flushed to disk with a checkpoint, so a restarted run resumes after the last
+# completed row. A row whose prompt failed is never written: the run stops there, and resuming prompts it again.
+# The generated files are scored afterwards with semantic_runner.py.
+
+import csv
+import inspect
+import io
+import json
+import os
+from typing import Callable, Iterable, Iterator, List, Optional
+
+# Columns of the generated code files (testing_set_pass_N.csv)
+GENERATION_COLUMNS = ['text', 'code', 'tags']
+
+
+def batched(rows: Iterable[dict], size: int, skip: int = 0) -> Iterator[List[dict]]:
+    """
+    Group rows into lists of at most size rows.
+    Args:
+        rows (Iterable[dict]): The rows.
+        size (int): The maximum number of rows of a batch.
+        skip (int): The number of rows to skip at the start.
+    Yields:
+        List[dict]: The batches of the rows after the skipped ones.
+    """
+    batch = []
+    for i, row in enumerate(rows):
+        if i < skip:
+            continue
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CheckpointedWriter:
+    """
+    Appends rows to a CSV file and records, after every row, how many rows are complete and the size of
+    the file in a JSON checkpoint next to it. Reopening the writer truncates the file to the checkpoint,
+    which drops a row that was only partly written when a run stopped.
+
+    Attributes:
+        path (str): The path of the CSV file.
+        rows (int): The number of completed rows.
+    """
+
+    def __init__(self, path: str, fieldnames: List[str], resume: bool = True):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.checkpoint_path = path + '.progress'
+        self.rows = 0
+        offset = None
+        if resume and os.path.exists(self.checkpoint_path) and os.path.exists(path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if os.path.getsize(path) >= checkpoint.get('offset', -1) >= 0:
+                self.rows = checkpoint['rows']
+                offset = checkpoint['offset']
+        if offset is None:
+            self._file = open(path, 'wb')
+            self._file.write(self._format(fieldnames))
+        else:
+            self._file = open(path, 'r+b')
+            self._file.truncate(offset)
+            self._file.seek(0, os.SEEK_END)
+        self._checkpoint()
+
+    @staticmethod
+    def _format(values) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue().encode('utf-8')
+
+    def _checkpoint(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'rows': self.rows, 'offset': self._file.tell()}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def write(self, record: dict):
+        """
+        Write one row and checkpoint it.
+        """
+        self._file.write(self._format([record.get(name, '') for name in self.fieldnames]))
+        self.rows += 1
+        self._checkpoint()
+
+    def close(self, completed: bool = False):
+        """
+        Close the file. Once a run is completed, its checkpoint is removed.
+        """
+        self._file.close()
+        if completed and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+async def run_pipeline(test_samples: Iterable[dict], output_file: str,
+                       build_prompts: Callable[[List[dict]], List[str]], generate: Callable,
+                       batch_size: int = 16, resume: bool = True,
+                       progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Generate the code of every test sample, streaming the samples through in batches.
+    Each batch is prompted concurrently; its rows are written in order as soon as the batch is done.
+    On restart with resume, the rows completed by the previous run are skipped. Rows are prompted in
+    order, but the random tie-breaking of the skipped rows is not replayed, so a resumed run may select
+    other demonstrations among equally ranked ones than an uninterrupted run would.
+    Args:
+        test_samples (Iterable[dict]): The test samples, with 'text' and 'tags', and whatever build_prompts
+            needs, e.g. 'embedding'.
+        output_file (str): The generated code file, with the columns text, code and tags.
+        build_prompts (Callable[[List[dict]], List[str]]): Builds the prompts of a batch of samples, in order.
+        generate (Callable): Prompts the model with a list of prompts and returns the responses in order,
+            e.g. `lambda prompts: engine.generate(prompts, pass_index=1)`; it may be a coroutine function.
+            A None response marks a failed prompt: the rows before it are written and the run stops with a
+            RuntimeError, leaving the checkpoint at the failed row.
+        batch_size (int): The number of samples prompted together.
+        resume (bool): Whether to resume from the checkpoint of a previous run.
+        progress (Callable[[int], None], optional): Called with the number of completed rows after every row.
+    Returns:
+        int: The number of completed rows.
+    """
+    writer = CheckpointedWriter(output_file, GENERATION_COLUMNS, resume)
+    completed = False
+    try:
+        for batch in batched(test_samples, batch_size, skip=writer.rows):
+            answers = generate(build_prompts(batch))
+            if inspect.isawaitable(answers):
+                answers = await answers
+            for sample, answer in zip(batch, answers):
+                if answer is None:
+                    # Not written, so a resumed run prompts it again
+                    raise RuntimeError(f"The prompt of row {writer.rows + 1} failed; run the pipeline again to resume from it.")
+                writer.write({'text': sample['text'], 'code': answer, 'tags': sample.get('tags', '')})
+                if progress is not None:
+                    progress(writer.rows)
+        completed = True
+    finally:
+        writer.close(completed)
+    return writer.rows
@@ -0,0 +1,109 @@
+# This script runs a local stub of the OpenAI chat completions API, to exercise the generation
+# engine (see generation.py) without network access or an API key.
+#
+# Usage: python stub_openai_server.py [--port 8000] [--latency 0.2] [--rate-limit-every 0]
+# Then:  AsyncGenerationEngine(base_url='http://127.0.0.1:8000/v1', api_key='stub')
+#
+# The response to every prompt is a deterministic code block derived from the last line of the prompt.
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_completion(prompt: str) -> str:
+    """
+    Build the deterministic response of the stub server to a prompt.
+    Args:
+        prompt (str): The prompt.
+    Returns:
+        str: A code block creating a Section whose title is a hash of the prompt.
+    """
+    digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+    return '```python\ns = Section("(1)", "%s")\n```' % digest
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    rate_limit_every = 0
+    _requests = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        with StubHandler._lock:
+            StubHandler._requests += 1
+            count = StubHandler._requests
+        time.sleep(self.latency)
+        if not self.path.endswith('/chat/completions'):
+            self._send(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+            return
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            self._send(429, {'error': {'message': 'rate limited', 'type': 'rate_limit_error'}}, {'retry-after': '0.1'})
+            return
+        prompt = body['messages'][-1]['content']
+        content = stub_completion(prompt)
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        self._send(200, {
+            'id': 'chatcmpl-stub-%d' % count,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}
+        })
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 8000, latency: float = 0.0, rate_limit_every: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a background thread.
+    Args:
+        port (int): The port to listen on (0 picks a free port).
+        latency (float): The delay before every response, in seconds.
+        rate_limit_every (int): Answer every n-th request with HTTP 429 (0 disables it).
+    Returns:
+        ThreadingHTTPServer: The running server; its base URL is http://127.0.0.1:<server_port>/v1.
+    """
+    StubHandler.latency = latency
+    StubHandler.rate_limit_every = rate_limit_every
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stub of the OpenAI chat completions API.')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay before every response (seconds)')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every n-th request with HTTP 429')
+    args = parser.parse_args()
+    server = serve(args.port, args.latency, args.rate_limit_every)
+    print(f"Stub OpenAI API listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,35 @@
 
 # # Import necessary classes from the class_structure module
 from class_structure import Section, Expression, Statement, Information, Definition, Rule, Exemption, Reference
-from serialize import serialize_statement, serialize_reference
-from typing import List
+from serialize import serialize_statement, serialize_reference, CanonicalTexts
+from code_cache import compile_cached
+from profiling import PROFILE
+from comparison import (COMPARISON_CACHE_SIZE, edit_distance, compare_strings_with_threshold, comparison_cache_info,
+                        set_comparison_cache_size, clear_comparison_cache, compare_list_strings_with_threshold,
+                        compare_serialized_expr, compare_serialized_references)
+from matching import match_items, match_references, match_statements, match_strings
+from typing import List, Optional
+
+def execute_code_string(code_str: str) -> dict:
+    """
+    Executes the given code string in a fresh namespace and returns that namespace.
+    Args:
+        code_str (str): The code string to execute.
+    Returns:
+        dict: The namespace populated by the code, or an empty dict if the code failed to run.
+    """
+    try:
+        return _exec_in_namespace(code_str)
+    except (SyntaxError, Exception) as e:
+        print(e)
+        return {}
+
+@PROFILE.timed('exec')
+def _exec_in_namespace(code_str: str) -> dict:
+    namespace = {}
+    # Execute the code in an isolated namespace, compiling every distinct snippet only once
+    exec(compile_cached(code_str) if isinstance(code_str, str) else code_str, globals(), namespace)
+    return namespace
 
 def run_code_string(code_str: str) -> List[Section]:
     """
@@ -19,35 +46,29 @@ def run_code_string(code_str: str) -> List[Section]:
         SyntaxError: If the code string has syntax errors.
         Exception: If any other error occurs during execution.
     """
-    try:
-        namespace = {}
-        # Execute the code in an isolated namespace
-        exec(code_str, globals(), namespace)
-
-        information = [
+    namespace = execute_code_string(code_str)
+
+    information = [
+        value
+        for value in namespace.values()
+        if isinstance(value, Information)
+    ]
+    definitions = [
             value
             for value in namespace.values()
-            if isinstance(value, Information)
+            if isinstance(value, Definition)
         ]
-        definitions = [
-                value
-                for value in namespace.values()
-                if isinstance(value, Definition)
-            ]
-        rules = [
-                value
-                for value in namespace.values()
-                if isinstance(value, Rule)
-            ]
-        exemptions = [
-                value
-                for value in namespace.values()
-                if isinstance(value, Exemption)
-            ]
-        return [information, definitions, rules, exemptions]
-    except (SyntaxError, Exception) as e:
-        print(e)
-        return [[], [], [], []]
+    rules = [
+            value
+            for value in namespace.values()
+            if isinstance(value, Rule)
+        ]
+    exemptions = [
+            value
+            for value in namespace.values()
+            if isinstance(value, Exemption)
+        ]
+    return [information, definitions, rules, exemptions]
     
 def run_code_string_references(code_str: str) -> List[Section]:
     """
@@ -61,213 +82,221 @@ def run_code_string_references(code_str: str) -> List[Section]:
         SyntaxError: If the code string has syntax errors.
         Exception: If any other error occurs during execution.
     """
-    try:
-        namespace = {}
-        # Execute the code in an isolated namespace
-        exec(code_str, globals(), namespace)
+    namespace = execute_code_string(code_str)
 
-        references = [
-            value
-            for value in namespace.values()
-            if isinstance(value, Reference)
-        ]
+    references = [
+        value
+        for value in namespace.values()
+        if isinstance(value, Reference)
+    ]
 
-        statements = [
-            value
-            for value in namespace.values()
-            if isinstance(value, Statement)
-        ]
-        return [references, statements]
-    except (SyntaxError, Exception) as e:
-        print(e)
-        return [[], []]
-    
-def compare_strings_with_threshold(s1, s2, threshold=10):
+    statements = [
+        value
+        for value in namespace.values()
+        if isinstance(value, Statement)
+    ]
+    return [references, statements]
+
+
+class SnippetExtraction:
     """
-    Compare two strings using the edit distance algorithm.
-    The edit distance is the minimum number of operations (insertions, deletions, substitutions)
-    required to change one string into the other.
-    Parameters:
-      s1 (str): First string to compare.
-      s2 (str): Second string to compare.
-      threshold (int): Edit distance threshold for string comparisons.
-    Returns:
-      tuple: A tuple containing:
-        - bool: True if the strings are considered similar (edit distance <= threshold), False otherwise.
-        - int: The actual edit distance between the two strings.
+    The objects extracted from a single code snippet, executed exactly once.
+
+    The serialized dictionaries are computed lazily on first use and reused by every
+    attribute test afterwards. Serialization errors are not cached: they are raised to
+    each test that asks for the failing group, just as if the test had serialized it itself.
+
+    Attributes:
+        code (str): The code snippet that was executed.
+        error (Optional[Exception]): The exception raised while executing the code, if any.
+        information (List[Information]): The Information statements created by the code.
+        definitions (List[Definition]): The Definition statements created by the code.
+        rules (List[Rule]): The Rule statements created by the code.
+        exemptions (List[Exemption]): The Exemption statements created by the code.
+        references (List[Reference]): The Reference objects created by the code.
+        statements (List[Statement]): All Statement objects created by the code.
+        texts (CanonicalTexts): The canonical texts of the nodes of the snippet. The serialized relationships
+            use them, so the text of a node referenced many times is computed once.
     """
-    m, n = len(s1), len(s2)
-    dp = [[0]*(n+1) for _ in range(m+1)]
-    
-    for i in range(m+1):
-        dp[i][0] = i
-    for j in range(n+1):
-        dp[0][j] = j
-    
-    for i in range(1, m+1):
-        for j in range(1, n+1):
-            cost = 0 if s1[i-1] == s2[j-1] else 1
-            dp[i][j] = min(
-                dp[i-1][j] + 1,      # deletion
-                dp[i][j-1] + 1,      # insertion
-                dp[i-1][j-1] + cost  # substitution
-            )
-    
-    edit_distance = dp[m][n]
-    return (edit_distance <= threshold, edit_distance)
 
-def compare_list_strings_with_threshold(list1, list2, threshold=10):
+    GROUPS = ("information", "definitions", "rules", "exemptions", "references", "statements")
+
+    def __init__(self, code: str):
+        try:
+            namespace, error = _exec_in_namespace(code), None
+        except (SyntaxError, Exception) as e:
+            print(e)
+            namespace, error = {}, e
+        self._extract(code, namespace, error)
+
+    @classmethod
+    def from_namespace(cls, code: str, namespace: dict, error: Optional[Exception] = None) -> 'SnippetExtraction':
+        """
+        Make the extraction of a snippet that was already run, e.g. by snippet_interpreter.StaticExtractor.
+        Args:
+            code (str): The code snippet.
+            namespace (dict): The namespace populated by the code.
+            error (Exception, optional): The exception raised while running the code, if any.
+        Returns:
+            SnippetExtraction: The extraction.
+        """
+        extraction = cls.__new__(cls)
+        extraction._extract(code, namespace, error)
+        return extraction
+
+    def _extract(self, code: str, namespace: dict, error: Optional[Exception]):
+        self.code = code
+        self.error: Optional[Exception] = error
+        values = list(namespace.values())
+        self.information: List[Information] = [v for v in values if isinstance(v, Information)]
+        self.definitions: List[Definition] = [v for v in values if isinstance(v, Definition)]
+        self.rules: List[Rule] = [v for v in values if isinstance(v, Rule)]
+        self.exemptions: List[Exemption] = [v for v in values if isinstance(v, Exemption)]
+        self.references: List[Reference] = [v for v in values if isinstance(v, Reference)]
+        self.statements: List[Statement] = [v for v in values if isinstance(v, Statement)]
+        self.texts = CanonicalTexts()
+        self._serialized = {}
+        self._serialized_by_id = {}
+
+    def _serialize_object(self, obj) -> dict:
+        key = id(obj)
+        if key not in self._serialized_by_id:
+            serialize = serialize_reference if isinstance(obj, Reference) else serialize_statement
+            self._serialized_by_id[key] = PROFILE.call('serialize', serialize, obj, self.texts.canonical_text)
+        return self._serialized_by_id[key]
+
+    def serialized(self, group: str) -> List[dict]:
+        """
+        Get the serialized dictionaries of one group of extracted objects.
+        Args:
+            group (str): One of the names in GROUPS, e.g. "rules" or "references".
+        Returns:
+            List[dict]: The serialized objects, in the order they were created by the code.
+        """
+        if group not in self._serialized:
+            self._serialized[group] = [self._serialize_object(obj) for obj in getattr(self, group)]
+        return self._serialized[group]
+
+    def to_entry(self) -> dict:
+        """
+        Serialize all groups into a plain dictionary, e.g. to store or transfer the extraction.
+        Returns:
+            dict: The serialized groups under "groups", and the message of every group whose
+                serialization failed under "errors".
+        """
+        entry = {"groups": {}, "errors": {}}
+        for group in self.GROUPS:
+            try:
+                entry["groups"][group] = self.serialized(group)
+            except Exception as e:
+                entry["errors"][group] = str(e)
+        return entry
+
+
+class SerializationError(Exception):
     """
-    Compare two lists of strings using the edit distance.
-    
-    Parameters:
-      list1 (list): First list of strings.
-      list2 (list): Second list of strings.
-      threshold (int): Edit distance threshold for string comparisons.
-      
-    Returns:
-      bool: True if every corresponding pair of strings are considered equal; False otherwise.
+    Raised when a serialized group is requested whose serialization failed when the extraction was made.
     """
-    if len(list1) != len(list2):
-        return False
-    
-    for s1, s2 in zip(list1, list2):
-        similar, _ = compare_strings_with_threshold(s1, s2, threshold)
-        if not similar:
-            return False
-    return True
 
 
-def compare_serialized_expr(expr1, expr2, threshold=10):
+class SerializedExtraction:
     """
-    Recursively compare two serialized Expression dictionaries.
-    
-    The dictionaries are assumed to have at least the following keys:
-      - "text": a string (already lower-cased)
-      - "includes": a list of nested serialized expressions or statements
-      - "sectionNumber": an integer (or None)
-    
-    For string values, the comparison is based on the edit distance.
-    For lists, elements are compared in order recursively.
-    Other values are compared using standard equality.
-    
-    Parameters:
-      expr1 (dict): First serialized expression.
-      expr2 (dict): Second serialized expression.
-      threshold (int): Edit distance threshold for string comparisons.
-      
-    Returns:
-      bool: True if expr1 and expr2 are considered equal under these rules; False otherwise.
+    An extraction restored from the serialized groups of SnippetExtraction.to_entry(), e.g. loaded
+    from a cache or returned by a sandboxed worker. It offers the same serialized() interface as
+    SnippetExtraction, without executing the code again.
+
+    Attributes:
+        code (str): The code snippet the extraction was made from.
+        status (str): "ok" if the code ran, "error" if it raised an exception, or the reason the
+            execution was stopped ("timeout", "memory" or "crashed"). Unless the status is "ok",
+            every group is empty, exactly as for code that fails to execute.
+        error (Optional[str]): A description of the error, if any.
+        elapsed (Optional[float]): The execution time in seconds, if known.
     """
-    # Check that both dictionaries have the same keys.
-    if set(expr1.keys()) != set(expr2.keys()):
-        return False
 
-    # Compare "text" using edit distance.
-    if "text" in expr1 and "text" in expr2:
-        if isinstance(expr1["text"], str) and isinstance(expr2["text"], str):
-            similar, _ = compare_strings_with_threshold(expr1["text"], expr2["text"], threshold)
-            if not similar:
-                return False
-        else:
-            if expr1["text"] != expr2["text"]:
-                return False
-
-    # Compare "sectionNumber" using edit distance.
-    if "sectionNumber" in expr1 and "sectionNumber" in expr2:
-            similar, _ = compare_strings_with_threshold(str(expr1["sectionNumber"]), str(expr2["sectionNumber"]), threshold)
-            if not similar:
-                return False
-
-    # Compare "includes" recursively.
-    if "includes" in expr1 and "includes" in expr2:
-        list1 = expr1["includes"]
-        list2 = expr2["includes"]
-        if len(list1) != len(list2):
-            return False
-        for item1, item2 in zip(list1, list2):
-            # If the items are dictionaries, assume they are serialized expressions/statements.
-            if isinstance(item1, dict) and isinstance(item2, dict):
-                if not compare_serialized_expr(item1, item2, threshold):
-                    return False
-            # Otherwise, if they are strings, use the string comparison.
-            elif isinstance(item1, str) and isinstance(item2, str):
-                similar, _ = compare_strings_with_threshold(item1, item2, threshold)
-                if not similar:
-                    return False
-            else:
-                # For any other types, use direct equality.
-                if item1 != item2:
-                    return False
-
-    return True
-
-def compare_serialized_references(ref1, ref2, threshold=10):
+    def __init__(self, code: str, entry: Optional[dict] = None, status: str = "ok",
+                 error: Optional[str] = None, elapsed: Optional[float] = None):
+        self.code = code
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+        if entry is None:
+            entry = {"groups": {group: [] for group in SnippetExtraction.GROUPS}, "errors": {}}
+        self._groups = entry["groups"]
+        self._errors = entry["errors"]
+
+    def serialized(self, group: str) -> List[dict]:
+        """
+        Get the serialized dictionaries of one group of extracted objects.
+        Args:
+            group (str): One of the names in SnippetExtraction.GROUPS.
+        Returns:
+            List[dict]: The serialized objects, in the order they were created by the code.
+        Raises:
+            SerializationError: If serializing the group failed when the extraction was made.
+        """
+        if group in self._errors:
+            raise SerializationError(self._errors[group])
+        return self._groups[group]
+
+    def to_entry(self) -> dict:
+        """
+        Get the serialized groups in the format of SnippetExtraction.to_entry().
+        Returns:
+            dict: The serialized groups and the serialization errors.
+        """
+        return {"groups": self._groups, "errors": self._errors}
+
+
+class EvaluationContext:
     """
-    Recursively compare two serialized Reference dictionaries.
-    
-    The dictionaries are assumed to have at least the following keys:
-      - "text": a string (already lower-cased)
-      - "target": a string (already lower-cased)
-      - "sectionNumber": an integer (or None)
-      - "relationship": a string
+    The ground truth and generated extractions for one comparison.
 
-    For string values, the comparison is based on the edit distance.
-    For lists, elements are compared in order recursively.
-    Other values are compared using standard equality.
+    Building a context executes each snippet once; passing it to the test_* functions
+    lets all 16 attribute tests share the extracted and serialized objects. If a cache is
+    given, the extractions are obtained from its extract(code) method instead: an
+    extraction_cache.ExtractionCache loads snippets that were extracted before, and a
+    sandbox.SandboxExecutor runs the snippets in isolated worker processes.
 
-    Parameters:
-        ref1 (dict): First serialized reference.
-        ref2 (dict): Second serialized reference.
-
-    Returns:
-        bool: True if ref1 and ref2 are considered equal under these rules; False otherwise.
+    Attributes:
+        gt (SnippetExtraction): The extraction of the ground truth code.
+        generated (SnippetExtraction): The extraction of the generated code.
     """
 
-    # Check that both dictionaries have the same keys.
-    if set(ref1.keys()) != set(ref2.keys()):
-        return False
-
-    # Compare "text" using edit distance.
-    if "text" in ref1 and "text" in ref2:
-        if isinstance(ref1["text"], str) and isinstance(ref2["text"], str):
-            similar, _ = compare_strings_with_threshold(ref1["text"], ref2["text"], threshold)
-            if not similar:
-                return False
-        else:
-            if ref1["text"] != ref2["text"]:
-                return False
-
-    # Compare "target" using edit distance.
-    if "target" in ref1 and "target" in ref2:
-        if isinstance(ref1["target"], str) and isinstance(ref2["target"], str):
-            similar, _ = compare_strings_with_threshold(ref1["target"], ref2["target"], threshold)
-            if not similar:
-                return False
-        else:
-            if ref1["target"] != ref2["target"]:
-                return False
-
-    # Compare "sectionNumber" using edit distance.
-    if "sectionNumber" in ref1 and "sectionNumber" in ref2:
-        similar, _ = compare_strings_with_threshold(str(ref1["sectionNumber"]), str(ref2["sectionNumber"]), threshold)
-        if not similar:
-            return False
-
-    # Compare "relationship" using edit distance.
-    if "relationship" in ref1 and "relationship" in ref2:
-        if isinstance(ref1["relationship"], str) and isinstance(ref2["relationship"], str):
-            similar, _ = compare_strings_with_threshold(ref1["relationship"], ref2["relationship"], threshold)
-            if not similar:
-                return False
+    def __init__(self, gt_code: str, generated_code: str, cache=None):
+        if cache is None:
+            self.gt = SnippetExtraction(gt_code)
+            self.generated = SnippetExtraction(generated_code)
         else:
-            if ref1["relationship"] != ref2["relationship"]:
-                return False
-
-    return True
-
-
-def compare_serialized_expr_lists(list1, list2, threshold=10):
+            self.gt = cache.extract(gt_code)
+            self.generated = cache.extract(generated_code)
+
+    @classmethod
+    def from_extractions(cls, gt, generated) -> 'EvaluationContext':
+        """
+        Build a context from extractions that were already made, e.g. in a batch by a sandbox.
+        Args:
+            gt (SnippetExtraction or SerializedExtraction): The extraction of the ground truth code.
+            generated (SnippetExtraction or SerializedExtraction): The extraction of the generated code.
+        Returns:
+            EvaluationContext: The context holding both extractions.
+        """
+        context = cls.__new__(cls)
+        context.gt = gt
+        context.generated = generated
+        return context
+
+    def serialized(self, group: str):
+        """
+        Get the serialized dictionaries of one group for both snippets.
+        Args:
+            group (str): One of the names in SnippetExtraction.GROUPS.
+        Returns:
+            tuple: The ground truth and generated lists of serialized dictionaries.
+        """
+        return self.gt.serialized(group), self.generated.serialized(group)
+
+def compare_serialized_expr_lists(list1, list2, threshold=10, ordered=True):
     """
     Compare two lists of serialized Expression dictionaries.
     
@@ -278,12 +307,17 @@ def compare_serialized_expr_lists(list1, list2, threshold=10):
       list1 (list): First list of serialized expressions.
       list2 (list): Second list of serialized expressions.
       threshold (int): Edit distance threshold for string comparisons.
+      ordered (bool): If False, the expressions are paired by an optimal assignment of their
+        texts regardless of their order (see matching.match_items).
       
     Returns:
       bool: True if every corresponding pair of dictionaries are considered equal; False otherwise.
     """
     if len(list1) != len(list2):
         return False
+    if not ordered:
+        return match_items(list1, list2, key=lambda e: e.get("text", ""),
+                           accept=lambda e1, e2: compare_serialized_expr(e1, e2, threshold), threshold=threshold).complete
     
     for expr1, expr2 in zip(list1, list2):
         if not compare_serialized_expr(expr1, expr2, threshold):
@@ -313,12 +347,14 @@ def compare_serialized_references_lists(list1, list2, threshold=10):
     return True
 
 
-def test_information_description(self, gt_code, generated_code):
+def test_information_description(self, gt_code, generated_code, context: Optional[EvaluationContext] = None, ordered: bool = True):
     """
     Test case to compare the information description of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
+        ordered (bool): If False, the expressions of each list are paired by an optimal assignment instead of by position.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -327,12 +363,11 @@ def test_information_description(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[0]
-        list_s2 = run_code_string(generated_code)[0]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("information")
         for i in range(len(dict1)):
             if dict1[i]['description'] != None:
                 count1+=1
@@ -343,7 +378,7 @@ def test_information_description(self, gt_code, generated_code):
         assert len(dict1) == len(dict2), "The two code snippets did not produce the same number of information statements."
         for i in range(len(dict1)):
             # 3. Compare
-            assert compare_serialized_expr_lists(dict1[i]['description'], dict2[i]['description'], threshold=10), "The two code snippets did not produce the same information description."
+            assert compare_serialized_expr_lists(dict1[i]['description'], dict2[i]['description'], threshold=10, ordered=ordered), "The two code snippets did not produce the same information description."
         print("Info description test case passed")
         if count1 == 0: # if there are no descriptions in the ground truth code
             return 1, 0 # second value
@@ -358,12 +393,13 @@ def test_information_description(self, gt_code, generated_code):
         else:
             return 0,2
     
-def test_definition_term(self, gt_code, generated_code):
+def test_definition_term(self, gt_code, generated_code, context: Optional[EvaluationContext] = None):
     """
     Test case to compare the defined terms of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -372,13 +408,12 @@ def test_definition_term(self, gt_code, generated_code):
     try:
         count1 = 0
         count2 = 0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[1]
-        list_s2 = run_code_string(generated_code)[1]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
 
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("definitions")
 
         for i in range(len(dict1)):
             if dict1[i]['defined_term'] is not None:
@@ -417,11 +452,13 @@ def test_definition_term(self, gt_code, generated_code):
         return 0, 2
     
 
-def test_definition_meaning(self, gt_code, generated_code):
+def test_definition_meaning(self, gt_code, generated_code, context: Optional[EvaluationContext] = None, ordered: bool = True):
     """ Test case to compare the meanings of defined terms in two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
+        ordered (bool): If False, the expressions of each list are paired by an optimal assignment instead of by position.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -430,13 +467,12 @@ def test_definition_meaning(self, gt_code, generated_code):
     try:
         count1 = 0
         count2 = 0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[1]
-        list_s2 = run_code_string(generated_code)[1]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
 
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("definitions")
         # Count how many "meaning" fields in the ground truth are non-empty
         for i in range(len(dict1)):
             if dict1[i]['meaning'] is not None and len(dict1[i]['meaning']) != 0:
@@ -454,7 +490,7 @@ def test_definition_meaning(self, gt_code, generated_code):
 
             ground_truth_meaning = dict1[i]['meaning']
             generated_meaning = dict2[i]['meaning']
-            assert compare_serialized_expr_lists(ground_truth_meaning, generated_meaning, threshold=10), "The two code snippets did not produce the same definition meanings."
+            assert compare_serialized_expr_lists(ground_truth_meaning, generated_meaning, threshold=10, ordered=ordered), "The two code snippets did not produce the same definition meanings."
 
         print("Def meaning test case passed")
 
@@ -475,11 +511,13 @@ def test_definition_meaning(self, gt_code, generated_code):
             return 0, 0 # (Test failed, ground truth had no meaning)
         return 0, 2      
     
-def test_definition_exclusions(self, gt_code, generated_code):
+def test_definition_exclusions(self, gt_code, generated_code, context: Optional[EvaluationContext] = None, ordered: bool = True):
     """ Test case to compare the exclusions of defined terms in two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
+        ordered (bool): If False, the expressions of each list are paired by an optimal assignment instead of by position.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -488,12 +526,11 @@ def test_definition_exclusions(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[1]
-        list_s2 = run_code_string(generated_code)[1]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("definitions")
 
         # compare length of dictionaries
         for i in range(len(dict1)):
@@ -504,7 +541,7 @@ def test_definition_exclusions(self, gt_code, generated_code):
                 count2+=1
         assert len(dict1) == len(dict2), "The two code snippets did not produce the same number of definition statements."
         for i in range(len(dict1)):
-            assert compare_serialized_expr_lists(dict1[i]['exclusions'], dict2[i]['exclusions'], threshold=10), "The two code snippets did not produce the same definition exclusions."
+            assert compare_serialized_expr_lists(dict1[i]['exclusions'], dict2[i]['exclusions'], threshold=10, ordered=ordered), "The two code snippets did not produce the same definition exclusions."
         print("Def exclusions test case passed")
         if count1 == 0: # if there are no exclusions in the ground truth code
             return 1, 0 # second value denotes TN
@@ -518,11 +555,12 @@ def test_definition_exclusions(self, gt_code, generated_code):
             return 0, 0
         return 0, 2
     
-def test_rule_entity(self, gt_code, generated_code):
+def test_rule_entity(self, gt_code, generated_code, context: Optional[EvaluationContext] = None):
     """ Test case to compare the rule entities of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -531,12 +569,11 @@ def test_rule_entity(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[2]
-        list_s2 = run_code_string(generated_code)[2]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("rules")
         for i in range(len(dict1)):
             if dict1[i]['entity'] != None:
                 count1+=1
@@ -561,11 +598,12 @@ def test_rule_entity(self, gt_code, generated_code):
             return 0, 0
         return 0, 2
 
-def test_rule_type(self, gt_code, generated_code):
+def test_rule_type(self, gt_code, generated_code, context: Optional[EvaluationContext] = None):
     """ Test case to compare the rule types of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -574,13 +612,12 @@ def test_rule_type(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[2]
-        list_s2 = run_code_string(generated_code)[2]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
 
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("rules")
         for i in range(len(dict1)):
             if dict1[i]['rule_type'] != None:
                 count1+=1
@@ -605,11 +642,12 @@ def test_rule_type(self, gt_code, generated_code):
             return 0, 0
         return 0, 2
     
-def test_rule_description(self, gt_code, generated_code):
+def test_rule_description(self, gt_code, generated_code, context: Optional[EvaluationContext] = None):
     """ Test case to compare the rule descriptions of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -618,13 +656,12 @@ def test_rule_description(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[2]
-        list_s2 = run_code_string(generated_code)[2]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
 
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("rules")
         for i in range(len(dict1)):
             if dict1[i]['description'] != None:
                 count1+=1
@@ -649,11 +686,13 @@ def test_rule_description(self, gt_code, generated_code):
             return 0, 0
         return 0, 2
 
-def test_rule_conditions(self, gt_code, generated_code):
+def test_rule_conditions(self, gt_code, generated_code, context: Optional[EvaluationContext] = None, ordered: bool = True):
     """ Test case to compare the rule conditions of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
+        ordered (bool): If False, the expressions of each list are paired by an optimal assignment instead of by position.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -662,13 +701,12 @@ def test_rule_conditions(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[2]
-        list_s2 = run_code_string(generated_code)[2]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
 
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("rules")
         for i in range(len(dict1)):
             if len(dict1[i]['conditions']) != 0:
                 count1+=1
@@ -679,7 +717,7 @@ def test_rule_conditions(self, gt_code, generated_code):
         assert len(dict1) == len(dict2), "The two code snippets did not produce the same number of rule statements."
         for i in range(len(dict1)):
             # 3. Compare
-            assert compare_serialized_expr_lists(dict1[i]['conditions'], dict2[i]['conditions'], threshold=10), "The two code snippets did not produce the same rule conditions."
+            assert compare_serialized_expr_lists(dict1[i]['conditions'], dict2[i]['conditions'], threshold=10, ordered=ordered), "The two code snippets did not produce the same rule conditions."
         print("Rule condition test case passed")
         if count1 == 0: # if there are no conditions in the ground truth code
             return 1, 0 # second value denotes TN
@@ -693,11 +731,13 @@ def test_rule_conditions(self, gt_code, generated_code):
             return 0, 0
         return 0, 2
 
-def test_exemption_description(self, gt_code, generated_code):
+def test_exemption_description(self, gt_code, generated_code, context: Optional[EvaluationContext] = None, ordered: bool = True):
     """ Test case to compare the exemption descriptions of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
+        ordered (bool): If False, the expressions of each list are paired by an optimal assignment instead of by position.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -706,12 +746,11 @@ def test_exemption_description(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string(gt_code)[3]
-        list_s2 = run_code_string(generated_code)[3]
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("exemptions")
         # compare length of dictionaries
         for i in range(len(dict1)):
             if len(dict1[i]['description']) != 0:
@@ -722,7 +761,7 @@ def test_exemption_description(self, gt_code, generated_code):
         assert len(dict1) == len(dict2), "The two code snippets did not produce the same number of exemption statements."
         for i in range(len(dict1)):
             # 3. Compare
-            assert compare_serialized_expr_lists(dict1[i]['description'], dict2[i]['description'], threshold=10), "The two code snippets did not produce the same exemption description."
+            assert compare_serialized_expr_lists(dict1[i]['description'], dict2[i]['description'], threshold=10, ordered=ordered), "The two code snippets did not produce the same exemption description."
         print("Exemption description test case passed")
         if count1 == 0: # if there are no exemptions in the ground truth code
             return 1, 0 # second value denotes TN
@@ -737,11 +776,15 @@ def test_exemption_description(self, gt_code, generated_code):
             return 0, 0
         return 0, 2
     
-def test_reference_relationship(self, gt_code, generated_code):
+def test_reference_relationship(self, gt_code, generated_code, context: Optional[EvaluationContext] = None, ordered: bool = True):
     """ Test case to compare the reference relationships of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
+        ordered (bool): If False, the references are paired by an optimal assignment instead of by position
+            (see matching.match_references); the numbers of references may then differ, and a failure is
+            scored by the unmatched references: missing ones count as FN, extra ones as FP.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -750,25 +793,32 @@ def test_reference_relationship(self, gt_code, generated_code):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string_references(gt_code)[0]
-        list_s2 = run_code_string_references(generated_code)[0]
+        missing=0
+        extra=0
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
 
         # 2. Serialize them
-        dict1 = [serialize_reference(s) for s in list_s1]
-        dict2 = [serialize_reference(s) for s in list_s2]
+        dict1, dict2 = context.serialized("references")
         for i in range(len(dict1)):
             if len(dict1) != 0:
                 count1 += 1
         for i in range(len(dict2)):
             if len(dict2) != 0:
                 count2 += 1
-        # compare length of dictionaries
-        assert len(dict1) == len(dict2), "The two code snippets did not produce the same number of references."
-        for i in range(len(dict1)):
-            # 3. Compare
+        missing, extra = count1, count2
+        if not ordered:
+            matches = match_references(dict1, dict2, threshold=10)
+            missing, extra = len(matches.missing), len(matches.extra)
+            assert matches.complete, "The two code snippets did not produce the same references."
+        else:
+            # compare length of dictionaries
+            assert len(dict1) == len(dict2), "The two code snippets did not produce the same number of references."
+            for i in range(len(dict1)):
+                # 3. Compare
 
-            assert compare_serialized_references(dict1[i], dict2[i], threshold=10), "The two code snippets did not produce the same references."
+                assert compare_serialized_references(dict1[i], dict2[i], threshold=10), "The two code snippets did not produce the same references."
         print(f"references test case passed")
         if count1==0: # no refines assigned in gt
             return 1, 0 # second value denotes TN
@@ -776,18 +826,25 @@ def test_reference_relationship(self, gt_code, generated_code):
     except Exception as e:
         print(e)
         print(f"references test case failed")
-        if count1 > count2:
+        if missing > extra:
             return 0,1
-        elif count2 > count1:
+        elif extra > missing:
             return 0, 0
         return 0, 2
 
-def test_statement_relationship(self, gt_code, generated_code, relation):
+def test_statement_relationship(self, gt_code, generated_code, relation, context: Optional[EvaluationContext] = None, ordered: bool = True):
     """ Test case to compare the statement relationships of two code snippets.
     Args:
         gt_code (str): The ground truth code snippet.
         generated_code (str): The generated code snippet to compare against the ground truth.
         relation (str): The relationship to compare (e.g., "refines", "is_a", etc.).
+        context (EvaluationContext, optional): Pre-executed snippets shared across tests. Built from the code strings if not given.
+        ordered (bool): If False, the statements are paired by an optimal assignment of their types and
+            identifying texts instead of by position (see matching.match_statements), and the items of each
+            relationship list are matched regardless of their order. The numbers of statements may then
+            differ, and a failure is scored by the unmatched relationships: those of the ground truth
+            (including all relationships of unmatched ground truth statements) count as FN, the generated
+            ones as FP.
     Returns:
         tuple: A tuple containing two integers:
             - First integer: 1 if the test passed, 0 if it failed.
@@ -796,25 +853,38 @@ def test_statement_relationship(self, gt_code, generated_code, relation):
     try:
         count1=0
         count2=0
-        # 1. Run both snippets to get top-level sections
-        list_s1 = run_code_string_references(gt_code)[1]
-        list_s2 = run_code_string_references(generated_code)[1]
+        missing=0
+        extra=0
+        # 1. Run both snippets once, unless a shared context was provided
+        if context is None:
+            context = EvaluationContext(gt_code, generated_code)
 
         # 2. Serialize them
-        dict1 = [serialize_statement(s) for s in list_s1]
-        dict2 = [serialize_statement(s) for s in list_s2]
+        dict1, dict2 = context.serialized("statements")
         for i in range(len(dict1)):
             if len(dict1[i]['relationships'][relation]) != 0:
                 count1 += 1
         for i in range(len(dict2)):
             if len(dict2[i]['relationships'][relation]) != 0:
                 count2 += 1
-        # compare length of dictionaries
-        assert len(dict1) == len(dict2), f"The two code snippets did not produce the same number of statements."
-        for i in range(len(dict1)):
-            # 3. Compare
+        missing, extra = count1, count2
+        if not ordered:
+            matches = match_statements(dict1, dict2, threshold=10)
+            # The relationships of unmatched statements are missing or extra as a whole
+            missing = sum(len(dict1[i]['relationships'][relation]) for i in matches.missing)
+            extra = sum(len(dict2[j]['relationships'][relation]) for j in matches.extra)
+            for i, j in matches.pairs:
+                related = match_strings(dict1[i]['relationships'][relation], dict2[j]['relationships'][relation], threshold=10)
+                missing += len(related.missing)
+                extra += len(related.extra)
+            assert not missing and not extra, f"The two code snippets did not produce the same {relation} relationship list for each statement."
+        else:
+            # compare length of dictionaries
+            assert len(dict1) == len(dict2), f"The two code snippets did not produce the same number of statements."
+            for i in range(len(dict1)):
+                # 3. Compare
 
-            assert compare_list_strings_with_threshold(dict1[i]['relationships'][relation], dict2[i]['relationships'][relation], threshold=10), f"The two code snippets did not produce the same {relation} relationship list for each statement."
+                assert compare_list_strings_with_threshold(dict1[i]['relationships'][relation], dict2[i]['relationships'][relation], threshold=10), f"The two code snippets did not produce the same {relation} relationship list for each statement."
         print(f"{relation} test case passed")
         if count1==0: # no refines assigned in gt
             return 1, 0 # second value denotes TN
@@ -822,9 +892,89 @@ def test_statement_relationship(self, gt_code, generated_code, relation):
     except Exception as e:
         print(e)
         print(f"{relation} test case failed")
-        if count1 > count2:
+        if missing > extra:
             return 0,1
-        elif count2 > count1:
+        elif extra > missing:
             return 0, 0
         return 0, 2
-        
\ No newline at end of file
+        
+# The 16 semantic attribute tests, keyed by the column name used in the result files.
+ATTRIBUTE_TESTS = {
+    'Information Description': (test_information_description, {}),
+    'Definition Term': (test_definition_term, {}),
+    'Definition Meaning': (test_definition_meaning, {}),
+    'Definition Exclusions': (test_definition_exclusions, {}),
+    'Rule Entity': (test_rule_entity, {}),
+    'Rule Type': (test_rule_type, {}),
+    'Rule Description': (test_rule_description, {}),
+    'Rule Conditions': (test_rule_conditions, {}),
+    'Exemption Description': (test_exemption_description, {}),
+    'Refines': (test_statement_relationship, {'relation': 'refines'}),
+    'Is Refined By': (test_statement_relationship, {'relation': 'is_refined_by'}),
+    'Follows': (test_statement_relationship, {'relation': 'follows'}),
+    'Is Followed By': (test_statement_relationship, {'relation': 'is_followed_by'}),
+    'Exceptions': (test_statement_relationship, {'relation': 'has_exception'}),
+    'Is Exception To': (test_statement_relationship, {'relation': 'is_exception_to'}),
+    'References': (test_reference_relationship, {}),
+}
+
+# The tests that can pair items by an optimal assignment instead of by position (see matching.py)
+ORDER_INSENSITIVE_TESTS = (test_information_description, test_definition_meaning, test_definition_exclusions,
+                           test_rule_conditions, test_exemption_description, test_statement_relationship,
+                           test_reference_relationship)
+
+def summarize_outcomes(test_map: dict) -> tuple:
+    """
+    Count the passed tests, true positives, false positives, false negatives and mismatches of a row.
+    Args:
+        test_map (dict): The (passed, value) result of every attribute test of the row.
+    Returns:
+        tuple: total_passed, tp, fp, fn and mismatch.
+    """
+    total_passed = 0 # tp + tn
+    tp = 0
+    fp = 0
+    fn = 0
+    mismatch = 0
+    for p, v in test_map.values():
+        total_passed += p
+        if not p and v==1: fn+=1
+        elif not p and v==2: mismatch+=1
+        elif not p and not v: fp+=1
+        elif p and v: tp+=1
+    return total_passed, tp, fp, fn, mismatch
+
+def run_all_tests(self, gt_code, generated_code, context: Optional[EvaluationContext] = None, cache=None, ordered: bool = True,
+                  columns: Optional[List[str]] = None):
+    """
+    Run all 16 attribute tests on one pair of code snippets, executing each snippet only once.
+    Args:
+        gt_code (str): The ground truth code snippet.
+        generated_code (str): The generated code snippet to compare against the ground truth.
+        context (EvaluationContext, optional): Pre-executed snippets. Built from the code strings if not given.
+        cache (optional): An ExtractionCache or SandboxExecutor used when building the context.
+        ordered (bool): If False, the expression list, relationship and reference tests pair their items by an
+            optimal assignment instead of by position (see ORDER_INSENSITIVE_TESTS).
+        columns (List[str], optional): Only run the tests of these columns of ATTRIBUTE_TESTS; the counts
+            then only cover these tests.
+    Returns:
+        tuple: A tuple containing:
+            - total_passed: Total number of tests passed
+            - tp: True Positives
+            - fp: False Positives
+            - fn: False Negatives
+            - mismatch: Mismatches
+            - test_map: A dictionary mapping each column name in ATTRIBUTE_TESTS to its (passed, value) result
+    """
+    if context is None:
+        context = EvaluationContext(gt_code, generated_code, cache=cache)
+    test_map = {}
+    for name, (test, kwargs) in ATTRIBUTE_TESTS.items():
+        if columns is not None and name not in columns:
+            continue
+        if not ordered and test in ORDER_INSENSITIVE_TESTS:
+            kwargs = dict(kwargs, ordered=False)
+        p, v = PROFILE.call(f'test: {name}', test, self, gt_code, generated_code, context=context, **kwargs)
+        test_map[name] = (p, v)
+    total_passed, tp, fp, fn, mismatch = summarize_outcomes(test_map)
+    return total_passed, tp, fp, fn, mismatch, test_map